@@ -1,21 +1,122 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import uvicorn
+import asyncio
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from shared.cocoex_utils import run_extraction_agent
+from shared.cocoex_utils import (
+    run_extraction_agent, run_extraction_agent_stream, run_sentence_embedding, extraction_frames, warmup_models
+)
+from shared.document_extraction import iter_document_extraction, run_document_extraction, DOC_TOP_K
+from shared.executor import AgentExecutor, serve_pipelined
+from shared.model_registry import Readiness, add_health_routes, registry, MODEL_WARMUP
+from shared.metrics import add_metrics_routes, record_error, watch_cache
+from shared.wire import CLEAN_CLOSE_CODES, FLOAT_DTYPES, WIRE_FLOAT_DTYPE
 
 app = FastAPI()
+readiness = Readiness()
+add_health_routes(app, readiness)
+executor = AgentExecutor(preload=("shared.cocoex_utils",), warmup=warmup_models if MODEL_WARMUP else None)
+add_metrics_routes(app, "extraction", executor)
+# Only visible here with thread workers; process workers keep their own cache
+watch_cache("embedding", lambda: registry.get("embedding_cache").stats() if registry.is_loaded("embedding_cache") else None)
+
+@app.on_event("startup")
+async def start_executor():
+    # Started in the background: /healthz answers at once, /ready once workers and models are up
+    app.state.startup = asyncio.create_task(readiness.run(executor.start))
+
+@app.on_event("shutdown")
+def stop_executor():
+    executor.shutdown()
+
+def _cast_embeddings(frame, float_dtype):
+    frame["sentence_embedding"] = frame["sentence_embedding"].astype(float_dtype, copy=False)
+    frame["concept_embeddings"] = frame["concept_embeddings"].astype(float_dtype, copy=False)
+    return frame
+
+async def _step_on_pool(frames):
+    # Each next() runs on the pool. A consumer that stops early (client gone)
+    # closes the generator there too, once a step still running has finished,
+    # so nlp.pipe workers and ConceptNet waits are not left to the GC
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(executor.run(next, frames, None))
+            frame = await asyncio.shield(step)
+            if frame is None:
+                return
+            yield frame
+    finally:
+        if step is not None and not step.done():
+            await asyncio.gather(step, return_exceptions=True)
+        await executor.run(frames.close)
+
+async def _extraction_frames(sentence, as_lists):
+    if executor.kind == "process":
+        # A generator cannot be stepped across processes: cut frames from the full result
+        for frame in extraction_frames(await executor.run(run_extraction_agent, sentence, as_lists)):
+            yield frame
+        return
+    # Each step (the model work, then every ConceptNet wait) runs on the pool
+    async for frame in _step_on_pool(run_extraction_agent_stream(sentence, as_lists)):
+        yield frame
+
+async def stream_extraction(sentence, as_lists, float_dtype):
+    # Concepts and embeddings first, then relations per concept as ConceptNet answers
+    async for frame in _extraction_frames(sentence, as_lists):
+        if frame["type"] == "concepts" and not as_lists:
+            frame = _cast_embeddings(frame, float_dtype)
+        yield frame
+
+async def stream_document(text, top_k, conceptnet):
+    # Document mode: a "sentences" frame per window, then the "document" ranking
+    if executor.kind == "process":
+        # Not streamed: every frame is built in the worker and pickled back at
+        # once, so memory grows with the document. Flat memory on long inputs
+        # needs the thread (or inline) executor
+        for frame in await executor.run(run_document_extraction, text, top_k, conceptnet):
+            yield frame
+        return
+    async for frame in _step_on_pool(iter_document_extraction(text, top_k=top_k, conceptnet=conceptnet)):
+        yield frame
+
+async def handle_extraction(message, binary):
+    # Text frame: the bare sentence (or a JSON {"text", "id"} envelope), answered with JSON.
+    # Binary frame: {"text": ..., "float_dtype": ..., "id": ...}, answered with msgpack.
+    # {"stream": true} in either envelope answers with a sequence of frames;
+    # {"embed_only": true} with just {"sentence_embedding", "model"};
+    # {"document": ...} streams the frames of shared.document_extraction.
+    float_dtype = FLOAT_DTYPES[message.get("float_dtype", WIRE_FLOAT_DTYPE)] if binary else None
+    if isinstance(message, dict) and message.get("document") is not None:
+        return stream_document(message["document"], message.get("top_k") or DOC_TOP_K, message.get("conceptnet", True))
+    if isinstance(message, dict) and message.get("stream"):
+        return stream_extraction(message["text"], not binary, float_dtype)
+    if isinstance(message, dict) and message.get("embed_only"):
+        result = await executor.run(run_sentence_embedding, message["text"], not binary)
+        if binary:
+            result["sentence_embedding"] = result["sentence_embedding"].astype(float_dtype, copy=False)
+        return result
+
+    if not binary:
+        sentence = message["text"] if isinstance(message, dict) else message
+        return await executor.run(run_extraction_agent, sentence)
+
+    result = await executor.run(run_extraction_agent, message["text"], False)
+    return _cast_embeddings(result, float_dtype)
 
 @app.websocket("/extract")
 async def extract(websocket: WebSocket):
     await websocket.accept()
     try:
-        while True:
-            data = await websocket.receive_text()
-            result = run_extraction_agent(data)
-            await websocket.send_json(result)
+        await serve_pipelined(websocket, handle_extraction, text_is_json="auto")
+    except WebSocketDisconnect as e:
+        # A client closing the connection normally is not an error
+        if e.code not in CLEAN_CLOSE_CODES:
+            record_error(e)
+            print(f"[Extraction Agent] Connection closed or error: {str(e)}")
     except Exception as e:
+        record_error(e)
         print(f"[Extraction Agent] Connection closed or error: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="localhost", port=8001, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="localhost", port=8001, reload=True)
@@ -1,36 +1,38 @@
 from fastapi import FastAPI, WebSocket
 import uvicorn
+import asyncio
 import sys, os
 
 # Ensure parent directory is in the path to access reasoning_relation
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from Reasoning_agent_relation.reasoning_relation import run_reasoning_agent, adjust_relation_scores_with_peer
+from shared.executor import AgentExecutor
+from shared.model_registry import Readiness, add_health_routes
+from shared.metrics import add_metrics_routes
+from shared.reasoning_rounds import ReasoningRounds
 
 app = FastAPI()
-agent_cache = {}
+readiness = Readiness()
+add_health_routes(app, readiness)
+executor = AgentExecutor(preload=("Reasoning_agent_relation.reasoning_relation",))
+add_metrics_routes(app, "relation", executor)
+# Sessions, streaming prepares and peer exchange are shared with the other reasoning agent
+rounds = ReasoningRounds("Relation Agent", executor, run_reasoning_agent, adjust_relation_scores_with_peer)
+
+@app.on_event("startup")
+async def start_executor():
+    # Started in the background: /healthz answers at once, /ready once workers are up
+    app.state.startup = asyncio.create_task(readiness.run(executor.start))
+
+@app.on_event("shutdown")
+async def stop_executor():
+    executor.shutdown()
+    await rounds.close()
 
 @app.websocket("/reason")
 async def relation_reasoning(websocket: WebSocket):
     await websocket.accept()
-    try:
-        while True:
-            message = await websocket.receive_json()
-            step = message.get("step")
-
-            if step == "round1":
-                extraction_data = message["input"]
-                rel_results = run_reasoning_agent(extraction_data)
-                agent_cache[websocket] = (extraction_data, rel_results)
-                await websocket.send_json(rel_results)
-
-            elif step == "round2":
-                peer_summary = message["peer"]
-                _, own_results = agent_cache.get(websocket, (None, []))
-                adjusted_results = adjust_relation_scores_with_peer(peer_summary, own_results)
-                await websocket.send_json(adjusted_results)
-
-    except Exception as e:
-        print(f"[Relation Agent] WebSocket closed or errored: {e}")
+    await rounds.serve(websocket)
 
 if __name__ == "__main__":
-    uvicorn.run("relation_agent.main2:app", host="localhost", port=8005, reload=True)
+    uvicorn.run("Reasoning_agent_relation.main2:app", host="localhost", port=8005, reload=True)
@@ -1,35 +1,38 @@
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-
-def run_reasoning_agent(extraction_result):
-    concepts = extraction_result["concepts"]
-    embeddings = np.array(extraction_result["concept_embeddings"])
-    sentence_emb = np.array(extraction_result["sentence_embedding"])
-    relations = extraction_result["conceptnet_relations"]
-    extracted_goals = extraction_result.get("inferred_goals", {})
+from shared.scoring import score_concepts, score_concepts_batch, RELATION_AGENT_WEIGHTS
 
+def _build_results(extraction_result, scores, relation_counts):
+    extracted_goals = extraction_result.get("inferred_goals", {})
     results = []
-    max_rel = max(len(r) for r in relations.values()) or 1
-
-    for i, concept in enumerate(concepts):
-        sim = cosine_similarity([sentence_emb], [embeddings[i]])[0][0]
-        rels = relations.get(concept, [])
+    for concept, score, rel_count in zip(extraction_result["concepts"], scores, relation_counts):
         inferred = extracted_goals.get(concept, [])
 
-        score = 0.3 * sim + 0.7 * (len(rels) / max_rel)
-
         results.append({
             "agent": "RelationAgent",
             "concept": concept,
-            "score": round(score, 4),
+            "score": score,
             "inferred_goals": inferred,
-            "relation_count": len(rels),
+            "relation_count": rel_count,
             "inference": f"{concept} has {len(inferred)} goal(s) (Relation-weighted)"
         })
 
     return results
 
 
+def run_reasoning_agent(extraction_result, similarities=None):
+    # similarities: concept_similarities() computed ahead of the relations, if any
+    scores, relation_counts = score_concepts(extraction_result, RELATION_AGENT_WEIGHTS, similarities)
+    return _build_results(extraction_result, scores, relation_counts)
+
+
+def run_reasoning_agent_batch(extraction_results):
+    # Scores several queries with one stacked kernel call
+    scored = score_concepts_batch(extraction_results, RELATION_AGENT_WEIGHTS)
+    return [
+        _build_results(extraction_result, scores, relation_counts)
+        for extraction_result, (scores, relation_counts) in zip(extraction_results, scored)
+    ]
+
+
 def adjust_relation_scores_with_peer(peer_summary, own_results):
     peer_map = {item["concept"]: set(item["inferred_goals"]) for item in peer_summary}
 
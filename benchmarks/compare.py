@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+
+# Higher is better for throughput, lower for the rest
+METRICS = {"queries_per_s": 1, "p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "peak_rss_mb": -1}
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, candidate, threshold=0.1):
+    # Returns (rows, regressions); a row per stage, concurrency level and metric
+    # present in both reports. A change worse than `threshold` is a regression.
+    rows, regressions = [], []
+    for stage, base_stage in baseline["stages"].items():
+        new_stage = candidate["stages"].get(stage, {})
+        new_levels = {level["concurrency"]: level for level in new_stage.get("levels", [])}
+        for base_level in base_stage.get("levels", []):
+            new_level = new_levels.get(base_level["concurrency"])
+            if new_level is None:
+                continue
+            for metric, direction in METRICS.items():
+                old, new = base_level.get(metric), new_level.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                row = {"stage": stage, "concurrency": base_level["concurrency"], "metric": metric,
+                       "baseline": old, "candidate": new, "change": round(change, 4)}
+                rows.append(row)
+                if change * direction < -threshold:
+                    regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two pipeline_bench.py reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"baseline {baseline['meta'].get('commit')} -> candidate {candidate['meta'].get('commit')}")
+    print(f"{'stage':<12} {'conc':>4} {'metric':<14} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for row in rows:
+        flag = "  <-- regression" if row in regressions else ""
+        print(f"{row['stage']:<12} {row['concurrency']:>4} {row['metric']:<14} {row['baseline']:>10} "
+              f"{row['candidate']:>10} {row['change']:>+8.1%}{flag}")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+# Local stand-in for api.conceptnet.io: answers GET /c/en/<word> from a fixture,
+# optionally recording misses from the real API first. Point the agents at it
+# with CONCEPTNET_URL=http://127.0.0.1:<port> (and CONCEPTNET_CACHE_PATH= to
+# keep the SQLite edge cache out of the measurement).
+#
+# Fixture: {"words": {"<normalized word>": [[rel_label, end_label], ...]}}
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "conceptnet_fixture.json")
+
+
+def load_fixture(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {word: [tuple(edge) for edge in edges] for word, edges in json.load(f)["words"].items()}
+
+
+def save_fixture(words, path):
+    tmp_path = f"{path}.tmp"
+    # One word per line keeps recorded fixtures diffable
+    lines = [f" {json.dumps(word)}: {json.dumps([list(edge) for edge in edges])}"
+             for word, edges in sorted(words.items())]
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('{"words": {\n' + ",\n".join(lines) + "\n}}\n")
+    os.replace(tmp_path, path)
+
+
+def export_fixture(cache_path, path):
+    # Everything the agents' SQLite edge cache has seen, as a replayable fixture
+    with sqlite3.connect(cache_path) as conn:
+        rows = conn.execute("SELECT word, edges FROM edges").fetchall()
+    words = {word: [tuple(edge) for edge in json.loads(edges)] for word, edges in rows}
+    save_fixture(words, path)
+    return len(words)
+
+
+def create_app(fixture_path=DEFAULT_FIXTURE, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+               record_url=None, seed=None):
+    app = FastAPI()
+    words = load_fixture(fixture_path)
+    rng = random.Random(seed)
+    stats = {"requests": 0, "hits": 0, "misses": 0, "errors": 0, "recorded": 0}
+    upstream = httpx.AsyncClient(base_url=record_url, timeout=10.0) if record_url else None
+
+    async def _record(word):
+        response = await upstream.get(f"/c/en/{word}")
+        if response.status_code != 200:
+            return None
+        edges = [(e['rel']['label'], e['end']['label']) for e in response.json().get('edges', [])]
+        words[word] = edges
+        stats["recorded"] += 1
+        return edges
+
+    @app.get("/c/en/{word}")
+    async def lookup(word: str):
+        stats["requests"] += 1
+        delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+
+        edges = words.get(word)
+        if edges is None and upstream is not None:
+            edges = await _record(word)
+        if edges is None:
+            # Unknown words answer like ConceptNet does: no edges
+            stats["misses"] += 1
+            edges = []
+        else:
+            stats["hits"] += 1
+        return {"edges": [{"rel": {"label": rel}, "end": {"label": end}} for rel, end in edges]}
+
+    @app.get("/stats")
+    def get_stats():
+        return {**stats, "words": len(words)}
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        if upstream is not None:
+            await upstream.aclose()
+            save_fixture(words, fixture_path)
+            print(f"[ConceptNet Stub] Saved {len(words)} words to {fixture_path}")
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ConceptNet lookups from a recorded fixture")
+    parser.add_argument("fixture", nargs="?", default=DEFAULT_FIXTURE)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every lookup")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of lookups answered with 503")
+    parser.add_argument("--seed", type=int, help="seed for jitter and error injection")
+    parser.add_argument("--record", metavar="URL", nargs="?", const="http://api.conceptnet.io",
+                        help="fetch words missing from the fixture from this API and save them on exit")
+    parser.add_argument("--export-cache", metavar="SQLITE",
+                        help="write the agents' ConceptNet edge cache to the fixture and exit")
+    args = parser.parse_args(argv)
+
+    if args.export_cache:
+        print(f"[ConceptNet Stub] Exported {export_fixture(args.export_cache, args.fixture)} words")
+        return
+    app = create_app(args.fixture, args.latency_ms, args.jitter_ms, args.error_rate, args.record, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
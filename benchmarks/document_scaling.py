@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from pipeline_bench import DEFAULT_QUERIES, load_queries, start_stub, stop
+from conceptnet_stub import DEFAULT_FIXTURE
+
+# Docs/s of the document mode (shared/document_extraction.py) with 1..N spaCy
+# processes. Each level is a fresh CLI run over the same corpus, so model
+# loading is paid per level but kept out of the timings.
+
+
+def _process_counts(spec):
+    if spec:
+        return [int(n) for n in spec.split(",")]
+    cpus = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    return counts + [cpus]
+
+
+def build_corpus(args, directory):
+    # Synthetic transcripts: the benchmark queries shuffled into paragraphs
+    rng = random.Random(args.seed)
+    queries = load_queries(args.queries)
+    paths = []
+    for i in range(args.documents):
+        path = os.path.join(directory, f"doc_{i:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for _ in range(args.sentences // args.paragraph):
+                f.write(" ".join(rng.choice(queries).rstrip(".?!") + "." for _ in range(args.paragraph)))
+                f.write("\n\n")
+        paths.append(path)
+    return paths
+
+
+def run_level(args, paths, n_process, env):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as summary_file:
+        summary_path = summary_file.name
+    command = [sys.executable, "-m", "shared.document_extraction", *paths, "-o", os.devnull,
+               "--n-process", str(n_process), "--batch-size", str(args.batch_size),
+               "--window", str(args.window), "--summary", summary_path]
+    if args.no_conceptnet:
+        command.append("--no-conceptnet")
+    try:
+        result = subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else
+                               f"exit code {result.returncode}")
+        with open(summary_path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(summary_path)
+
+
+def run(args):
+    directory = None
+    paths = args.inputs
+    if not paths:
+        directory = tempfile.mkdtemp(prefix="document_scaling_")
+        paths = build_corpus(args, directory)
+    stub = None
+    env = dict(os.environ, CONCEPTNET_CACHE_PATH="")
+    if not args.no_conceptnet:
+        stub, env["CONCEPTNET_URL"] = start_stub(args)
+    levels = []
+    try:
+        for n_process in args.n_process:
+            try:
+                level = run_level(args, paths, n_process, env)
+            except Exception as e:
+                print(f"[Document Scaling] n_process {n_process} failed: {e}")
+                levels.append({"n_process": n_process, "error": str(e)})
+                break
+            base = levels[0] if levels else level
+            level["speedup"] = round(level["docs_per_s"] / base["docs_per_s"], 2) if base["docs_per_s"] else None
+            level["efficiency"] = round(level["speedup"] * base["n_process"] / n_process, 2) \
+                if level["speedup"] is not None else None
+            print(f"[Document Scaling] n_process {n_process}: {level}")
+            levels.append(level)
+    finally:
+        if stub is not None:
+            stop([stub])
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+    return {
+        "config": {
+            "documents": len(paths), "batch_size": args.batch_size, "window": args.window,
+            "conceptnet": not args.no_conceptnet, "seed": args.seed
+        },
+        "machine": {"cpus": os.cpu_count(), "platform": platform.platform(), "python": platform.python_version()},
+        "levels": levels
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Document-mode docs/s from 1 to N spaCy processes")
+    parser.add_argument("inputs", nargs="*", help="text files to use instead of the synthetic corpus")
+    parser.add_argument("--n-process", type=_process_counts, default=_process_counts(None),
+                        help="comma-separated process counts (default: powers of two up to the core count)")
+    parser.add_argument("--documents", type=int, default=40, help="synthetic documents")
+    parser.add_argument("--sentences", type=int, default=500, help="sentences per synthetic document")
+    parser.add_argument("--paragraph", type=int, default=5, help="sentences per synthetic paragraph")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="sentences the synthetic corpus is drawn from")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--window", type=int, default=256)
+    parser.add_argument("--no-conceptnet", action="store_true", help="skip the lookups instead of using the stub")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="ConceptNet stub fixture")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from run_batch import LatencyStats
+from pipeline_bench import DEFAULT_QUERIES, load_queries, measure_async, start_services, start_stub, stop
+from conceptnet_stub import DEFAULT_FIXTURE
+
+# Open-loop load at 1x..5x the pipeline's measured capacity: queries arrive on
+# a Poisson schedule whether or not earlier ones have finished, which is what
+# overload looks like in production (a closed loop would just slow down).
+# "admission" runs the services with an in-flight limit and the client with a
+# query budget; "peer" does the same with the agents exchanging round 1
+# directly (AGENT_PEER_MODE); "unlimited" runs them the way they were before
+# either existed. Each mode: (service env, budget_ms, peer_mode).
+MODES = {
+    "admission": lambda args: ({"AGENT_MAX_IN_FLIGHT": str(args.max_in_flight)}, args.budget_ms, False),
+    "peer": lambda args: ({"AGENT_MAX_IN_FLIGHT": str(args.max_in_flight)}, args.budget_ms, True),
+    "unlimited": lambda args: ({"AGENT_MAX_IN_FLIGHT": "0"}, 0, False)
+}
+
+
+async def measure_capacity(client, args):
+    for query in args.queries[:args.warmup]:
+        await client.run_query(query)
+    level = await measure_async(client.run_query, args.queries, args.capacity_concurrency, args.capacity_requests)
+    return level["queries_per_s"]
+
+
+async def offered_load(client, args, rate, budget_ms):
+    # Poisson arrivals at `rate` queries/s for args.duration seconds
+    rng = random.Random(args.seed)
+    stats = LatencyStats()
+    outcomes = Counter()
+
+    async def one(query):
+        started = time.perf_counter()
+        try:
+            result = await client.run_query(query, budget_ms=budget_ms)
+        except Exception as e:
+            outcomes[type(e).__name__] += 1
+            return
+        outcomes["degraded" if result.get("degraded") else "ok"] += 1
+        stats.add((time.perf_counter() - started) * 1000)
+
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    while next_arrival - started < args.duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        tasks.append(asyncio.ensure_future(one(args.queries[len(tasks) % len(args.queries)])))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    summary = stats.summary(elapsed)
+    return {
+        "offered_qps": round(len(tasks) / args.duration, 2),
+        # Answered queries per second, degraded ones included
+        "goodput_qps": summary["queries_per_s"],
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"],
+        "drain_s": round(max(0.0, elapsed - args.duration), 2),
+        "outcomes": dict(outcomes)
+    }
+
+
+async def _run_mode(args, uris, budget_ms, peer_mode):
+    from shared.agent_client import AgentClient
+
+    # Caches off: every query reaches the agents
+    options = dict(pool_size=args.pool_size, cache=None, semantic_cache=False, budget_ms=0, peer_mode=peer_mode)
+    if uris:
+        client = AgentClient(uris["extraction"], uris["similarity"], uris["relation"], uris["coordinator"],
+                             similarity_peer_uri=uris["similarity"], relation_peer_uri=uris["relation"], **options)
+    else:
+        client = AgentClient(**options)
+    async with client:
+        capacity = args.capacity or await measure_capacity(client, args)
+        print(f"[Overload] capacity {capacity} queries/s")
+        levels = []
+        for multiplier in args.multipliers:
+            level = await offered_load(client, args, capacity * multiplier, budget_ms)
+            level["multiplier"] = multiplier
+            print(f"[Overload] x{multiplier}: {level}")
+            levels.append(level)
+    return {"capacity_qps": capacity, "budget_ms": budget_ms, "levels": levels}
+
+
+def run_mode(args, mode):
+    env, budget_ms, peer_mode = MODES[mode](args)
+    processes, uris = {}, None
+    try:
+        if not args.external_services:
+            processes, uris = start_services(args, env)
+        return asyncio.run(_run_mode(args, uris, budget_ms, peer_mode))
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        stop(processes.values())
+
+
+def run(args):
+    report = {
+        "config": {
+            "multipliers": args.multipliers, "duration_s": args.duration, "budget_ms": args.budget_ms,
+            "max_in_flight": args.max_in_flight, "stub_latency_ms": args.stub_latency_ms,
+            "stub_jitter_ms": args.stub_jitter_ms, "seed": args.seed, "cpu_count": os.cpu_count()
+        },
+        "modes": {}
+    }
+    stub = None
+    if args.conceptnet_url is None and not args.external_services:
+        stub, args.conceptnet_url = start_stub(args)
+    try:
+        for mode in args.modes:
+            report["modes"][mode] = run_mode(args, mode)
+            if "error" in report["modes"][mode]:
+                print(f"[Overload] {mode} skipped: {report['modes'][mode]['error']}")
+    finally:
+        if stub is not None:
+            stop([stub])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and goodput of the pipeline under 1-5x overload")
+    parser.add_argument("--modes", default="admission,peer,unlimited", help=f"comma-separated, any of {', '.join(MODES)}")
+    parser.add_argument("--multipliers", default="1,2,3,5", help="offered load as multiples of the capacity")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of arrivals per level")
+    parser.add_argument("--budget-ms", type=float, default=2000.0, help="query budget in admission mode")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="per-service limit in admission mode")
+    parser.add_argument("--capacity", type=float, help="queries/s to scale from, instead of measuring it")
+    parser.add_argument("--capacity-concurrency", type=int, default=8)
+    parser.add_argument("--capacity-requests", type=int, default=100)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="text file, one query per line")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="ConceptNet fixture served by the stub")
+    parser.add_argument("--conceptnet-url", help="use this ConceptNet instead of starting the stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=25.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--external-services", action="store_true",
+                        help="load the services at the usual *_URI addresses (one mode, as configured there)")
+    parser.add_argument("--pool-size", type=int, default=2, help="client connections per agent")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+    args.modes = args.modes.split(",")
+    unknown = [m for m in args.modes if m not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+    if args.external_services:
+        args.modes = args.modes[:1]
+    args.multipliers = [float(m) for m in args.multipliers.split(",")]
+    args.queries = load_queries(args.queries)
+
+    report = run(args)
+    print(json.dumps(report["modes"], indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
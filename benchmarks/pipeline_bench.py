@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from run_batch import LatencyStats
+from startup_time import SERVICES
+from conceptnet_stub import DEFAULT_FIXTURE
+
+DEFAULT_QUERIES = os.path.join(BENCH_DIR, "fixtures", "queries.txt")
+STAGES = ["extraction", "encode", "conceptnet", "similarity", "relation", "coordinator", "pipeline"]
+# WebSocket path of each pipeline service
+SERVICE_PATHS = {"extraction": "/extract", "similarity": "/reason", "relation": "/reason", "coordinator": "/coordinator"}
+
+
+# ---------------------- Process Memory ---------------------- #
+def _status_kb(pid, field):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _descendants(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        return []
+    return children + [d for child in children for d in _descendants(child)]
+
+
+def peak_rss_mb(pid="self", tree=False):
+    # High-water mark (VmHWM) of the process, plus its descendants (worker pools)
+    pids = [pid] + (_descendants(pid) if tree else [])
+    sizes = [_status_kb(p, "VmHWM") for p in pids]
+    sizes = [s for s in sizes if s is not None]
+    return round(sum(sizes) / 1024, 1) if sizes else None
+
+
+# ---------------------- Inputs ---------------------- #
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def content_words(query):
+    return [w.strip(".,?!'") for w in query.lower().split() if len(w.strip(".,?!'")) > 3]
+
+
+def synthetic_extraction(query, rng, dim=768, relations=5):
+    # Stand-in for run_extraction_agent(query, as_lists=False), so the scoring
+    # stages are measured without spaCy, the encoder or ConceptNet
+    concepts = content_words(query) or [query.lower()]
+    embeddings = rng.normal(size=(len(concepts) + 1, dim)).astype(np.float32)
+    return {
+        "concepts": concepts,
+        "ranked_concepts": [],
+        "sentence_embedding": embeddings[0],
+        "concept_embeddings": embeddings[1:],
+        "categorized_concepts": {},
+        "conceptnet_relations": {
+            c: [("RelatedTo", f"{c}_{i}") for i in range(int(rng.integers(0, relations + 1)))] for c in concepts
+        }
+    }
+
+
+# ---------------------- Stage Setup ---------------------- #
+# Each returns call(query) -> anything; imports are local so a stage whose
+# dependencies are missing fails on its own
+def _setup_extraction(args):
+    from shared.cocoex_utils import get_nlp, extract_contextual_concepts, categorize_concepts
+
+    get_nlp()
+    return lambda query: categorize_concepts(extract_contextual_concepts(query))
+
+
+def _setup_encode(args):
+    # The embedding model itself (through the micro-batcher), not the cache
+    from shared import cocoex_utils
+
+    service = cocoex_utils.registry.get("embedding_service")
+    return lambda query: service.encode([query] + content_words(query))
+
+
+def _setup_conceptnet(args):
+    from shared.conceptnet_client import ConceptNetClient
+
+    client = ConceptNetClient(base_url=args.conceptnet_url, cache_path="")
+    return lambda query: client.lookup_many(content_words(query))
+
+
+def _synthetic_inputs(args):
+    rng = np.random.default_rng(args.seed)
+    return {query: synthetic_extraction(query, rng) for query in args.queries}
+
+
+def _setup_similarity(args):
+    from similarity_agent.similarity_logic import run_similarity_agent
+
+    inputs = _synthetic_inputs(args)
+    return lambda query: run_similarity_agent(inputs[query])
+
+
+def _setup_relation(args):
+    from Reasoning_agent_relation.reasoning_relation import run_reasoning_agent
+
+    inputs = _synthetic_inputs(args)
+    return lambda query: run_reasoning_agent(inputs[query])
+
+
+def _setup_coordinator(args):
+    from similarity_agent.similarity_logic import run_similarity_agent
+    from Reasoning_agent_relation.reasoning_relation import run_reasoning_agent
+    from coordinator.coordinator_logic import merge_agent_results
+
+    inputs = _synthetic_inputs(args)
+    rounds = {q: (run_similarity_agent(e), run_reasoning_agent(e)) for q, e in inputs.items()}
+    return lambda query: merge_agent_results(*rounds[query])
+
+
+STAGE_SETUP = {
+    "extraction": _setup_extraction,
+    "encode": _setup_encode,
+    "conceptnet": _setup_conceptnet,
+    "similarity": _setup_similarity,
+    "relation": _setup_relation,
+    "coordinator": _setup_coordinator,
+}
+
+
+# ---------------------- Measurement ---------------------- #
+def _level_summary(stats, elapsed, concurrency):
+    return {"concurrency": concurrency, **stats.summary(elapsed), "peak_rss_mb": peak_rss_mb()}
+
+
+def measure_sync(call, queries, concurrency, requests):
+    stats = LatencyStats()
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            call(queries[i % len(queries)])
+        except Exception:
+            stats.errors += 1
+            return
+        stats.add((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return _level_summary(stats, time.perf_counter() - started, concurrency)
+
+
+async def measure_async(call, queries, concurrency, requests):
+    stats = LatencyStats()
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await call(queries[i % len(queries)])
+            except Exception:
+                stats.errors += 1
+                continue
+            stats.add((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _level_summary(stats, time.perf_counter() - started, concurrency)
+
+
+def run_stage(name, args):
+    try:
+        call = STAGE_SETUP[name](args)
+        for query in args.queries[:args.warmup]:
+            call(query)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    levels = []
+    for concurrency in args.concurrency:
+        level = measure_sync(call, args.queries, concurrency, args.requests)
+        print(f"[Benchmark] {name} x{concurrency}: {level}")
+        levels.append(level)
+    return {"levels": levels}
+
+
+# ---------------------- Services ---------------------- #
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}")
+        try:
+            response = httpx.get(url, timeout=1.0)
+        except httpx.HTTPError:
+            response = None
+        if response is not None and response.status_code == 200:
+            return
+        if response is not None and response.status_code == 503 and response.json().get("error"):
+            # Startup failed (e.g. a model is missing): no point in waiting
+            raise RuntimeError(f"{url}: {response.json()['error']}")
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def start_stub(args):
+    port = _free_port()
+    command = [sys.executable, os.path.join(BENCH_DIR, "conceptnet_stub.py"), args.fixture, "--port", str(port),
+               "--latency-ms", str(args.stub_latency_ms), "--jitter-ms", str(args.stub_jitter_ms),
+               "--error-rate", str(args.stub_error_rate), "--seed", str(args.seed)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    _wait_ready(f"{url}/stats", process, 30)
+    return process, url
+
+
+def start_services(args, extra_env=None):
+    # Each service in its own uvicorn process, reading ConceptNet from the stub
+    env = dict(os.environ, CONCEPTNET_URL=args.conceptnet_url, CONCEPTNET_CACHE_PATH="", **(extra_env or {}))
+    processes, uris = {}, {}
+    for name, path in SERVICE_PATHS.items():
+        port = _free_port()
+        module, attr = SERVICES[name]
+        processes[name] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{module}:{attr}", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+        )
+        uris[name] = f"ws://127.0.0.1:{port}{path}"
+    try:
+        for name, uri in uris.items():
+            port = uri.split(":")[2].split("/")[0]
+            _wait_ready(f"http://127.0.0.1:{port}/ready", processes[name], args.ready_timeout)
+    except Exception:
+        stop(processes.values())
+        raise
+    return processes, uris
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _pipeline_levels(args, uris, processes):
+    from shared.agent_client import AgentClient
+
+    # Caches off: every request runs the whole pipeline
+    client = AgentClient(
+        uris["extraction"], uris["similarity"], uris["relation"], uris["coordinator"],
+        pool_size=args.pool_size, cache=None, semantic_cache=False
+    ) if uris else AgentClient(pool_size=args.pool_size, cache=None, semantic_cache=False)
+    levels = []
+    async with client:
+        for query in args.queries[:args.warmup]:
+            await client.run_query(query)
+        for concurrency in args.concurrency:
+            level = await measure_async(client.run_query, args.queries, concurrency, args.requests)
+            level["service_peak_rss_mb"] = {
+                name: peak_rss_mb(process.pid, tree=True) for name, process in processes.items()
+            } or None
+            print(f"[Benchmark] pipeline x{concurrency}: {level}")
+            levels.append(level)
+    return levels
+
+
+def run_pipeline_stage(args):
+    processes, uris = {}, None
+    try:
+        if not args.external_services:
+            processes, uris = start_services(args)
+        return {"levels": asyncio.run(_pipeline_levels(args, uris, processes))}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        stop(processes.values())
+
+
+# ---------------------- Driver ---------------------- #
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "config": {
+            "stages": args.stages, "concurrency": args.concurrency, "requests": args.requests,
+            "queries": len(args.queries), "stub_latency_ms": args.stub_latency_ms,
+            "stub_jitter_ms": args.stub_jitter_ms, "stub_error_rate": args.stub_error_rate, "seed": args.seed
+        },
+        "stages": {}
+    }
+    stub = None
+    if args.conceptnet_url is None and {"conceptnet", "pipeline"} & set(args.stages):
+        stub, args.conceptnet_url = start_stub(args)
+    try:
+        for name in args.stages:
+            report["stages"][name] = run_pipeline_stage(args) if name == "pipeline" else run_stage(name, args)
+            if "error" in report["stages"][name]:
+                print(f"[Benchmark] {name} skipped: {report['stages'][name]['error']}")
+    finally:
+        if stub is not None:
+            stop([stub])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage and the full WebSocket pipeline")
+    parser.add_argument("stages", nargs="*", help=f"any of {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="text file, one query per line")
+    parser.add_argument("-c", "--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each stage")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="ConceptNet fixture served by the stub")
+    parser.add_argument("--conceptnet-url", help="use this ConceptNet instead of starting the stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=20.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--external-services", action="store_true",
+                        help="benchmark the services at the usual *_URI addresses instead of starting them")
+    parser.add_argument("--pool-size", type=int, default=2, help="client connections per agent")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+
+    args.stages = args.stages or STAGES
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.queries = load_queries(args.queries)
+    report = run(args)
+    print(json.dumps(report["stages"], indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
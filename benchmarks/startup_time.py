@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# name -> (module imported by uvicorn, app attribute)
+SERVICES = {
+    "extraction": ("Extraction_agent.main", "app"),
+    "similarity": ("similarity_agent.main1", "app"),
+    "relation": ("Reasoning_agent_relation.main2", "app"),
+    "coordinator": ("coordinator.main", "app"),
+    "sonar": ("sonar_api.main", "app"),
+}
+
+_IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, {root!r}); started = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - started)"
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(module, env):
+    # Fresh interpreter each time, so nothing is already in sys.modules
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET.format(root=ROOT, module=module)],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+    return {"import_s": round(float(result.stdout.strip().splitlines()[-1]), 3), "process_s": round(total, 3)}
+
+
+def measure_ready(module, attr, env, timeout):
+    # Seconds from spawning uvicorn until /healthz and then /ready answer 200
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:{attr}", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    timings = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    timings["error"] = (process.stderr.read().strip().splitlines() or ["exited"])[-1]
+                    break
+                for endpoint in ("healthz", "ready"):
+                    if endpoint in timings:
+                        continue
+                    try:
+                        response = client.get(f"/{endpoint}")
+                    except httpx.HTTPError:
+                        break
+                    if response.status_code != 200:
+                        if endpoint == "ready" and response.json().get("error"):
+                            timings["error"] = response.json()["error"]
+                        break
+                    timings[endpoint] = round(time.perf_counter() - started, 3)
+                if "ready" in timings or "error" in timings:
+                    break
+                time.sleep(0.02)
+            else:
+                timings["error"] = f"not ready after {timeout}s"
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"healthz_s": timings.get("healthz"), "ready_s": timings.get("ready"), "error": timings.get("error")}
+
+
+def run(services, runs=1, timeout=180.0, warmup=True):
+    env = dict(os.environ, MODEL_WARMUP="1" if warmup else "0")
+    report = {}
+    for name in services:
+        module, attr = SERVICES[name]
+        samples = []
+        for _ in range(runs):
+            sample = measure_import(module, env)
+            if "error" not in sample:
+                sample.update(measure_ready(module, attr, env, timeout))
+            samples.append(sample)
+            print(f"[Startup] {name}: {sample}")
+        report[name] = samples
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-ready of each service")
+    parser.add_argument("services", nargs="*", help=f"any of {', '.join(SERVICES)} (default: all but sonar)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=180.0, help="seconds to wait for /ready")
+    parser.add_argument("--no-warmup", action="store_true", help="start with MODEL_WARMUP=0")
+    parser.add_argument("--output", help="write the JSON report here as well")
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.services if s not in SERVICES]
+    if unknown:
+        parser.error(f"unknown services: {', '.join(unknown)}")
+
+    services = args.services or [s for s in SERVICES if s != "sonar"]
+    report = run(services, args.runs, args.timeout, not args.no_warmup)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
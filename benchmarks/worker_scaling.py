@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from launcher import DEFAULT_CONFIG, children, load_config, service_memory
+from pipeline_bench import DEFAULT_QUERIES, _free_port, _wait_ready, load_queries, measure_async, start_stub, stop
+from conceptnet_stub import DEFAULT_FIXTURE
+
+# Throughput and memory of one service run by launcher.py with 1..N forked
+# workers, ConceptNet answered by the local stub. Every WebSocket connection is
+# pinned to the worker that accepted it, so the client opens several per worker.
+
+
+def _worker_counts(spec):
+    if spec:
+        return [int(n) for n in spec.split(",")]
+    cpus = os.cpu_count() or 1
+    counts, n = [], 1
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    return counts + [cpus]
+
+
+def start_launcher(args, service, workers, env):
+    port = _free_port()
+    config = {
+        "host": "127.0.0.1",
+        "ready_timeout": args.ready_timeout,
+        "services": {args.service: {**service, "port": port, "workers": workers, "threads": None}}
+    }
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    with config_file:
+        json.dump(config, config_file)
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "launcher.py"), config_file.name],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/ready", process, args.ready_timeout)
+    except Exception:
+        stop([process])
+        raise
+    finally:
+        os.unlink(config_file.name)
+    return process, port
+
+
+async def _measure(args, uri, workers):
+    from shared.agent_client import AgentPool
+
+    pool = AgentPool(uri, size=workers * args.connections_per_worker)
+    try:
+        await pool.connect_all()
+        for query in args.queries[:args.warmup * workers]:
+            await pool.request({"text": query})
+        concurrency = workers * args.concurrency_per_worker
+        return await measure_async(lambda query: pool.request({"text": query}), args.queries, concurrency,
+                                   args.requests)
+    finally:
+        await pool.close()
+
+
+def run_level(args, service, workers, env):
+    process, port = start_launcher(args, service, workers, env)
+    try:
+        level = asyncio.run(_measure(args, f"ws://127.0.0.1:{port}{args.path}", workers))
+        # The launcher's only child is the service master; its children are the workers
+        masters = children(process.pid)
+        memory = service_memory(masters[0]) if masters else None
+    finally:
+        stop([process])
+    if memory is not None:
+        pss = [m["pss_mb"] for m in memory["workers"].values()]
+        level["worker_pss_mb"] = round(sum(pss) / len(pss), 1) if pss else None
+        level["worker_private_mb"] = round(
+            sum(m["private_mb"] for m in memory["workers"].values()) / max(len(pss), 1), 1)
+        level["total_pss_mb"] = memory["total_pss_mb"]
+    return {"workers": workers, **level}
+
+
+def run(args):
+    service = load_config(args.config)["services"][args.service]
+    service = {key: service[key] for key in ("app", "preload", "env")}
+    stub, conceptnet_url = start_stub(args)
+    env = dict(os.environ, CONCEPTNET_URL=conceptnet_url, CONCEPTNET_CACHE_PATH="", RESULT_CACHE="0")
+    levels = []
+    try:
+        for workers in args.workers:
+            level = run_level(args, service, workers, env)
+            base = levels[0] if levels else level
+            level["speedup"] = round(level["queries_per_s"] / base["queries_per_s"], 2) \
+                if base.get("queries_per_s") else None
+            level["efficiency"] = round(level["speedup"] * base["workers"] / workers, 2) \
+                if level["speedup"] is not None else None
+            print(f"[Worker Scaling] {args.service} x{workers}: {level}")
+            levels.append(level)
+    finally:
+        stop([stub])
+    return {
+        "service": args.service,
+        "machine": {"cpus": os.cpu_count(), "platform": platform.platform(), "python": platform.python_version()},
+        "levels": levels
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and per-worker memory from 1 to N forked workers")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="launcher config the service is taken from")
+    parser.add_argument("--service", default="extraction")
+    parser.add_argument("--path", default="/extract", help="WebSocket path of the service")
+    parser.add_argument("--workers", type=_worker_counts, default=_worker_counts(None),
+                        help="comma-separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--queries", type=load_queries, default=load_queries(DEFAULT_QUERIES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per worker count")
+    parser.add_argument("--concurrency-per-worker", type=int, default=4)
+    parser.add_argument("--connections-per-worker", type=int, default=2)
+    parser.add_argument("--warmup", type=int, default=2, help="warmup requests per worker")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="ConceptNet stub fixture")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
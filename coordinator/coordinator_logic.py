@@ -0,0 +1,91 @@
+import heapq
+
+from shared.metrics import stage
+
+# Concepts returned in the final inference
+FINAL_TOP_K = 3
+# (average agent score weight, goal count weight) in the composite score
+COORDINATOR_WEIGHTS = (0.8, 0.2)
+# Canonical order of the agents' parts: ties, goals and sources come out as if
+# the parts had been added in this order, whichever agent answered first
+AGENT_ORDER = ("SimilarityAgent", "RelationAgent")
+
+
+def _agent_rank(agent_name):
+    # Agents outside AGENT_ORDER come after it, by name
+    if agent_name in AGENT_ORDER:
+        return AGENT_ORDER.index(agent_name), ""
+    return len(AGENT_ORDER), agent_name or ""
+
+
+# ---------------------- Incremental Merge ---------------------- #
+class StreamingMerger:
+    # Agent results can be added in any order, one concept at a time; each
+    # concept's composite score is updated as its votes arrive and the top k
+    # is picked with a bounded heap instead of sorting every concept.
+    def __init__(self, k=FINAL_TOP_K, weights=COORDINATOR_WEIGHTS):
+        self.k = k
+        self.weights = tuple(weights)
+        self.concepts = {}
+        self._added = {}
+        self._ranked = None
+
+    def add(self, agent_name, item):
+        # position: where the item would be in the canonically ordered parts
+        rank = _agent_rank(agent_name)
+        position = (rank, self._added.get(agent_name, 0))
+        self._added[agent_name] = position[1] + 1
+        concept = item["concept"]
+        state = self.concepts.get(concept)
+        if state is None:
+            state = self.concepts[concept] = {
+                "score_sum": 0.0, "votes": 0, "goals": {}, "sources": {}, "first": position
+            }
+        state["first"] = min(state["first"], position)
+        state["score_sum"] += float(item["score"])
+        state["votes"] += 1
+        for i, goal in enumerate(item["inferred_goals"]):
+            goal_position = (position, i)
+            if goal not in state["goals"] or goal_position < state["goals"][goal]:
+                state["goals"][goal] = goal_position
+        state["sources"][agent_name] = rank
+
+        w_score, w_goals = self.weights
+        avg_score = state["score_sum"] / state["votes"]
+        state["avg_score"] = avg_score
+        state["composite_score"] = round(w_score * avg_score + w_goals * len(state["goals"]), 4)
+        self._ranked = None
+
+    def add_many(self, agent_name, items):
+        # Without an agent_name each item's own "agent" field is used
+        for item in items:
+            self.add(agent_name or item["agent"], item)
+
+    def top_k(self):
+        # Ties keep their canonical first-seen order, like the stable sort of the
+        # batch merge, so the output does not depend on which part came first
+        if self._ranked is None:
+            best = heapq.nsmallest(self.k, self.concepts.items(),
+                                   key=lambda kv: (-kv[1]["composite_score"], kv[1]["first"]))
+            self._ranked = [
+                {
+                    "concept": concept,
+                    "avg_score": round(state["avg_score"], 4),
+                    "goal_count": len(state["goals"]),
+                    "goals": sorted(state["goals"], key=state["goals"].get),
+                    "composite_score": state["composite_score"],
+                    "sources": sorted(state["sources"], key=lambda agent: (state["sources"][agent], agent))
+                }
+                for concept, state in best
+            ]
+        return self._ranked
+
+
+def merge_agent_results(similarity_results, relation_results, k=FINAL_TOP_K, weights=COORDINATOR_WEIGHTS):
+    with stage("merge"):
+        merger = StreamingMerger(k, weights)
+        merger.add_many("SimilarityAgent", similarity_results)
+        merger.add_many("RelationAgent", relation_results)
+        return {
+            "final_inference": merger.top_k()
+        }
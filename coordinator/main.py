@@ -1,61 +1,104 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import uvicorn
-import json
+import asyncio
+import sys, os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from coordinator.coordinator_logic import merge_agent_results, StreamingMerger, FINAL_TOP_K, COORDINATOR_WEIGHTS
+from shared.executor import AgentExecutor, serve_pipelined
+from shared.model_registry import Readiness, add_health_routes
+from shared.metrics import add_metrics_routes, record_error, stage, watch_queue
+from shared.wire import CLEAN_CLOSE_CODES
 
 app = FastAPI()
+readiness = Readiness()
+add_health_routes(app, readiness)
+executor = AgentExecutor(preload=("coordinator.coordinator_logic",))
+# Open merge streams by stream_id; any connection may feed a stream
+streams = {}
+# Streams not closed within this many seconds are dropped
+STREAM_TTL = float(os.environ.get("COORDINATOR_STREAM_TTL", "60"))
+add_metrics_routes(app, "coordinator", executor)
+watch_queue("streams", lambda: len(streams))
+
+@app.on_event("startup")
+async def start_executor():
+    # Started in the background: /healthz answers at once, /ready once workers are up
+    app.state.startup = asyncio.create_task(readiness.run(executor.start))
+
+@app.on_event("shutdown")
+def stop_executor():
+    executor.shutdown()
+
+def _top_k(message):
+    # Missing or None (the client's "no override") means FINAL_TOP_K; an
+    # explicit k has to be a positive integer
+    k = message.get("k", FINAL_TOP_K)
+    if k is None:
+        return FINAL_TOP_K
+    if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+        raise ValueError(f"k must be a positive integer, got {k!r}")
+    return k
+
+def _open_stream(message):
+    now = time.monotonic()
+    for stream_id in [s for s, stream in streams.items() if now - stream["opened"] > STREAM_TTL]:
+        del streams[stream_id]
+    stream = streams.get(message["stream_id"])
+    if stream is None:
+        # parts: "items" messages still expected; None keeps it open until "close"
+        stream = streams[message["stream_id"]] = {
+            "merger": StreamingMerger(_top_k(message), message.get("weights") or COORDINATOR_WEIGHTS),
+            "parts": message.get("parts"),
+            "opened": now
+        }
+    return stream
+
+def handle_stream(message):
+    # Protocol: any number of "items" messages ({"agent", "items"}, one or more
+    # concepts each) answered with the provisional top k, then the final top k
+    # on "close" or once the announced number of "parts" has arrived
+    step = message["step"]
+    stream = _open_stream(message)
+    merger = stream["merger"]
+
+    with stage("merge"):
+        if step == "items":
+            merger.add_many(message.get("agent"), message.get("items", []))
+            if stream["parts"] is not None:
+                stream["parts"] -= 1
+        top_k = merger.top_k()
+
+    if step == "close" or stream["parts"] == 0:
+        streams.pop(message["stream_id"], None)
+        return {"final_inference": top_k}
+    return {"final_inference": top_k, "provisional": True}
+
+async def handle_merge(message, binary):
+    # Stream updates are cheap and order-sensitive, so they run on the loop
+    if message.get("step") in ("open", "items", "close"):
+        return handle_stream(message)
+
+    similarity_results = message.get("similarity", [])
+    relation_results = message.get("relation", [])
+    k = _top_k(message)
+    weights = message.get("weights") or COORDINATOR_WEIGHTS
+    return await executor.run(merge_agent_results, similarity_results, relation_results, k, weights)
 
 @app.websocket("/coordinator")
 async def coordinator_agent(websocket: WebSocket):
     await websocket.accept()
     try:
-        while True:
-            message = await websocket.receive_json()
-            similarity_results = message.get("similarity", [])
-            relation_results = message.get("relation", [])
-
-            concept_votes = {}
-
-            # Collect and organize all results from both agents
-            for agent_name, agent_data in [("SimilarityAgent", similarity_results), ("RelationAgent", relation_results)]:
-                for item in agent_data:
-                    concept = item["concept"]
-                    score = item["score"]
-                    goals = item["inferred_goals"]
-
-                    if concept not in concept_votes:
-                        concept_votes[concept] = []
-
-                    concept_votes[concept].append({
-                        "agent": agent_name,
-                        "score": score,
-                        "goals": goals
-                    })
-
-            # Compute final merged scores with weighted logic
-            final_ranked = []
-            for concept, votes in concept_votes.items():
-                avg_score = sum(v["score"] for v in votes) / len(votes)
-                all_goals = set(g for v in votes for g in v["goals"])
-                goal_count = len(all_goals)
-                composite_score = 0.8 * avg_score + 0.2 * goal_count
-
-                final_ranked.append({
-                    "concept": concept,
-                    "avg_score": round(avg_score, 4),
-                    "goal_count": goal_count,
-                    "goals": list(all_goals),
-                    "composite_score": round(composite_score, 4),
-                    "sources": list({v["agent"] for v in votes})
-                })
-
-            # Sort by composite score
-            final_ranked.sort(key=lambda x: x["composite_score"], reverse=True)
-
-            await websocket.send_json({
-                "final_inference": final_ranked[:3]
-            })
-
+        # Stream parts belong to queries the reasoning agents already admitted
+        await serve_pipelined(websocket, handle_merge, exempt=("items", "close"))
+    except WebSocketDisconnect as e:
+        # A client closing the connection normally is not an error
+        if e.code not in CLEAN_CLOSE_CODES:
+            record_error(e)
+            print("[Coordinator] WebSocket closed or error:", str(e))
     except Exception as e:
+        record_error(e)
         print("[Coordinator] WebSocket closed or error:", str(e))
 
 if __name__ == "__main__":
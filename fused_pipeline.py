@@ -0,0 +1,109 @@
+import argparse
+import json
+import sys, os
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from shared.cocoex_utils import run_extraction_agent, encode_texts, EMBEDDING_MODEL_ID
+from similarity_agent.similarity_logic import (
+    run_similarity_agent, run_similarity_agent_batch, adjust_similarity_scores_with_peer
+)
+from Reasoning_agent_relation.reasoning_relation import (
+    run_reasoning_agent, run_reasoning_agent_batch, adjust_relation_scores_with_peer
+)
+from coordinator.coordinator_logic import merge_agent_results
+from shared.result_cache import RESULT_CACHE, result_cache, pipeline_version
+from shared.semantic_cache import SEMANTIC_CACHE, get_semantic_cache, with_match
+
+# In-process version of run_agents.communicate_with_agents: the same stages as
+# direct function calls on shared NumPy arrays, with no WebSocket hops.
+
+def _rounds_and_merge(extract_response, sim_round1, rel_round1):
+    # Round 2 adjusts copies so the round-1 lists stay as the agents returned them
+    sim_round2 = adjust_similarity_scores_with_peer(rel_round1, [dict(item) for item in sim_round1])
+    rel_round2 = adjust_relation_scores_with_peer(sim_round1, [dict(item) for item in rel_round1])
+    final = merge_agent_results(sim_round2, rel_round2)
+
+    return {
+        "extraction": extract_response,
+        "round1": {"similarity": sim_round1, "relation": rel_round1},
+        "round2": {"similarity": sim_round2, "relation": rel_round2},
+        "final_inference": final["final_inference"]
+    }
+
+def _compute_pipeline(user_input):
+    extract_response = run_extraction_agent(user_input, as_lists=False)
+    sim_round1 = run_similarity_agent(extract_response)
+    rel_round1 = run_reasoning_agent(extract_response)
+    return _rounds_and_merge(extract_response, sim_round1, rel_round1)
+
+def _compute_pipeline_batch(user_inputs):
+    # Round 1 of every query is scored with one stacked kernel call per agent
+    extract_responses = [run_extraction_agent(text, as_lists=False) for text in user_inputs]
+    sim_round1 = run_similarity_agent_batch(extract_responses)
+    rel_round1 = run_reasoning_agent_batch(extract_responses)
+    return [
+        _rounds_and_merge(extract_response, sim, rel)
+        for extract_response, sim, rel in zip(extract_responses, sim_round1, rel_round1)
+    ]
+
+def _semantic_pipeline_batch(user_inputs, compute_batch):
+    # Paraphrases of stored queries reuse their results; the rest are computed
+    # and stored. The query embeddings are reused by the extraction stage.
+    version = pipeline_version()
+    cache = get_semantic_cache(EMBEDDING_MODEL_ID)
+    embeddings = encode_texts(user_inputs)
+    matches = [cache.lookup(embedding, version) for embedding in embeddings]
+    results = [with_match(match) if match is not None else None for match in matches]
+    todo = [i for i, match in enumerate(matches) if match is None]
+    if todo:
+        for i, result in zip(todo, compute_batch([user_inputs[i] for i in todo])):
+            cache.insert(embeddings[i], user_inputs[i], result, version)
+            results[i] = result
+    return results
+
+def _run_pipeline(user_input):
+    if not SEMANTIC_CACHE:
+        return _compute_pipeline(user_input)
+    return _semantic_pipeline_batch([user_input], lambda texts: [_compute_pipeline(texts[0])])[0]
+
+def _run_pipeline_batch(user_inputs):
+    if not SEMANTIC_CACHE:
+        return _compute_pipeline_batch(user_inputs)
+    return _semantic_pipeline_batch(user_inputs, _compute_pipeline_batch)
+
+def run_pipeline(user_input, cache=result_cache if RESULT_CACHE else None):
+    if cache is None:
+        return _run_pipeline(user_input)
+    return dict(cache.get_or_compute(user_input, lambda: _run_pipeline(user_input)))
+
+def run_pipeline_batch(user_inputs, cache=result_cache if RESULT_CACHE else None):
+    if cache is None:
+        return _run_pipeline_batch(user_inputs)
+    # Only distinct uncached queries go through the batch
+    return [dict(result) for result in cache.get_or_compute_many(user_inputs, _run_pipeline_batch)]
+
+def print_final_inference(final_inference):
+    print("\n[🏁 Final Merged Inference]")
+    for i, item in enumerate(final_inference, 1):
+        print(f"\n#{i}: Concept: {item['concept']}")
+        print(f"   Composite Score: {item['composite_score']}")
+        print(f"   Inferred Goals: {item['goals']}")
+        print(f"   Supported by: {item['sources']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the full agent pipeline in one process")
+    parser.add_argument("queries", nargs="*", help="queries to run (prompted for when omitted)")
+    parser.add_argument("--json", action="store_true", help="print final_inference as JSON lines")
+    args = parser.parse_args(argv)
+
+    queries = args.queries or [input("Enter a user query: ")]
+    results = run_pipeline_batch(queries) if len(queries) > 1 else [run_pipeline(queries[0])]
+    for query, result in zip(queries, results):
+        if args.json:
+            print(json.dumps({"query": query, "final_inference": result["final_inference"]}))
+        else:
+            print(f"\nQuery: {query}")
+            print_final_inference(result["final_inference"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import atexit
+import gc
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing.connection import wait
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+# Linux production launcher: one master process per service imports the app and
+# loads its models, then forks the workers, which share the model weights
+# copy-on-write. launch_agents.bat stays the single-process dev setup.
+DEFAULT_CONFIG = os.path.join(ROOT, "launch_agents.json")
+# Services that keep per-query state in process memory (merge streams) cannot
+# be split across workers
+SINGLE_WORKER_APPS = {"coordinator.main:app"}
+# The reasoning agents keep round 1 in the session store: with SESSION_BACKEND
+# =redis round 2 may land on any worker. Streamed round-1 inputs and peer
+# summaries still live in the process, so streaming extraction and peer mode
+# need every message of a query routed to the same worker (sticky routing).
+SESSION_STORE_APPS = {"similarity_agent.main1:app", "Reasoning_agent_relation.main2:app"}
+# A worker dying sooner than this after its start is not respawned: the
+# service stops instead of crash-looping
+WORKER_MIN_UPTIME = 10.0
+STOP_TIMEOUT = 15.0
+
+_fork = multiprocessing.get_context("fork")
+
+
+# ---------------------- Config ---------------------- #
+def load_config(path):
+    # {"host", "log_level", "ready_timeout", "services": {name: {"app", "port",
+    #  "workers", "threads", "preload": [model names], "env": {...}}}}
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    cpus = os.cpu_count() or 1
+    services = {}
+    for name, spec in config["services"].items():
+        workers = int(spec.get("workers", 1))
+        if workers < 1:
+            raise ValueError(f"{name}: workers must be at least 1")
+        if workers > 1 and spec["app"] in SINGLE_WORKER_APPS:
+            raise ValueError(f"{name}: {spec['app']} keeps per-query state in process memory; run 1 worker")
+        if workers > 1 and spec["app"] in SESSION_STORE_APPS:
+            backend = spec.get("env", {}).get("SESSION_BACKEND", os.environ.get("SESSION_BACKEND", "memory"))
+            if backend != "redis":
+                raise ValueError(f"{name}: {spec['app']} needs SESSION_BACKEND=redis to run more than 1 worker")
+            print(f"[Launcher] {name}: {workers} workers share sessions through Redis; streaming extraction "
+                  f"and peer mode still need sticky routing")
+        services[name] = {
+            "app": spec["app"],
+            "port": int(spec["port"]),
+            "workers": workers,
+            # Compute threads per worker; by default the cores are split between the workers
+            "threads": int(spec.get("threads") or max(1, cpus // workers)),
+            "preload": list(spec.get("preload", [])),
+            "env": {key: str(value) for key, value in spec.get("env", {}).items()}
+        }
+    return {
+        "host": config.get("host", "127.0.0.1"),
+        "log_level": config.get("log_level", "warning"),
+        "ready_timeout": float(config.get("ready_timeout", 300)),
+        "services": services
+    }
+
+
+def service_env(service):
+    # Set before the app (and torch) is imported, so every thread pool is sized
+    # for one worker: N workers x all cores each would oversubscribe the CPU
+    threads = str(service["threads"])
+    env = {
+        "OMP_NUM_THREADS": threads,
+        "MKL_NUM_THREADS": threads,
+        "OPENBLAS_NUM_THREADS": threads,
+        "ONNX_INTRA_OP_THREADS": threads,
+        "AGENT_WORKERS": threads,
+        # Process workers would each load their own models again
+        "AGENT_EXECUTOR": "thread",
+        # The fast tokenizers' thread pool does not survive fork()
+        "TOKENIZERS_PARALLELISM": "false"
+    }
+    env.update(service["env"])
+    return env
+
+
+# ---------------------- Memory Report ---------------------- #
+def children(pid):
+    pids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                pids.extend(int(c) for c in f.read().split())
+    except OSError:
+        return []
+    return pids
+
+
+def process_memory(pid):
+    # MB from smaps_rollup: pss splits each shared page between its users, so
+    # the pss of all workers adds up to the service's real footprint
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)
+    }
+
+
+def service_memory(master_pid):
+    master = process_memory(master_pid)
+    workers = {pid: process_memory(pid) for pid in children(master_pid)}
+    workers = {pid: memory for pid, memory in workers.items() if memory is not None}
+    total = sum(m["pss_mb"] for m in workers.values()) + (master["pss_mb"] if master else 0)
+    return {"master": master, "workers": workers, "total_pss_mb": round(total, 1)}
+
+
+def print_memory_report(masters):
+    for name, process in masters.items():
+        report = service_memory(process.pid)
+        print(f"[Launcher] {name}: {len(report['workers'])} workers, {report['total_pss_mb']} MB PSS in total")
+        for pid, memory in [(process.pid, report["master"])] + list(report["workers"].items()):
+            if memory is None:
+                continue
+            role = "master" if pid == process.pid else "worker"
+            print(f"[Launcher]   {role} {pid}: rss {memory['rss_mb']} MB, pss {memory['pss_mb']} MB, "
+                  f"private {memory['private_mb']} MB, shared {memory['shared_mb']} MB")
+
+
+# ---------------------- Workers ---------------------- #
+def _set_torch_threads(threads):
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def _run_worker(name, index, app, sock, threads, log_level):
+    _set_torch_threads(threads)
+    print(f"[Launcher] {name} worker {index} started (pid {os.getpid()}, {threads} threads)")
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+    # multiprocessing children skip atexit; run the hooks registered while
+    # serving (e.g. the embedding cache snapshot)
+    atexit._run_exitfuncs()
+
+
+def _import_app(path):
+    module_name, attr = path.split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _preload(names):
+    # Models only: loaders that start threads (embedding_service) must run in
+    # the workers, since threads are not carried over by fork()
+    from shared.model_registry import registry
+
+    for name in names:
+        registry.get(name)
+
+
+def _bind(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+# ---------------------- Service Master ---------------------- #
+def serve_service(name, service, host, log_level):
+    # Runs in its own process: env, import, model preload, then fork the workers
+    os.environ.update(service_env(service))
+    sock = _bind(host, service["port"])
+    app = _import_app(service["app"])
+    started = time.perf_counter()
+    _preload(service["preload"])
+    if service["preload"]:
+        print(f"[Launcher] {name} preloaded {', '.join(service['preload'])} in "
+              f"{time.perf_counter() - started:.1f}s")
+    # Objects that exist now are never touched by the collector again, so the
+    # workers' GC passes do not write to (and un-share) the model pages
+    gc.collect()
+    gc.freeze()
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    def spawn(index):
+        process = _fork.Process(target=_run_worker, name=f"{name}-{index}",
+                                args=(name, index, app, sock, service["threads"], log_level))
+        process.start()
+        return process, time.monotonic()
+
+    workers = {index: spawn(index) for index in range(service["workers"])}
+    exit_code = 0
+    while not stopping:
+        wait([process.sentinel for process, _ in workers.values()], timeout=1.0)
+        for index, (process, spawned) in list(workers.items()):
+            if process.is_alive() or stopping:
+                continue
+            if time.monotonic() - spawned < WORKER_MIN_UPTIME:
+                print(f"[Launcher] {name} worker {index} exited with {process.exitcode} right after start; "
+                      f"stopping {name}")
+                stopping.append(True)
+                exit_code = 1
+                break
+            print(f"[Launcher] {name} worker {index} exited with {process.exitcode}; restarting it")
+            workers[index] = spawn(index)
+
+    for process, _ in workers.values():
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + STOP_TIMEOUT
+    for process, _ in workers.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+    sock.close()
+    sys.exit(exit_code)
+
+
+# ---------------------- Launcher ---------------------- #
+def wait_ready(host, port, masters, timeout):
+    # Any worker may answer: accepts are spread across them by the kernel
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(not process.is_alive() for process in masters.values()):
+            return False
+        try:
+            if httpx.get(f"http://{host}:{port}/ready", timeout=1.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def stop_masters(masters):
+    for process in masters.values():
+        if process.is_alive():
+            process.terminate()
+    for process in masters.values():
+        process.join()
+
+
+def launch(config):
+    masters = {}
+    for name, service in config["services"].items():
+        masters[name] = _fork.Process(target=serve_service, name=f"{name}-master",
+                                      args=(name, service, config["host"], config["log_level"]))
+        masters[name].start()
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    # kill -USR1 <launcher pid> prints the memory report again
+    signal.signal(signal.SIGUSR1, lambda *_: print_memory_report(masters))
+
+    for name, service in config["services"].items():
+        if not wait_ready(config["host"], service["port"], masters, config["ready_timeout"]):
+            print(f"[Launcher] {name} did not become ready; shutting down")
+            stop_masters(masters)
+            return 1
+        print(f"[Launcher] {name} ready on {config['host']}:{service['port']} ({service['workers']} workers)")
+    print_memory_report(masters)
+
+    while not stopping:
+        wait([process.sentinel for process in masters.values()], timeout=1.0)
+        failed = [name for name, process in masters.items() if not process.is_alive()]
+        if failed:
+            print(f"[Launcher] {', '.join(failed)} stopped; shutting down")
+            stop_masters(masters)
+            return 1
+    stop_masters(masters)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the agents with preloaded models and forked workers (Linux)")
+    parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG, help="JSON config with the workers per service")
+    args = parser.parse_args(argv)
+    sys.exit(launch(load_config(args.config)))
+
+
+if __name__ == "__main__":
+    main()
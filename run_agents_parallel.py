@@ -1,14 +1,9 @@
 import asyncio
-import websockets
 import json
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
-
-EXTRACTION_URI = "ws://localhost:8001/extract"
-SIMILARITY_AGENT_URI = "ws://localhost:8004/reason"
-RELATION_AGENT_URI = "ws://localhost:8005/reason"
-COORDINATOR_URI = "ws://localhost:8006/coordinator"
+from shared.agent_client import AgentClient
 
 def plot_agent_scores(agent_name, results, round_label):
     df = pd.DataFrame({
@@ -72,28 +67,21 @@ def display_extracted_concept_visuals(extract_response):
         print("\n🔗 ConceptNet Relations:")
         print(relation_df.to_string(index=False))
 
-async def communicate_with_agents(user_input):
+async def communicate_with_agents(user_input, client):
+    result = await client.run_query(user_input)
+
     # Step 1: Extract concepts
-    async with websockets.connect(EXTRACTION_URI) as extract_ws:
-        await extract_ws.send(user_input)
-        raw = await extract_ws.recv()
-        extract_response = json.loads(raw)
-
-        print("\n[✓ Extraction Agent Response]")
-        simplified = {k: v for k, v in extract_response.items() if k not in ['sentence_embedding', 'concept_embeddings']}
-        print(json.dumps(simplified, indent=2))
-
-        display_extracted_concept_visuals(extract_response)
-
-    # Step 2: Round 1 - parallel
-    async with websockets.connect(SIMILARITY_AGENT_URI) as sim_ws, websockets.connect(RELATION_AGENT_URI) as rel_ws:
-        await asyncio.gather(
-            sim_ws.send(json.dumps({"step": "round1", "input": extract_response})),
-            rel_ws.send(json.dumps({"step": "round1", "input": extract_response}))
-        )
-        sim_result_1, rel_result_1 = await asyncio.gather(sim_ws.recv(), rel_ws.recv())
-        sim_result_1 = json.loads(sim_result_1)
-        rel_result_1 = json.loads(rel_result_1)
+    extract_response = result["extraction"]
+    print("\n[✓ Extraction Agent Response]")
+    simplified = {k: v for k, v in extract_response.items() if k not in ['sentence_embedding', 'concept_embeddings']}
+    print(json.dumps(simplified, indent=2))
+
+    display_extracted_concept_visuals(extract_response)
+
+    # Step 2: Round 1 - parallel (not returned in peer mode)
+    if result["round1"] is not None:
+        sim_result_1 = result["round1"]["similarity"]
+        rel_result_1 = result["round1"]["relation"]
 
         print("\n[✓ Round 1 Completed]")
         print(f"Similarity Agent Top: {sim_result_1[0]['concept']} | Score: {sim_result_1[0]['score']}")
@@ -102,36 +90,35 @@ async def communicate_with_agents(user_input):
         plot_agent_scores("Relation Agent", rel_result_1, "Round 1")
         plot_combined_scores(sim_result_1, rel_result_1, "Round 1")
 
-        # Step 3: Round 2 - cross-feedback
-        await asyncio.gather(
-            sim_ws.send(json.dumps({"step": "round2", "peer": rel_result_1})),
-            rel_ws.send(json.dumps({"step": "round2", "peer": sim_result_1}))
-        )
-        sim_result_2, rel_result_2 = await asyncio.gather(sim_ws.recv(), rel_ws.recv())
-        sim_result_2 = json.loads(sim_result_2)
-        rel_result_2 = json.loads(rel_result_2)
-
-        print("\n[✓ Round 2 Adjusted Scores]")
-        print(f"Similarity Adjusted Top: {sim_result_2[0]['concept']} | Score: {sim_result_2[0]['score']}")
-        print(f"Relation Adjusted Top:   {rel_result_2[0]['concept']} | Score: {rel_result_2[0]['score']}")
-        plot_agent_scores("Similarity Agent", sim_result_2, "Round 2 (Adjusted)")
-        plot_agent_scores("Relation Agent", rel_result_2, "Round 2 (Adjusted)")
-        plot_combined_scores(sim_result_2, rel_result_2, "Round 2 (Adjusted)")
+    # Step 3: Round 2 - cross-feedback
+    sim_result_2 = result["round2"]["similarity"]
+    rel_result_2 = result["round2"]["relation"]
+
+    print("\n[✓ Round 2 Adjusted Scores]")
+    print(f"Similarity Adjusted Top: {sim_result_2[0]['concept']} | Score: {sim_result_2[0]['score']}")
+    print(f"Relation Adjusted Top:   {rel_result_2[0]['concept']} | Score: {rel_result_2[0]['score']}")
+    plot_agent_scores("Similarity Agent", sim_result_2, "Round 2 (Adjusted)")
+    plot_agent_scores("Relation Agent", rel_result_2, "Round 2 (Adjusted)")
+    plot_combined_scores(sim_result_2, rel_result_2, "Round 2 (Adjusted)")
 
     # Step 4: Coordinator output
-    async with websockets.connect(COORDINATOR_URI) as coord_ws:
-        await coord_ws.send(json.dumps({
-            "similarity": sim_result_2,
-            "relation": rel_result_2
-        }))
-        final_response = json.loads(await coord_ws.recv())
-        print("\n[🏁 Final Merged Inference from Coordinator]")
-        for i, item in enumerate(final_response["final_inference"], 1):
-            print(f"\n#{i}: Concept: {item['concept']}")
-            print(f"   Composite Score: {item['composite_score']}")
-            print(f"   Inferred Goals: {item['goals']}")
-            print(f"   Supported by: {item['sources']}")
+    print("\n[🏁 Final Merged Inference from Coordinator]")
+    for i, item in enumerate(result["final_inference"], 1):
+        print(f"\n#{i}: Concept: {item['concept']}")
+        print(f"   Composite Score: {item['composite_score']}")
+        print(f"   Inferred Goals: {item['goals']}")
+        print(f"   Supported by: {item['sources']}")
+
+    return result
+
+async def main():
+    # Connections to every agent are opened once and reused for each query
+    async with AgentClient() as client:
+        while True:
+            user_input = await asyncio.to_thread(input, "\nEnter a user query (blank to quit): ")
+            if not user_input.strip():
+                break
+            await communicate_with_agents(user_input, client)
 
 if __name__ == "__main__":
-    user_input = input("Enter a user query: ")
-    asyncio.run(communicate_with_agents(user_input))
+    asyncio.run(main())
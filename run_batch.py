@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from shared.agent_client import AgentClient, AGENT_PEER_MODE
+from shared.result_cache import RESULT_CACHE, result_cache
+
+# Latency samples kept for the percentile summary, however long the input is
+LATENCY_RESERVOIR_SIZE = 10000
+
+
+# ---------------------- Input ---------------------- #
+def iter_queries(path, field):
+    # Yields (line_number, query); a line may be {"<field>": ...}, a JSON string or plain text
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = line
+            query = record.get(field) if isinstance(record, dict) else record
+            if isinstance(query, str) and query.strip():
+                yield line_number, query
+
+
+# ---------------------- Checkpoint ---------------------- #
+class Checkpoint:
+    # Every line below `watermark` is done; `done` only holds finished lines
+    # above it, so it never grows beyond the number of in-flight queries.
+    # Lines that failed still move the watermark but are kept in `failed`, so
+    # a resumed run retries them.
+    def __init__(self, path):
+        self.path = path
+        self.watermark = 0
+        self.done = set()
+        self.failed = set()
+        self.pending = set()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            self.watermark = state["watermark"]
+            self.done = set(state["done"])
+            self.failed = set(state.get("failed", []))
+
+    def is_done(self, line_number):
+        if line_number in self.failed:
+            return False
+        return line_number < self.watermark or line_number in self.done
+
+    def start(self, line_number):
+        self.pending.add(line_number)
+
+    def finish(self, line_number, ok=True):
+        self.pending.discard(line_number)
+        if ok:
+            self.failed.discard(line_number)
+        else:
+            self.failed.add(line_number)
+        self.done.add(line_number)
+        lowest_pending = min(self.pending, default=None)
+        finished = sorted(n for n in self.done if lowest_pending is None or n < lowest_pending)
+        if finished:
+            self.watermark = max(self.watermark, finished[-1] + 1)
+            self.done.difference_update(finished)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"watermark": self.watermark, "done": sorted(self.done), "failed": sorted(self.failed)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def reopen_output(path, checkpoint):
+    # Rewrites the output of an earlier run with one successful record per
+    # line. Error records are dropped since their lines are retried, and a
+    # record flushed just before a crash, ahead of the checkpoint save, marks
+    # its line done instead of being written a second time.
+    if not os.path.exists(path):
+        return
+    tmp_path = f"{path}.tmp"
+    seen = set()
+    with open(path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for raw in src:
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                # Torn last line of a run that died mid-write
+                continue
+            line_number = record.get("line")
+            if "error" in record or line_number in seen:
+                continue
+            seen.add(line_number)
+            if not checkpoint.is_done(line_number):
+                checkpoint.failed.discard(line_number)
+                if line_number >= checkpoint.watermark:
+                    checkpoint.done.add(line_number)
+            dst.write(raw if raw.endswith("\n") else raw + "\n")
+    os.replace(tmp_path, path)
+    checkpoint.save()
+
+
+# ---------------------- Stats ---------------------- #
+class LatencyStats:
+    def __init__(self, reservoir_size=LATENCY_RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self.samples = []
+        self.count = 0
+        self.errors = 0
+
+    def add(self, latency_ms):
+        self.count += 1
+        if len(self.samples) < self.reservoir_size:
+            self.samples.append(latency_ms)
+        else:
+            i = random.randrange(self.count)
+            if i < self.reservoir_size:
+                self.samples[i] = latency_ms
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def summary(self, elapsed):
+        return {
+            "completed": self.count,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 2),
+            "queries_per_s": round(self.count / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "p99_ms": round(self.percentile(99), 1)
+        }
+
+
+# ---------------------- Workers ---------------------- #
+async def _distributed_worker(queue, on_result, client):
+    # All workers share one client: its pooled connections multiplex their queries
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        line_number, query = item
+        started = time.perf_counter()
+        try:
+            final_inference = (await client.run_query(query))["final_inference"]
+            error = None
+        except Exception as e:
+            final_inference, error = None, f"{type(e).__name__}: {e}"
+        await on_result(line_number, query, final_inference, error, time.perf_counter() - started)
+
+
+async def _fused_worker(queue, on_result, cache=None):
+    from fused_pipeline import run_pipeline
+
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        line_number, query = item
+        started = time.perf_counter()
+        try:
+            final_inference = (await asyncio.to_thread(run_pipeline, query, cache))["final_inference"]
+            error = None
+        except Exception as e:
+            final_inference, error = None, f"{type(e).__name__}: {e}"
+        await on_result(line_number, query, final_inference, error, time.perf_counter() - started)
+
+
+# ---------------------- Driver ---------------------- #
+async def run_batch(input_path, output_path, concurrency=8, field="query", checkpoint_path=None,
+                    resume=False, mode="distributed", peer_mode=None, use_cache=RESULT_CACHE):
+    checkpoint = Checkpoint(checkpoint_path or f"{output_path}.ckpt")
+    if resume:
+        checkpoint.load()
+        reopen_output(output_path, checkpoint)
+    stats = LatencyStats()
+    # Bounded queue: the reader never runs more than 2x concurrency ahead
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # Duplicate queries in the input are served from the result cache
+    cache = result_cache if use_cache else None
+    # None: AGENT_PEER_MODE decides, as for any other AgentClient
+    peer_mode = AGENT_PEER_MODE if peer_mode is None else peer_mode
+    client = await AgentClient(peer_mode=peer_mode, cache=cache).start() if mode == "distributed" else None
+    worker, shared = (_fused_worker, cache) if mode == "fused" else (_distributed_worker, client)
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as out:
+        async def on_result(line_number, query, final_inference, error, latency):
+            record = {"line": line_number, "query": query, "latency_ms": round(latency * 1000, 1)}
+            if error:
+                record["error"] = error
+                stats.errors += 1
+            else:
+                record["final_inference"] = final_inference
+                stats.add(latency * 1000)
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            checkpoint.finish(line_number, ok=not error)
+            checkpoint.save()
+
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker(queue, on_result, shared)) for _ in range(concurrency)]
+        try:
+            for line_number, query in iter_queries(input_path, field):
+                if checkpoint.is_done(line_number):
+                    continue
+                checkpoint.start(line_number)
+                await queue.put((line_number, query))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            if client is not None:
+                await client.close()
+
+    summary = stats.summary(time.perf_counter() - started)
+    if cache is not None:
+        summary["result_cache"] = cache.stats()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a JSONL file of queries through the agent pipeline")
+    parser.add_argument("input", help="JSONL file, one query per line")
+    parser.add_argument("output", help="JSONL file results are appended to as they complete")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="queries in flight at once")
+    parser.add_argument("--field", default="query", help="JSON field holding the query text")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output>.ckpt)")
+    parser.add_argument("--resume", action="store_true", help="skip queries completed by an earlier run and retry the ones that failed")
+    parser.add_argument("--mode", choices=["distributed", "fused"], default="distributed",
+                        help="WebSocket agents or the in-process fused pipeline")
+    parser.add_argument("--peer", action="store_true", default=None,
+                        help="let the reasoning agents exchange round-1 results directly (default: AGENT_PEER_MODE)")
+    parser.add_argument("--no-result-cache", action="store_true",
+                        help="run every query through the agents, even repeated ones")
+    args = parser.parse_args(argv)
+
+    summary = asyncio.run(run_batch(args.input, args.output, args.concurrency, args.field,
+                                    args.checkpoint, args.resume, args.mode, args.peer,
+                                    not args.no_result_cache))
+    print("\n[📊 Batch Summary]")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import contextvars
+import os
+import time
+
+# ---------------------- Configuration ---------------------- #
+# Messages a service works on at once, over all its connections; past that it
+# answers "overloaded" right away instead of queueing (0 disables the limit)
+AGENT_MAX_IN_FLIGHT = int(os.environ.get("AGENT_MAX_IN_FLIGHT", "64"))
+# Suggested client wait before retrying an overloaded request
+AGENT_RETRY_AFTER_MS = float(os.environ.get("AGENT_RETRY_AFTER_MS", "50"))
+# Default time budget per query in the client (0: no deadline)
+QUERY_BUDGET_MS = float(os.environ.get("QUERY_BUDGET_MS", "0"))
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, message="overloaded", retry_after_ms=AGENT_RETRY_AFTER_MS):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# ---------------------- Deadlines ---------------------- #
+# Messages carry the query's remaining budget as "budget_ms" (relative, so
+# hosts need no common clock); each hop turns it back into a local deadline
+deadline_var = contextvars.ContextVar("deadline", default=None)
+
+
+def deadline_after(budget_ms):
+    return None if budget_ms is None else time.monotonic() + budget_ms / 1000
+
+
+def remaining_ms():
+    # None when the current query has no deadline
+    deadline = deadline_var.get()
+    return None if deadline is None else (deadline - time.monotonic()) * 1000
+
+
+def check_deadline():
+    remaining = remaining_ms()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"deadline exceeded by {-remaining:.0f}ms")
+
+
+def with_budget(payload):
+    # The outgoing message, stamped with what is left of the current budget
+    remaining = remaining_ms()
+    if remaining is None:
+        return payload
+    check_deadline()
+    return {**payload, "budget_ms": round(remaining, 1)}
+
+
+def call_with_budget(budget_ms, fn, *args):
+    # Runs fn on a pool worker (thread or process) under the caller's deadline
+    token = deadline_var.set(deadline_after(budget_ms))
+    try:
+        return fn(*args)
+    finally:
+        deadline_var.reset(token)
+
+
+def with_deadline(handle):
+    # Wraps a serve_pipelined handler: the message's budget becomes the deadline
+    # of everything it runs, and a message that arrives too late is not started
+    async def handle_with_deadline(message, binary):
+        if isinstance(message, dict):
+            deadline_var.set(deadline_after(message.get("budget_ms")))
+        check_deadline()
+        return await handle(message, binary)
+    return handle_with_deadline
+
+
+# ---------------------- Admission Control ---------------------- #
+class AdmissionControl:
+    # One per service process. Steps in `exempt` continue a query that was
+    # admitted earlier (round 2, merge stream parts) and are never shed, so
+    # work already done for a query is not thrown away.
+    def __init__(self, max_in_flight=AGENT_MAX_IN_FLIGHT, retry_after_ms=AGENT_RETRY_AFTER_MS):
+        self.max_in_flight = max_in_flight
+        self.retry_after_ms = retry_after_ms
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_admit(self, message, exempt=()):
+        step = message.get("step") if isinstance(message, dict) else None
+        if self.max_in_flight and step not in exempt and self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def overloaded(self):
+        return Overloaded(f"{self.in_flight} messages in flight", self.retry_after_ms)
+
+    def stats(self):
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+
+admission = AdmissionControl()
+
+
+# ---------------------- Error Frames ---------------------- #
+def error_frame(error):
+    # What a failed message is answered with: {"id", "error": error_frame(e)}
+    frame = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, Overloaded):
+        frame["retry_after_ms"] = error.retry_after_ms
+    return frame
@@ -0,0 +1,532 @@
+import asyncio
+import itertools
+import os
+import random
+import uuid
+
+import websockets
+
+from shared.admission import QUERY_BUDGET_MS, DeadlineExceeded, deadline_after, deadline_var, remaining_ms, with_budget
+from shared.wire import WIRE_FORMAT, WIRE_FLOAT_DTYPE, dumps, loads
+from shared.result_cache import RESULT_CACHE, result_cache, pipeline_version
+from shared.semantic_cache import SEMANTIC_CACHE, get_semantic_cache, with_match
+
+# ---------------------- Configuration ---------------------- #
+EXTRACTION_URI = os.environ.get("EXTRACTION_URI", "ws://localhost:8001/extract")
+SIMILARITY_AGENT_URI = os.environ.get("SIMILARITY_AGENT_URI", "ws://localhost:8004/reason")
+RELATION_AGENT_URI = os.environ.get("RELATION_AGENT_URI", "ws://localhost:8005/reason")
+COORDINATOR_URI = os.environ.get("COORDINATOR_URI", "ws://localhost:8006/coordinator")
+# Addresses the reasoning agents use to reach each other in peer mode
+SIMILARITY_PEER_URI = os.environ.get("SIMILARITY_PEER_URI", SIMILARITY_AGENT_URI)
+RELATION_PEER_URI = os.environ.get("RELATION_PEER_URI", RELATION_AGENT_URI)
+# Peer mode: the agents swap round-1 summaries directly, one client round trip
+AGENT_PEER_MODE = os.environ.get("AGENT_PEER_MODE", "0") == "1"
+# Streamed extraction: round-1 similarity terms are computed while ConceptNet resolves
+EXTRACTION_STREAMING = os.environ.get("EXTRACTION_STREAMING", "0") == "1"
+
+AGENT_POOL_SIZE = int(os.environ.get("AGENT_POOL_SIZE", "2"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("AGENT_HEALTH_CHECK_INTERVAL", "15"))
+CONNECT_RETRIES = int(os.environ.get("AGENT_CONNECT_RETRIES", "5"))
+# Times an "overloaded" request is sent again (after a backoff) before giving up
+OVERLOAD_RETRIES = int(os.environ.get("AGENT_OVERLOAD_RETRIES", "4"))
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 5.0
+
+
+class AgentUnavailable(ConnectionError):
+    pass
+
+
+class AgentError(RuntimeError):
+    # The agent answered this message with an error frame; the connection is fine
+    def __init__(self, uri, error):
+        super().__init__(f"{uri}: {error['type']}: {error['message']}")
+        self.kind = error["type"]
+
+
+class AgentOverloaded(AgentError):
+    def __init__(self, uri, error):
+        super().__init__(uri, error)
+        self.retry_after_ms = error.get("retry_after_ms", 0)
+
+
+def raise_error_frame(uri, error):
+    if error["type"] == "Overloaded":
+        raise AgentOverloaded(uri, error)
+    if error["type"] == "DeadlineExceeded":
+        raise DeadlineExceeded(f"{uri}: {error['message']}")
+    raise AgentError(uri, error)
+
+
+async def _until_deadline(awaitable, uri):
+    remaining = remaining_ms()
+    if remaining is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(remaining, 0) / 1000)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{uri}: no reply within the query's budget") from None
+
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# ---------------------- Single Multiplexed Connection ---------------------- #
+class AgentConnection:
+    # Requests carry an "id" that the agent echoes back as {"id", "result"}, so
+    # any number of requests can be in flight on one socket at the same time.
+    def __init__(self, uri, fmt=WIRE_FORMAT):
+        self.uri = uri
+        self.fmt = fmt
+        self.ws = None
+        self._reader = None
+        self._waiting = {}
+        self._ids = itertools.count(1)
+        # The agent's pipeline_version(), fetched on every (re)connect
+        self.version = None
+
+    @property
+    def healthy(self):
+        return self.ws is not None and self._reader is not None and not self._reader.done()
+
+    @property
+    def in_flight(self):
+        return len(self._waiting)
+
+    async def connect(self):
+        # Keepalive pings are driven by the pool's health checks instead
+        self.ws = await websockets.connect(self.uri, max_size=None, compression=None, ping_interval=None)
+        self._reader = asyncio.create_task(self._read_loop())
+        try:
+            self.version = (await self.request({"step": "version"}))["version"]
+        except AgentError:
+            # An agent that cannot tell; results are keyed without it
+            self.version = None
+
+    async def _read_loop(self):
+        error = None
+        try:
+            async for raw in self.ws:
+                message = loads(raw)
+                waiter = self._waiting.get(message.get("id")) if isinstance(message, dict) else None
+                if isinstance(waiter, asyncio.Queue):
+                    # Streamed reply: frames flagged "more" until the closing message
+                    waiter.put_nowait(message)
+                    if not message.get("more"):
+                        self._waiting.pop(message["id"], None)
+                elif waiter is not None:
+                    self._waiting.pop(message["id"], None)
+                    if not waiter.done():
+                        waiter.set_result(message)
+        except Exception as e:
+            error = e
+        finally:
+            closed = AgentUnavailable(f"{self.uri} closed: {error or 'connection closed'}")
+            for waiter in self._waiting.values():
+                if isinstance(waiter, asyncio.Queue):
+                    waiter.put_nowait(closed)
+                elif not waiter.done():
+                    waiter.set_exception(closed)
+            self._waiting.clear()
+
+    async def request(self, payload):
+        # The query's remaining budget travels with the message as "budget_ms"
+        if not self.healthy:
+            raise AgentUnavailable(f"{self.uri} is not connected")
+        payload = with_budget(payload)
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        try:
+            await self.ws.send(dumps({**payload, "id": request_id}, self.fmt))
+            reply = await _until_deadline(future, self.uri)
+        finally:
+            self._waiting.pop(request_id, None)
+        if "error" in reply:
+            raise_error_frame(self.uri, reply["error"])
+        return reply["result"]
+
+    async def stream(self, payload):
+        # Async generator over the frames of a streamed reply
+        if not self.healthy:
+            raise AgentUnavailable(f"{self.uri} is not connected")
+        payload = with_budget(payload)
+        request_id = next(self._ids)
+        frames = self._waiting[request_id] = asyncio.Queue()
+        try:
+            await self.ws.send(dumps({**payload, "id": request_id}, self.fmt))
+            while True:
+                message = await _until_deadline(frames.get(), self.uri)
+                if isinstance(message, Exception):
+                    raise message
+                if "error" in message:
+                    raise_error_frame(self.uri, message["error"])
+                if not message.get("more"):
+                    return
+                yield message["result"]
+        finally:
+            self._waiting.pop(request_id, None)
+
+    async def ping(self, timeout=5.0):
+        pong = await self.ws.ping()
+        await asyncio.wait_for(pong, timeout)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        self.ws = None
+        self._reader = None
+
+
+# ---------------------- Connection Pool per Agent ---------------------- #
+class AgentPool:
+    def __init__(self, uri, size=AGENT_POOL_SIZE, fmt=WIRE_FORMAT, retries=CONNECT_RETRIES,
+                 overload_retries=OVERLOAD_RETRIES):
+        self.uri = uri
+        self.retries = retries
+        self.overload_retries = overload_retries
+        self.connections = [AgentConnection(uri, fmt) for _ in range(size)]
+        self._connecting = {}
+
+    async def _ensure_connected(self, conn):
+        # Concurrent callers share one reconnect attempt per connection
+        if conn.healthy:
+            return conn
+        task = self._connecting.get(id(conn))
+        if task is None:
+            task = self._connecting[id(conn)] = asyncio.ensure_future(self._reconnect(conn))
+            task.add_done_callback(lambda _: self._connecting.pop(id(conn), None))
+        await task
+        return conn
+
+    async def _reconnect(self, conn):
+        await conn.close()
+        for attempt in range(self.retries + 1):
+            try:
+                await conn.connect()
+                return
+            except (OSError, websockets.exceptions.WebSocketException, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise AgentUnavailable(f"Could not connect to {self.uri}: {e}") from e
+                await asyncio.sleep(backoff_delay(attempt))
+
+    def versions(self):
+        # Several while a rolling deploy has old and new workers behind one address
+        return sorted({conn.version for conn in self.connections if conn.healthy and conn.version})
+
+    async def connect_all(self):
+        await asyncio.gather(*(self._ensure_connected(conn) for conn in self.connections))
+
+    async def acquire(self):
+        # Least-loaded healthy connection; if none is left, reconnect a slot
+        healthy = [c for c in self.connections if c.healthy]
+        if healthy:
+            return min(healthy, key=lambda c: c.in_flight)
+        return await self._ensure_connected(self.connections[0])
+
+    async def _backoff(self, attempt, overloaded):
+        # Waits at least as long as the agent asked, unless that outlasts the query
+        delay = max(overloaded.retry_after_ms / 1000, backoff_delay(attempt))
+        remaining = remaining_ms()
+        if remaining is not None and remaining <= delay * 1000:
+            raise DeadlineExceeded(f"{self.uri} overloaded past the query's budget") from overloaded
+        await asyncio.sleep(delay)
+
+    async def _request(self, payload):
+        conn = await self.acquire()
+        try:
+            return await conn.request(payload)
+        except AgentUnavailable:
+            # One retry on a fresh connection; the agents' requests are idempotent
+            conn = await self._ensure_connected(conn)
+            return await conn.request(payload)
+
+    async def retry_overloaded(self, call):
+        # call(attempt) is awaited again, after a backoff, while it fails with
+        # AgentOverloaded: an overloaded agent has not started on the message
+        for attempt in itertools.count():
+            try:
+                return await call(attempt)
+            except AgentOverloaded as e:
+                if attempt >= self.overload_retries:
+                    raise
+                await self._backoff(attempt, e)
+
+    async def request(self, payload, retry_overloaded=True):
+        if not retry_overloaded:
+            return await self._request(payload)
+        return await self.retry_overloaded(lambda attempt: self._request(payload))
+
+    async def stream(self, payload):
+        # Retried only when overloaded, which comes before any frame; no retry
+        # once frames may have been handed to the caller
+        for attempt in itertools.count():
+            conn = await self.acquire()
+            try:
+                async for frame in conn.stream(payload):
+                    yield frame
+                return
+            except AgentOverloaded as e:
+                if attempt >= self.overload_retries:
+                    raise
+                await self._backoff(attempt, e)
+
+    async def health_check(self):
+        # Ping live connections and bring dropped ones back in the background
+        for conn in self.connections:
+            try:
+                if conn.healthy:
+                    await conn.ping()
+                else:
+                    await self._ensure_connected(conn)
+            except Exception as e:
+                print(f"[Agent Client] Health check failed for {self.uri}: {e!r}")
+                await conn.close()
+
+    async def close(self):
+        await asyncio.gather(*(conn.close() for conn in self.connections))
+
+
+# ---------------------- Pipeline Client ---------------------- #
+class AgentClient:
+    # One pool per agent, opened once and reused for every query of a
+    # long-running process.
+    def __init__(self, extraction_uri=EXTRACTION_URI, similarity_uri=SIMILARITY_AGENT_URI,
+                 relation_uri=RELATION_AGENT_URI, coordinator_uri=COORDINATOR_URI,
+                 pool_size=AGENT_POOL_SIZE, fmt=WIRE_FORMAT, float_dtype=WIRE_FLOAT_DTYPE,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, peer_mode=AGENT_PEER_MODE,
+                 similarity_peer_uri=SIMILARITY_PEER_URI, relation_peer_uri=RELATION_PEER_URI,
+                 stream_extraction=EXTRACTION_STREAMING, cache=result_cache if RESULT_CACHE else None,
+                 semantic_cache=SEMANTIC_CACHE, budget_ms=QUERY_BUDGET_MS):
+        self.fmt = fmt
+        self.float_dtype = float_dtype
+        self.extraction = AgentPool(extraction_uri, pool_size, fmt)
+        self.similarity = AgentPool(similarity_uri, pool_size, fmt)
+        self.relation = AgentPool(relation_uri, pool_size, fmt)
+        self.coordinator = AgentPool(coordinator_uri, pool_size, fmt)
+        self.health_check_interval = health_check_interval
+        self.peer_mode = peer_mode
+        self.similarity_peer_uri = similarity_peer_uri
+        self.relation_peer_uri = relation_peer_uri
+        self.stream_extraction = stream_extraction
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        # Time budget per query (ms, 0: none); see shared.admission
+        self.budget_ms = budget_ms
+        self._health_task = None
+
+    @property
+    def pools(self):
+        return [self.extraction, self.similarity, self.relation, self.coordinator]
+
+    def service_versions(self):
+        # What the agents run (models, weights, backends), as they report it
+        return {pool.uri: pool.versions() for pool in self.pools}
+
+    async def start(self):
+        await asyncio.gather(*(pool.connect_all() for pool in self.pools))
+        if self.health_check_interval and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+        return self
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await asyncio.gather(*(pool.health_check() for pool in self.pools), return_exceptions=True)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*(pool.close() for pool in self.pools))
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def extract(self, user_input, query_id=None):
+        return await self.extraction.request({"text": user_input, "float_dtype": self.float_dtype,
+                                              "query_id": query_id})
+
+    async def extract_stream(self, user_input, query_id=None):
+        # Frames: "concepts" (with embeddings and ranking), one "relations" per concept, "done"
+        async for frame in self.extraction.stream({"text": user_input, "float_dtype": self.float_dtype,
+                                                   "stream": True, "query_id": query_id}):
+            yield frame
+
+    async def extract_document(self, text, top_k=None, conceptnet=True):
+        # Frames: "sentences" (a window of ranked sentences), then "document", then "done"
+        async for frame in self.extraction.stream({"document": text, "top_k": top_k, "conceptnet": conceptnet}):
+            yield frame
+
+    async def _extract_streaming(self, query_id, user_input):
+        # Both agents get the concepts frame as soon as it arrives and start on the
+        # similarity terms; round 1 itself then only has to carry the relations
+        prepares = []
+        concepts_frame = None
+        relations = {}
+        degraded = None
+        try:
+            async for frame in self.extract_stream(user_input, query_id):
+                if frame["type"] == "concepts":
+                    concepts_frame = {k: v for k, v in frame.items() if k != "type"}
+                    prepares = [
+                        asyncio.ensure_future(pool.request({"step": "round1_prepare", "query_id": query_id,
+                                                            "input": concepts_frame}))
+                        for pool in (self.similarity, self.relation)
+                    ]
+                elif frame["type"] == "relations":
+                    relations[frame["concept"]] = frame["relations"]
+                elif frame["type"] == "done":
+                    degraded = frame.get("degraded")
+            if concepts_frame is None:
+                raise AgentError(self.extraction.uri, {"type": "IncompleteStream",
+                                                       "message": "extraction stream ended without a concepts frame"})
+            await asyncio.gather(*prepares)
+        finally:
+            # No-ops once gathered; stops the prepares of a stream that failed
+            for prepare in prepares:
+                prepare.cancel()
+
+        relations = {c: relations.get(c, []) for c in concepts_frame["concepts"]}
+        extraction = {**concepts_frame, "conceptnet_relations": relations}
+        if degraded:
+            extraction["degraded"] = degraded
+        return extraction, {"conceptnet_relations": relations}
+
+    async def _relayed_rounds(self, query_id, round1_input):
+        # The agents keep round-1 state by query_id in their session store, so
+        # round 2 can go out on any connection
+        sim_round1, rel_round1 = await asyncio.gather(
+            self.similarity.request({"step": "round1", "query_id": query_id, "input": round1_input}),
+            self.relation.request({"step": "round1", "query_id": query_id, "input": round1_input})
+        )
+        round2 = {
+            "similarity": self.similarity.request({"step": "round2", "query_id": query_id, "peer": rel_round1}),
+            "relation": self.relation.request({"step": "round2", "query_id": query_id, "peer": sim_round1})
+        }
+        return {"similarity": sim_round1, "relation": rel_round1}, round2
+
+    async def _peer_rounds(self, query_id, round1_input):
+        # Each agent is told where its peer is; round-1 lists never come back here.
+        # Either half waits for the other's summary, so the two are retried
+        # together: an overloaded agent fails its own half and (through the
+        # peer) the other one too.
+        async def both(attempt):
+            halves = await asyncio.gather(
+                self.similarity.request({"step": "peer_round", "query_id": query_id, "attempt": attempt,
+                                         "input": round1_input, "peer_uri": self.relation_peer_uri},
+                                        retry_overloaded=False),
+                self.relation.request({"step": "peer_round", "query_id": query_id, "attempt": attempt,
+                                       "input": round1_input, "peer_uri": self.similarity_peer_uri},
+                                      retry_overloaded=False),
+                return_exceptions=True
+            )
+            errors = [half for half in halves if isinstance(half, BaseException)]
+            if errors:
+                # Retried only when nothing but overload went wrong
+                raise next((e for e in errors if not isinstance(e, AgentOverloaded)), errors[0])
+            return halves
+
+        pair = asyncio.ensure_future(self.similarity.retry_overloaded(both))
+
+        async def half(index):
+            return (await pair)[index]
+
+        return None, {"similarity": half(0), "relation": half(1)}
+
+    async def _stream_merge(self, query_id, round2, k=None, weights=None, on_provisional=None):
+        # Each agent's round-2 list goes to the coordinator as soon as it is in,
+        # so merging overlaps with the slower agent
+        agents = {"similarity": "SimilarityAgent", "relation": "RelationAgent"}
+        tasks = {asyncio.ensure_future(request): name for name, request in round2.items()}
+        results = {}
+
+        async def send(name):
+            reply = await self.coordinator.request({
+                "step": "items", "stream_id": query_id, "parts": len(tasks), "k": k, "weights": weights,
+                "agent": agents[name], "items": results[name]
+            })
+            if reply.get("provisional") and on_provisional is not None:
+                on_provisional(reply["final_inference"])
+            return reply
+
+        merges = []
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                    merges.append(asyncio.ensure_future(send(tasks[task])))
+            replies = await asyncio.gather(*merges)
+        finally:
+            for task in [*pending, *merges]:
+                task.cancel()
+        # Whichever part the coordinator saw last carries the final top k
+        final = next(r for r in replies if not r.get("provisional"))
+        return {name: results[name] for name in round2}, final["final_inference"]
+
+    async def run_query(self, user_input, k=None, weights=None, on_provisional=None, budget_ms=None):
+        # "round1" is None in peer mode; k / weights override the coordinator's
+        # top-k size and (score, goal count) weighting for this query. Repeated
+        # queries are answered from the result cache without touching any agent.
+        # budget_ms (default: the client's) is the query's deadline; a query that
+        # ran short of it for ConceptNet comes back with "degraded" and is not cached.
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        token = deadline_var.set(deadline_after(budget_ms) if budget_ms else None)
+        try:
+            return await self._cached_query(user_input, k, weights, on_provisional)
+        finally:
+            deadline_var.reset(token)
+
+    async def _cached_query(self, user_input, k=None, weights=None, on_provisional=None):
+        version = pipeline_version(k=k, weights=weights, peer_mode=self.peer_mode, services=self.service_versions())
+        if self.semantic_cache:
+            compute = lambda: self._run_semantic_query(user_input, version, k, weights, on_provisional)
+        else:
+            compute = lambda: self._run_query(user_input, k, weights, on_provisional)
+        if self.cache is None:
+            return await compute()
+        return dict(await self.cache.aget_or_compute(user_input, compute, version))
+
+    async def _run_semantic_query(self, user_input, version, k=None, weights=None, on_provisional=None):
+        # Only the query embedding is computed up front; a paraphrase of a stored
+        # query gets that query's result, marked with "semantic_match"
+        reply = await self.extraction.request({"text": user_input, "float_dtype": self.float_dtype,
+                                               "embed_only": True})
+        cache = get_semantic_cache(reply["model"])
+        match = cache.lookup(reply["sentence_embedding"], version)
+        if match is not None:
+            return with_match(match)
+        result = await self._run_query(user_input, k, weights, on_provisional)
+        if not result.get("degraded"):
+            cache.insert(reply["sentence_embedding"], user_input, result, version)
+        return result
+
+    async def _run_query(self, user_input, k=None, weights=None, on_provisional=None):
+        query_id = uuid.uuid4().hex
+        if self.stream_extraction:
+            extract_response, round1_input = await self._extract_streaming(query_id, user_input)
+        else:
+            extract_response = round1_input = await self.extract(user_input, query_id)
+        rounds = self._peer_rounds if self.peer_mode else self._relayed_rounds
+        round1, round2 = await rounds(query_id, round1_input)
+        round2, final_inference = await self._stream_merge(query_id, round2, k, weights, on_provisional)
+        result = {
+            "query_id": query_id,
+            "extraction": extract_response,
+            "round1": round1,
+            "round2": round2,
+            "final_inference": final_inference
+        }
+        if extract_response.get("degraded"):
+            result["degraded"] = extract_response["degraded"]
+        return result
@@ -1,15 +1,50 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import as_completed
+
 import spacy
-import requests
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
+from shared.conceptnet_client import ConceptNetClient, normalize_word
+from shared.conceptnet_index import ConceptNetIndex, CONCEPTNET_INDEX_PATH
+from shared.embedding_service import EmbeddingBatcher
+from shared.embedding_cache import EmbeddingCache, EMBED_CACHE_PATH
+from shared.model_registry import registry
+from shared.admission import remaining_ms
+from shared.metrics import stage
+
+# spaCy and the sentence embedding model (all-mpnet-base-v2) are loaded on
+# first use (or by warmup_models), not when this module is imported
+SPACY_MODEL_NAME = 'en_core_web_sm'
+EMBEDDING_MODEL_NAME = 'all-mpnet-base-v2'
+# "torch" runs the SentenceTransformer; "onnx" / "onnx-int8" run the exported
+# (optionally int8-quantized) encoder on onnxruntime, exporting it on first use
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+if EMBEDDING_BACKEND not in ("torch", "onnx", "onnx-int8"):
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+# Names the embedding space, for caches that must not mix backends
+EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
+def _load_embedding_model():
+    if EMBEDDING_BACKEND == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    from shared.onnx_embedding import OnnxSentenceEncoder
+    return OnnxSentenceEncoder.from_pretrained(EMBEDDING_MODEL_NAME, quantized=EMBEDDING_BACKEND == "onnx-int8")
+
+registry.register("spacy", lambda: spacy.load(SPACY_MODEL_NAME))
+registry.register("embedding_model", _load_embedding_model)
+
+def get_nlp():
+    return registry.get("spacy")
 
-# Load spaCy and sentence embedding model (all-mpnet-base-v2)
-nlp = spacy.load('en_core_web_sm')
-embedding_model = SentenceTransformer('all-mpnet-base-v2')
+def get_embedding_model():
+    return registry.get("embedding_model")
 
 # ---------------------- Concept Extraction ---------------------- #
-def extract_contextual_concepts(text):
-    doc = nlp(text)
+def extract_contextual_concepts(text, doc=None):
+    doc = doc if doc is not None else get_nlp()(text)
     concepts = set()
 
     for chunk in doc.noun_chunks:
@@ -27,34 +62,166 @@ def extract_contextual_concepts(text):
 
     return list({c.strip().lower() for c in concepts if len(c) > 1})
 
+# ---------------------- Concept Analysis (POS / lemma) ---------------------- #
+# Concepts are tagged on their own (as the per-concept nlp() calls did), but in a
+# single nlp.pipe batch and only once per distinct concept string. The parser and
+# NER do not feed token.pos_ / token.lemma_, so they are skipped.
+CONCEPT_CACHE_SIZE = int(os.environ.get("CONCEPT_CACHE_SIZE", "50000"))
+_ANALYSIS_DISABLED = ['parser', 'ner']
+_concept_analysis_cache = OrderedDict()
+_concept_analysis_lock = threading.Lock()
+
+def analyze_concepts(concepts):
+    # Returns {concept: ((text, pos_, lemma_), ...)}
+    analysis = {}
+    with _concept_analysis_lock:
+        for c in concepts:
+            if c in _concept_analysis_cache:
+                _concept_analysis_cache.move_to_end(c)
+                analysis[c] = _concept_analysis_cache[c]
+    misses = [c for c in dict.fromkeys(concepts) if c not in analysis]
+    if not misses:
+        return analysis
+
+    nlp = get_nlp()
+    disabled = [name for name in _ANALYSIS_DISABLED if name in nlp.pipe_names]
+    for c, doc in zip(misses, nlp.pipe(misses, disable=disabled)):
+        analysis[c] = tuple((token.text, token.pos_, token.lemma_) for token in doc)
+
+    with _concept_analysis_lock:
+        for c in misses:
+            _concept_analysis_cache[c] = analysis[c]
+        while len(_concept_analysis_cache) > CONCEPT_CACHE_SIZE:
+            _concept_analysis_cache.popitem(last=False)
+    return analysis
+
 # ---------------------- ConceptNet Lookup ---------------------- #
-def get_conceptnet_info(concept, limit=5):
-    results = []
+# "http" queries api.conceptnet.io, "offline" serves lookups from a prebuilt
+# index (python -m shared.conceptnet_index build <assertions.csv.gz>)
+CONCEPTNET_BACKEND = os.environ.get("CONCEPTNET_BACKEND", "http")
+if CONCEPTNET_BACKEND not in ("http", "offline"):
+    raise ValueError(f"Unknown CONCEPTNET_BACKEND: {CONCEPTNET_BACKEND}")
+if CONCEPTNET_BACKEND == "offline":
+    conceptnet_client = ConceptNetIndex(CONCEPTNET_INDEX_PATH)
+else:
+    conceptnet_client = ConceptNetClient()
+
+# Part of a query's budget kept back for the reasoning rounds and the merge:
+# ConceptNet may use the rest and is skipped once nothing is left, leaving the
+# agents to score on embeddings alone
+CONCEPTNET_RESERVE_MS = float(os.environ.get("CONCEPTNET_RESERVE_MS", "100"))
+
+def conceptnet_timeout():
+    # Seconds the current query's lookups may take; None without a deadline
+    remaining = remaining_ms()
+    if remaining is None:
+        return None
+    return max(0.0, (remaining - CONCEPTNET_RESERVE_MS) / 1000)
+
+def _conceptnet_cut_short(timeout):
+    # Out of budget now: the lookups were skipped or stopped waiting
+    return timeout is not None and conceptnet_timeout() == 0
+
+def _conceptnet_query_words(concept, tokens):
     words = concept.split()
     pos_filter = ['NOUN', 'VERB', 'ADJ', 'ADV', 'PROPN']
-    filtered_words = [token.text for token in nlp(concept) if token.pos_ in pos_filter]
-    query_words = filtered_words if filtered_words else words
+    filtered_words = [text for text, pos, _ in tokens if pos in pos_filter]
+    return filtered_words if filtered_words else words
 
+def _collect_conceptnet_results(query_words, edges_by_word, limit):
+    results = []
     for word in query_words:
-        url = f"http://api.conceptnet.io/c/en/{word.replace(' ', '_')}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            edges = response.json().get('edges', [])
-            results.extend([
-                (e['rel']['label'], e['end']['label'])
-                for e in edges[:limit]
-                if e['rel']['label'] not in ['ExternalURL', 'dbpedia']
-            ])
+        edges = edges_by_word.get(normalize_word(word), [])
+        results.extend([
+            (rel, end)
+            for rel, end in edges[:limit]
+            if rel not in ['ExternalURL', 'dbpedia']
+        ])
         if len(results) >= limit:
             break
     return results[:limit]
 
+def get_conceptnet_info(concept, limit=5):
+    return get_conceptnet_info_batch([concept], limit)[concept]
+
+def get_conceptnet_info_batch(concepts, limit=5, timeout=None):
+    # One concurrent round of lookups for every word of every concept; words
+    # not answered within `timeout` seconds (0: no lookups at all) get no relations
+    if timeout == 0:
+        return {concept: [] for concept in concepts}
+    analysis = analyze_concepts(concepts)
+    query_words = {concept: _conceptnet_query_words(concept, analysis[concept]) for concept in concepts}
+    with stage("conceptnet"):
+        edges_by_word = conceptnet_client.lookup_many([w for words in query_words.values() for w in words], timeout)
+    return {
+        concept: _collect_conceptnet_results(words, edges_by_word, limit)
+        for concept, words in query_words.items()
+    }
+
+def iter_conceptnet_info(concepts, limit=5, timeout=None):
+    # Same results as get_conceptnet_info_batch, yielded as (concept, relations)
+    # as soon as the lookups for that concept's words have resolved
+    if timeout == 0:
+        yield from ((concept, []) for concept in concepts)
+        return
+    analysis = analyze_concepts(concepts)
+    query_words = {concept: _conceptnet_query_words(concept, analysis[concept]) for concept in concepts}
+    waiting = {concept: set(words) for concept, words in query_words.items()}
+    futures = {
+        conceptnet_client.submit_many([word]): word
+        for word in dict.fromkeys(w for words in query_words.values() for w in words)
+    }
+    edges_by_word = {}
+    try:
+        for future in as_completed(futures, timeout):
+            edges_by_word.update(future.result())
+            word = futures[future]
+            for concept in list(waiting):
+                waiting[concept].discard(word)
+                if not waiting[concept]:
+                    del waiting[concept]
+                    yield concept, _collect_conceptnet_results(query_words[concept], edges_by_word, limit)
+    except TimeoutError:
+        for future in futures:
+            future.cancel()
+    # Out of time: the remaining concepts get what has resolved so far
+    for concept in waiting:
+        yield concept, _collect_conceptnet_results(query_words[concept], edges_by_word, limit)
+
 # ---------------------- Embedding using all-mpnet-base-v2 ---------------------- #
+# Encodes from every in-flight request are merged into shared batches
+# (EMBED_MAX_BATCH / EMBED_MAX_WAIT_MS control the batching window)
+registry.register("embedding_service", lambda: EmbeddingBatcher(get_embedding_model()))
+
+def _load_embedding_cache():
+    # Concepts and sentences repeat across queries: only cache misses are encoded.
+    # Keyed by backend too, so a saved cache never mixes embeddings across backends.
+    cache = EmbeddingCache(get_embedding_model().get_sentence_embedding_dimension(), EMBEDDING_MODEL_ID)
+    if EMBED_CACHE_PATH:
+        if os.path.exists(EMBED_CACHE_PATH):
+            cache.load(EMBED_CACHE_PATH)
+        atexit.register(cache.save, EMBED_CACHE_PATH)
+    return cache
+
+registry.register("embedding_cache", _load_embedding_cache)
+
+def encode_texts(texts):
+    return registry.get("embedding_cache").encode(texts, registry.get("embedding_service").encode)
+
 def get_sentence_embedding(text):
-    return embedding_model.encode(text)
+    return encode_texts([text])[0]
+
+def run_sentence_embedding(sentence, as_lists=True):
+    # Just the query embedding, e.g. for a semantic cache lookup ahead of the pipeline
+    embedding = get_sentence_embedding(sentence)
+    return {"sentence_embedding": embedding.tolist() if as_lists else embedding, "model": EMBEDDING_MODEL_ID}
 
 def get_concept_embeddings(concepts):
-    return embedding_model.encode(concepts)
+    return encode_texts(concepts)
+
+def get_sentence_and_concept_embeddings(sentence, concepts):
+    embeddings = encode_texts([sentence] + list(concepts))
+    return embeddings[0], embeddings[1:]
 
 # ---------------------- Ranking ---------------------- #
 def rank_concepts_by_similarity(sentence_embedding, concepts, concept_embeddings):
@@ -66,47 +233,84 @@ def rank_concepts_by_similarity(sentence_embedding, concepts, concept_embeddings
 # ---------------------- Categorization ---------------------- #
 def categorize_concepts(concepts):
     categories = {"needs": [], "objects": [], "actions": [], "descriptors": []}
+    analysis = analyze_concepts(concepts)
     for c in concepts:
-        for token in nlp(c):
-            if token.pos_ == "NOUN":
+        for _, pos, lemma in analysis[c]:
+            if pos == "NOUN":
                 categories["objects"].append(c)
-            elif token.pos_ == "VERB":
+            elif pos == "VERB":
                 categories["actions"].append(c)
-            elif token.pos_ == "ADJ":
+            elif pos == "ADJ":
                 categories["descriptors"].append(c)
-            elif token.lemma_ in ["need", "want", "require", "wish"]:
+            elif lemma in ["need", "want", "require", "wish"]:
                 categories["needs"].append(c)
     return categories
 
 # ---------------------- Entry Point ---------------------- #
-def run_extraction_agent(sentence):
-    concepts = extract_contextual_concepts(sentence)
-    sentence_embedding = get_sentence_embedding(sentence)
-    concept_embeddings = get_concept_embeddings(concepts)
-    conceptnet_knowledge = {concept: get_conceptnet_info(concept) for concept in concepts}
+def _extraction_stages(sentence):
+    with stage("spacy_parse"):
+        doc = get_nlp()(sentence)
+        concepts = extract_contextual_concepts(sentence, doc)
+    with stage("embedding_encode"):
+        sentence_embedding, concept_embeddings = get_sentence_and_concept_embeddings(sentence, concepts)
     ranked_concepts = rank_concepts_by_similarity(sentence_embedding, concepts, concept_embeddings)
-    concept_categories = categorize_concepts(concepts)
+    with stage("concept_analysis"):
+        concept_categories = categorize_concepts(concepts)
+    return concepts, sentence_embedding, concept_embeddings, ranked_concepts, concept_categories
+
+def _concepts_frame(concepts, sentence_embedding, concept_embeddings, ranked_concepts, concept_categories, as_lists):
+    if as_lists:
+        sentence_embedding = sentence_embedding.tolist()
+        concept_embeddings = [e.tolist() for e in concept_embeddings]
 
     return {
         "concepts": concepts,
         "ranked_concepts": ranked_concepts,
-        "conceptnet_relations": conceptnet_knowledge,
-        "sentence_embedding": sentence_embedding.tolist(),
-        "concept_embeddings": [e.tolist() for e in concept_embeddings],
+        "sentence_embedding": sentence_embedding,
+        "concept_embeddings": concept_embeddings,
         "categorized_concepts": concept_categories
-    }@app.websocket("/extract")
-async def extract(websocket: WebSocket):
-    ...
-    result = run_extraction_agent(text)
-
-    def convert(obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, dict):
-            return {k: convert(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert(x) for x in obj]
-        else:
-            return obj
-
-    await websocket.send_json(convert(result))
\ No newline at end of file
+    }
+
+def run_extraction_agent(sentence, as_lists=True):
+    # as_lists=False keeps the embeddings as float32 arrays for binary transport
+    stages = _extraction_stages(sentence)
+    timeout = conceptnet_timeout()
+    conceptnet_knowledge = get_conceptnet_info_batch(stages[0], timeout=timeout)
+    result = _concepts_frame(*stages, as_lists)
+    result["conceptnet_relations"] = conceptnet_knowledge
+    if _conceptnet_cut_short(timeout):
+        result["degraded"] = ["conceptnet"]
+    return result
+
+# ---------------------- Warmup ---------------------- #
+WARMUP_SENTENCE = "I need a warm coffee before the morning meeting"
+
+def warmup_models():
+    # Loads every model and runs one dummy batch through each, bypassing the
+    # embedding cache so the warmup text is not kept
+    concepts = extract_contextual_concepts(WARMUP_SENTENCE)
+    analyze_concepts(concepts)
+    registry.get("embedding_service").encode([WARMUP_SENTENCE] + concepts)
+    registry.get("embedding_cache")
+    return registry.status()
+
+# ---------------------- Streaming Entry Point ---------------------- #
+# Frames: {"type": "concepts", ...everything but the relations}, then one
+# {"type": "relations", "concept", "relations"} per concept in resolution order,
+# then {"type": "done"}. Merging the relations frames into the concepts frame
+# as "conceptnet_relations" gives run_extraction_agent's result.
+def run_extraction_agent_stream(sentence, as_lists=True):
+    stages = _extraction_stages(sentence)
+    yield {"type": "concepts", **_concepts_frame(*stages, as_lists)}
+    timeout = conceptnet_timeout()
+    for concept, relations in iter_conceptnet_info(stages[0], timeout=timeout):
+        yield {"type": "relations", "concept": concept, "relations": relations}
+    yield {"type": "done", **({"degraded": ["conceptnet"]} if _conceptnet_cut_short(timeout) else {})}
+
+def extraction_frames(result):
+    # The same frames cut from a finished result (for executors that cannot step a generator)
+    frame = {k: v for k, v in result.items() if k not in ("conceptnet_relations", "degraded")}
+    yield {"type": "concepts", **frame}
+    for concept, relations in result["conceptnet_relations"].items():
+        yield {"type": "relations", "concept": concept, "relations": relations}
+    yield {"type": "done", **({"degraded": result["degraded"]} if "degraded" in result else {})}
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from shared.metrics import stage
+
+# ---------------------- Configuration ---------------------- #
+CONCEPTNET_URL = os.environ.get("CONCEPTNET_URL", "http://api.conceptnet.io")
+CONCEPTNET_TIMEOUT = float(os.environ.get("CONCEPTNET_TIMEOUT", "5.0"))
+CONCEPTNET_MAX_CONNECTIONS = int(os.environ.get("CONCEPTNET_MAX_CONNECTIONS", "20"))
+CONCEPTNET_CACHE_PATH = os.environ.get(
+    "CONCEPTNET_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'conceptnet_cache.sqlite'))
+)
+CONCEPTNET_CACHE_TTL = float(os.environ.get("CONCEPTNET_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def normalize_word(word):
+    return word.strip().lower().replace(' ', '_')
+
+
+# ---------------------- Persistent Edge Cache ---------------------- #
+class EdgeCache:
+    # Stores every (rel_label, end_label) pair ConceptNet returned for a word, so
+    # callers can still apply their own limit / relation filtering on a hit.
+    def __init__(self, path, ttl=CONCEPTNET_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS edges ("
+                "word TEXT PRIMARY KEY, edges TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, words):
+        if not words:
+            return {}
+        conn = self._connect()
+        oldest = time.time() - self.ttl
+        placeholders = ",".join("?" * len(words))
+        rows = conn.execute(
+            f"SELECT word, edges FROM edges WHERE fetched_at >= ? AND word IN ({placeholders})",
+            [oldest, *words]
+        ).fetchall()
+        return {word: [tuple(e) for e in json.loads(edges)] for word, edges in rows}
+
+    def put_many(self, edges_by_word):
+        if not edges_by_word:
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO edges (word, edges, fetched_at) VALUES (?, ?, ?)",
+            [(word, json.dumps(edges), now) for word, edges in edges_by_word.items()]
+        )
+        conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------------------- Pooled Async Client ---------------------- #
+class ConceptNetClient:
+    # All HTTP traffic goes through one httpx.AsyncClient living on a private event
+    # loop thread, so sync callers (run_extraction_agent) and async callers share
+    # the same connection pool and the lookups of a sentence run concurrently.
+    def __init__(self, base_url=CONCEPTNET_URL, timeout=CONCEPTNET_TIMEOUT,
+                 max_connections=CONCEPTNET_MAX_CONNECTIONS, cache_path=CONCEPTNET_CACHE_PATH,
+                 cache_ttl=CONCEPTNET_CACHE_TTL):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = EdgeCache(cache_path, cache_ttl) if cache_path else None
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="conceptnet-client", daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _get_http_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+        return self._client
+
+    async def _fetch(self, word):
+        try:
+            with stage("conceptnet_lookup"):
+                response = await self._get_http_client().get(f"/c/en/{word}")
+        except httpx.HTTPError as e:
+            print(f"[ConceptNet] Lookup failed for '{word}': {e!r}")
+            return None
+        if response.status_code != 200:
+            return None
+        try:
+            edges = response.json().get('edges', [])
+            return [(e['rel']['label'], e['end']['label']) for e in edges]
+        except (ValueError, AttributeError, KeyError, TypeError) as e:
+            # A proxy error page or truncated body fails like a timed-out lookup
+            print(f"[ConceptNet] Malformed reply for '{word}': {e!r}")
+            return None
+
+    async def _lookup_many(self, words, timeout=None):
+        words = list(dict.fromkeys(normalize_word(w) for w in words))
+        found = self.cache.get_many(words) if self.cache else {}
+        misses = [w for w in words if w not in found]
+
+        fetches = [asyncio.ensure_future(self._fetch(w)) for w in misses]
+        done = set()
+        if fetches:
+            # Lookups still running after `timeout` seconds count as failed
+            done, late = await asyncio.wait(fetches, timeout=timeout)
+            for fetch in late:
+                fetch.cancel()
+        fetched = [fetch.result() if fetch in done else None for fetch in fetches]
+        fresh = {w: edges for w, edges in zip(misses, fetched) if edges is not None}
+        if self.cache:
+            self.cache.put_many(fresh)
+
+        found.update(fresh)
+        return found
+
+    def lookup_many(self, words, timeout=None):
+        # Returns {normalized_word: [(rel_label, end_label), ...]}; words whose
+        # request failed or timed out are missing from the result and are not cached.
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._lookup_many(words, timeout), loop).result()
+
+    def submit_many(self, words, timeout=None):
+        # Non-blocking lookup_many: a concurrent.futures.Future of the same result
+        return asyncio.run_coroutine_threadsafe(self._lookup_many(words, timeout), self._ensure_loop())
+
+    async def alookup_many(self, words, timeout=None):
+        return await asyncio.wrap_future(self.submit_many(words, timeout))
+
+    def close(self):
+        if self._loop is None:
+            return
+
+        async def _shutdown():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+            if self.cache:
+                self.cache.close()
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
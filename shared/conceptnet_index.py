@@ -0,0 +1,251 @@
+import argparse
+import bisect
+import gzip
+import heapq
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.conceptnet_client import normalize_word
+from shared.metrics import stage
+
+# ---------------------- Configuration ---------------------- #
+CONCEPTNET_INDEX_PATH = os.environ.get(
+    "CONCEPTNET_INDEX_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'conceptnet_index'))
+)
+# The HTTP API returns one page of 20 edges per node, so keep the same per term
+MAX_EDGES_PER_TERM = 20
+INDEX_VERSION = 1
+
+# Index layout (one directory, every array memory-mapped on open):
+#   terms.bin / term_offsets.npy       sorted, utf-8 encoded normalized terms
+#   edge_offsets.npy                   edges of term i are edge_*[off[i]:off[i+1]]
+#   edge_rel.npy / edge_target.npy     interned relation / target ids
+#   targets.bin / target_offsets.npy   utf-8 encoded end labels
+#   relations.json / meta.json
+
+
+def _term_from_uri(uri):
+    # /c/en/hot_dog/n/wn/food -> hot_dog
+    parts = uri.split('/')
+    return parts[3] if len(parts) > 3 else ""
+
+
+def _open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _write_strings(strings, out_dir, name):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(out_dir, f"{name}.bin"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(os.path.join(out_dir, f"{name}_offsets.npy"), offsets)
+
+
+# ---------------------- Build ---------------------- #
+def build_index(dump_path, out_dir, max_edges=MAX_EDGES_PER_TERM):
+    os.makedirs(out_dir, exist_ok=True)
+    relation_ids, target_ids = {}, {}
+    # term -> min-heap of (weight, -seq, rel_id, target_id), so only the
+    # max_edges heaviest edges per term are ever held in memory
+    per_term = {}
+    seq = 0
+    english_edges = 0
+
+    with _open_dump(dump_path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            _, rel_uri, start_uri, end_uri, info = fields[:5]
+            if not (start_uri.startswith("/c/en/") and end_uri.startswith("/c/en/")):
+                continue
+            if rel_uri == "/r/ExternalURL":
+                continue
+
+            info = json.loads(info)
+            end_term = _term_from_uri(end_uri)
+            rel_label = rel_uri[len("/r/"):]
+            end_label = info.get("surfaceEnd") or end_term.replace("_", " ")
+            rel_id = relation_ids.setdefault(rel_label, len(relation_ids))
+            target_id = target_ids.setdefault(end_label, len(target_ids))
+            weight = float(info.get("weight", 1.0))
+            english_edges += 1
+
+            # The API lists an edge under both of its nodes
+            for term in {normalize_word(_term_from_uri(start_uri)), normalize_word(end_term)}:
+                heap = per_term.setdefault(term, [])
+                entry = (weight, -seq, rel_id, target_id)
+                if len(heap) < max_edges:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            seq += 1
+
+    terms = sorted(per_term)
+    edge_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    edge_rel, edge_target = [], []
+    for i, term in enumerate(terms):
+        edges = sorted(per_term[term], reverse=True)
+        edge_rel.extend(e[2] for e in edges)
+        edge_target.extend(e[3] for e in edges)
+        edge_offsets[i + 1] = len(edge_rel)
+
+    _write_strings(terms, out_dir, "terms")
+    _write_strings(list(target_ids), out_dir, "targets")
+    np.save(os.path.join(out_dir, "edge_offsets.npy"), edge_offsets)
+    np.save(os.path.join(out_dir, "edge_rel.npy"), np.asarray(edge_rel, dtype=np.uint16))
+    np.save(os.path.join(out_dir, "edge_target.npy"), np.asarray(edge_target, dtype=np.uint32))
+    with open(os.path.join(out_dir, "relations.json"), "w") as f:
+        json.dump(list(relation_ids), f)
+    meta = {
+        "version": INDEX_VERSION,
+        "source": os.path.basename(dump_path),
+        "terms": len(terms),
+        "edges": len(edge_rel),
+        "english_assertions": english_edges,
+        "relations": len(relation_ids),
+        "targets": len(target_ids),
+        "max_edges_per_term": max_edges
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# ---------------------- Memory-mapped Lookup ---------------------- #
+class _StringTable:
+    def __init__(self, out_dir, name):
+        self.offsets = np.load(os.path.join(out_dir, f"{name}_offsets.npy"), mmap_mode="r")
+        with open(os.path.join(out_dir, f"{name}.bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+
+class ConceptNetIndex:
+    # Drop-in replacement for ConceptNetClient: same lookup_many / alookup_many
+    # contract, but served from a read-only index shared by every worker's page cache.
+    def __init__(self, path=CONCEPTNET_INDEX_PATH):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported ConceptNet index version in {path}: {self.meta.get('version')}")
+        with open(os.path.join(path, "relations.json")) as f:
+            self.relations = json.load(f)
+        self.terms = _StringTable(path, "terms")
+        self.targets = _StringTable(path, "targets")
+        self.edge_offsets = np.load(os.path.join(path, "edge_offsets.npy"), mmap_mode="r")
+        self.edge_rel = np.load(os.path.join(path, "edge_rel.npy"), mmap_mode="r")
+        self.edge_target = np.load(os.path.join(path, "edge_target.npy"), mmap_mode="r")
+
+    def lookup(self, word):
+        key = normalize_word(word).encode("utf-8")
+        i = bisect.bisect_left(self.terms, key)
+        if i == len(self.terms) or self.terms[i] != key:
+            return []
+        start, end = int(self.edge_offsets[i]), int(self.edge_offsets[i + 1])
+        return [
+            (self.relations[rel], self.targets[target].decode("utf-8"))
+            for rel, target in zip(self.edge_rel[start:end].tolist(), self.edge_target[start:end].tolist())
+        ]
+
+    def lookup_many(self, words, timeout=None):
+        # Local lookups: timeout is accepted for ConceptNetClient parity only
+        with stage("conceptnet_lookup"):
+            return {normalize_word(w): self.lookup(w) for w in words}
+
+    def submit_many(self, words, timeout=None):
+        future = Future()
+        future.set_result(self.lookup_many(words))
+        return future
+
+    async def alookup_many(self, words, timeout=None):
+        return self.lookup_many(words)
+
+    def close(self):
+        pass
+
+
+# ---------------------- Verification ---------------------- #
+def verify_index(path, words=(), sample=1000):
+    started = time.perf_counter()
+    index = ConceptNetIndex(path)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    n_terms = len(index.terms)
+    offsets = np.asarray(index.edge_offsets)
+    problems = []
+    if len(offsets) != n_terms + 1 or offsets[0] != 0 or np.any(np.diff(offsets) < 0):
+        problems.append("edge offsets are not monotonic")
+    if offsets[-1] != len(index.edge_rel) or len(index.edge_rel) != len(index.edge_target):
+        problems.append("edge arrays do not match offsets")
+    if len(index.edge_rel) and int(np.max(index.edge_rel)) >= len(index.relations):
+        problems.append("relation id out of range")
+    if len(index.edge_target) and int(np.max(index.edge_target)) >= len(index.targets):
+        problems.append("target id out of range")
+    if any(index.terms[i] >= index.terms[i + 1] for i in range(n_terms - 1)):
+        problems.append("term table is not strictly sorted")
+
+    rng = np.random.default_rng(0)
+    probe = [index.terms[int(i)].decode("utf-8") for i in rng.integers(0, n_terms, size=min(sample, n_terms))]
+    started = time.perf_counter()
+    for term in probe:
+        index.lookup(term)
+    lookup_us = (time.perf_counter() - started) * 1e6 / max(len(probe), 1)
+
+    return {
+        "meta": index.meta,
+        "open_ms": round(open_ms, 3),
+        "avg_lookup_us": round(lookup_us, 2),
+        "problems": problems,
+        "samples": {w: index.lookup(w) for w in words}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or verify the offline ConceptNet edge index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build an index from a ConceptNet assertions CSV (.csv or .csv.gz)")
+    build.add_argument("dump")
+    build.add_argument("out_dir", nargs="?", default=CONCEPTNET_INDEX_PATH)
+    build.add_argument("--max-edges", type=int, default=MAX_EDGES_PER_TERM)
+
+    verify = sub.add_parser("verify", help="check index consistency and lookup latency")
+    verify.add_argument("index_dir", nargs="?", default=CONCEPTNET_INDEX_PATH)
+    verify.add_argument("--words", nargs="*", default=[])
+    verify.add_argument("--sample", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        started = time.perf_counter()
+        meta = build_index(args.dump, args.out_dir, args.max_edges)
+        print(json.dumps(meta, indent=2))
+        print(f"Built in {time.perf_counter() - started:.1f}s -> {args.out_dir}")
+    else:
+        report = verify_index(args.index_dir, args.words, args.sample)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        if report["problems"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
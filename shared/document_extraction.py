@@ -0,0 +1,271 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.cocoex_utils import (
+    conceptnet_timeout, encode_texts, extract_contextual_concepts, get_conceptnet_info_batch, get_nlp
+)
+from shared.metrics import stage
+
+# ---------------------- Configuration ---------------------- #
+# spaCy worker processes for nlp.pipe (1: parse in this process) and the
+# sentences per pipe batch; one pipe spans a whole corpus, so the workers
+# start once however many documents there are
+DOC_N_PROCESS = int(os.environ.get("DOC_N_PROCESS", "1"))
+DOC_BATCH_SIZE = int(os.environ.get("DOC_BATCH_SIZE", "64"))
+# Sentences per streamed frame; concepts are deduplicated and encoded per window
+DOC_WINDOW = int(os.environ.get("DOC_WINDOW", "256"))
+# Concepts in the document ranking (and looked up in ConceptNet)
+DOC_TOP_K = int(os.environ.get("DOC_TOP_K", "20"))
+# Longer "sentences" (tables, logs without punctuation) are cut at a space
+DOC_MAX_SENTENCE_CHARS = int(os.environ.get("DOC_MAX_SENTENCE_CHARS", "1000"))
+# Unbroken paragraphs are split into chunks of about this many characters
+DOC_MAX_PARAGRAPH_CHARS = 100_000
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+# ---------------------- Sentence Splitting ---------------------- #
+def iter_paragraphs(lines, max_chars=DOC_MAX_PARAGRAPH_CHARS):
+    # Consecutive non-blank lines form a paragraph (hard-wrapped text is rejoined)
+    buffer, size = [], 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if buffer:
+                yield " ".join(buffer)
+            buffer, size = [], 0
+            continue
+        buffer.append(line)
+        size += len(line)
+        if size >= max_chars:
+            yield " ".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield " ".join(buffer)
+
+
+def _cut(sentence, max_chars):
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        yield sentence[:cut]
+        sentence = sentence[cut:].lstrip()
+    if sentence:
+        yield sentence
+
+
+def iter_sentences(source, max_chars=DOC_MAX_SENTENCE_CHARS):
+    # source: a string, or any iterable of lines (an open file is read lazily)
+    lines = source.splitlines() if isinstance(source, str) else source
+    for paragraph in iter_paragraphs(lines):
+        for sentence in _SENTENCE_END.split(paragraph):
+            yield from _cut(sentence.strip(), max_chars)
+
+
+# ---------------------- Ranking ---------------------- #
+def _unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def rank_window(docs, offset):
+    # Every distinct concept of the window is encoded once, with the sentences;
+    # concepts from earlier windows are hits in the embedding cache
+    concepts_per_sentence = [extract_contextual_concepts(doc.text, doc) for doc in docs]
+    unique = list(dict.fromkeys(c for concepts in concepts_per_sentence for c in concepts))
+    with stage("embedding_encode"):
+        embeddings = _unit_rows(encode_texts([doc.text for doc in docs] + unique))
+    sentence_embeddings, concept_embeddings = embeddings[:len(docs)], embeddings[len(docs):]
+    row = {concept: i for i, concept in enumerate(unique)}
+
+    sentences = []
+    for i, (doc, concepts) in enumerate(zip(docs, concepts_per_sentence)):
+        ranked = []
+        if concepts:
+            similarities = concept_embeddings[[row[c] for c in concepts]] @ sentence_embeddings[i]
+            ranked = sorted(zip(concepts, map(float, similarities)), key=lambda x: x[1], reverse=True)
+        sentences.append({"index": offset + i, "text": doc.text, "ranked_concepts": ranked})
+    return sentences
+
+
+class DocumentRanking:
+    # Running per-concept totals over the sentences seen so far: memory grows
+    # with the number of distinct concepts, not with the length of the document
+    def __init__(self):
+        self.sentences = 0
+        self.concepts = {}
+
+    def add(self, sentences):
+        for sentence in sentences:
+            self.sentences += 1
+            for concept, similarity in sentence["ranked_concepts"]:
+                totals = self.concepts.get(concept)
+                if totals is None:
+                    self.concepts[concept] = [1, similarity, similarity]
+                else:
+                    totals[0] += 1
+                    totals[1] += similarity
+                    totals[2] = max(totals[2], similarity)
+
+    def top(self, k):
+        # Score: summed sentence similarity over the document's sentence count,
+        # so a concept ranks by how relevant and how frequent it is
+        ranked = heapq.nlargest(k, self.concepts.items(), key=lambda item: item[1][1])
+        return [
+            {"concept": concept, "score": total / self.sentences, "mentions": mentions, "best_similarity": best}
+            for concept, (mentions, total, best) in ranked
+        ]
+
+
+def _document_frame(document, ranking, top_k, conceptnet):
+    top = ranking.top(top_k)
+    frame = {
+        "type": "document",
+        "document": document,
+        "sentences": ranking.sentences,
+        "distinct_concepts": len(ranking.concepts),
+        "ranked_concepts": top
+    }
+    if conceptnet:
+        # One deduplicated round of lookups for the document's top concepts
+        with stage("conceptnet"):
+            frame["conceptnet_relations"] = get_conceptnet_info_batch(
+                [entry["concept"] for entry in top], timeout=conceptnet_timeout()
+            )
+    return frame
+
+
+# ---------------------- Entry Points ---------------------- #
+def _tagged_sentences(documents, max_chars):
+    # (sentence, (document, last)); an empty closing sentence marks the end of
+    # each document, so documents without any sentence still get their frame
+    for document, source in documents:
+        for sentence in iter_sentences(source, max_chars):
+            yield sentence, (document, False)
+        yield "", (document, True)
+
+
+def iter_corpus_extraction(documents, n_process=DOC_N_PROCESS, batch_size=DOC_BATCH_SIZE, window=DOC_WINDOW,
+                           top_k=DOC_TOP_K, conceptnet=True, max_chars=DOC_MAX_SENTENCE_CHARS):
+    # documents: iterable of (document id, text or lines). Frames, in order:
+    # {"type": "sentences", "document", "sentences": [{"index", "text", "ranked_concepts"}]}
+    # per window of sentences, {"type": "document", "document", "sentences",
+    # "distinct_concepts", "ranked_concepts", "conceptnet_relations"} per document,
+    # and a final {"type": "done"}
+    docs = get_nlp().pipe(_tagged_sentences(documents, max_chars), as_tuples=True,
+                          n_process=n_process, batch_size=batch_size)
+    ranking, pending, offset = DocumentRanking(), [], 0
+    try:
+        for doc, (document, last) in docs:
+            if not last:
+                pending.append(doc)
+                if len(pending) < window:
+                    continue
+            if pending:
+                sentences = rank_window(pending, offset)
+                ranking.add(sentences)
+                offset += len(pending)
+                pending = []
+                yield {"type": "sentences", "document": document, "sentences": sentences}
+            if last:
+                yield _document_frame(document, ranking, top_k, conceptnet)
+                ranking, offset = DocumentRanking(), 0
+        yield {"type": "done"}
+    finally:
+        # A consumer that stops early also stops the nlp.pipe worker processes
+        docs.close()
+
+
+def iter_document_extraction(source, **options):
+    return iter_corpus_extraction([(0, source)], **options)
+
+
+def run_document_extraction(source, top_k=DOC_TOP_K, conceptnet=True):
+    # Every frame at once, for executors that cannot step a generator (memory
+    # then grows with the document, unlike iter_document_extraction)
+    return list(iter_document_extraction(source, top_k=top_k, conceptnet=conceptnet))
+
+
+# ---------------------- Corpus CLI ---------------------- #
+def _peak_rss_mb():
+    # This process's high-water mark, and the largest of its finished children
+    # (the nlp.pipe workers)
+    own = 0
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                own = int(line.split()[1])
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+
+def extract_corpus(paths, out, **options):
+    # One JSON line per frame; nothing but the current window is held in memory
+    def documents():
+        for path in paths:
+            if path == "-":
+                yield path, sys.stdin
+                continue
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield path, f
+
+    stats = {"documents": 0, "sentences": 0, "characters": 0}
+    started = time.perf_counter()
+    for frame in iter_corpus_extraction(documents(), **options):
+        if frame["type"] == "sentences":
+            stats["characters"] += sum(len(s["text"]) for s in frame["sentences"])
+        elif frame["type"] == "document":
+            stats["documents"] += 1
+            stats["sentences"] += frame["sentences"]
+        out.write(json.dumps(frame, ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - started
+    peak_rss_mb, worker_peak_rss_mb = _peak_rss_mb()
+    return {
+        **stats,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(stats["documents"] / elapsed, 2) if elapsed else 0.0,
+        "sentences_per_s": round(stats["sentences"] / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "worker_peak_rss_mb": worker_peak_rss_mb
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank the concepts of long documents, one JSONL frame per window")
+    parser.add_argument("inputs", nargs="+", help="text files, one document each ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output (default: stdout)")
+    parser.add_argument("--n-process", type=int, default=DOC_N_PROCESS, help="spaCy worker processes")
+    parser.add_argument("--batch-size", type=int, default=DOC_BATCH_SIZE, help="sentences per nlp.pipe batch")
+    parser.add_argument("--window", type=int, default=DOC_WINDOW, help="sentences per output frame")
+    parser.add_argument("--top-k", type=int, default=DOC_TOP_K, help="concepts in each document ranking")
+    parser.add_argument("--no-conceptnet", action="store_true", help="skip the ConceptNet lookups")
+    parser.add_argument("--summary", help="also write the throughput summary (JSON) here")
+    args = parser.parse_args(argv)
+
+    # Model loading is kept out of the timings
+    get_nlp()
+    encode_texts(["warmup"])
+    options = dict(n_process=args.n_process, batch_size=args.batch_size, window=args.window,
+                   top_k=args.top_k, conceptnet=not args.no_conceptnet)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            summary = extract_corpus(args.inputs, out, **options)
+    else:
+        summary = extract_corpus(args.inputs, sys.stdout, **options)
+    print(f"[Document Extraction] {json.dumps(summary)}", file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({**summary, "n_process": args.n_process, "batch_size": args.batch_size}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# ---------------------- Configuration ---------------------- #
+EMBED_SCHED_MAX_BATCH = int(os.environ.get("EMBED_SCHED_MAX_BATCH", "64"))
+EMBED_SCHED_MAX_WAIT_MS = float(os.environ.get("EMBED_SCHED_MAX_WAIT_MS", "10"))
+# Sentences waiting to be encoded, over all requests, before new ones are refused
+EMBED_SCHED_MAX_QUEUE = int(os.environ.get("EMBED_SCHED_MAX_QUEUE", "4096"))
+# Upper bounds (in characters) of the length buckets; longer texts share the last one
+EMBED_SCHED_BUCKETS = [int(b) for b in os.environ.get("EMBED_SCHED_BUCKETS", "32,64,128,256").split(",")]
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class _Chunk:
+    # One caller's slice of sentences; resolved once every row is encoded
+    def __init__(self, size):
+        self.future = Future()
+        self.rows = [None] * size
+        self.remaining = size
+
+
+# ---------------------- Length-bucketed Dynamic Batching ---------------------- #
+class EmbedScheduler:
+    # Sentences from all concurrent callers are queued per length bucket, so a
+    # batch pads to similar lengths. A bucket is encoded once it holds
+    # max_batch_size sentences, or when its oldest sentence has waited max_wait_ms.
+    def __init__(self, encode_fn, max_batch_size=EMBED_SCHED_MAX_BATCH, max_wait_ms=EMBED_SCHED_MAX_WAIT_MS,
+                 max_queue=EMBED_SCHED_MAX_QUEUE, buckets=EMBED_SCHED_BUCKETS):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.bucket_bounds = sorted(buckets)
+        self._buckets = [[] for _ in range(len(self.bucket_bounds) + 1)]
+        self.pending = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.batches = 0
+        self.encoded = 0
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="embed-scheduler", daemon=True)
+            self._thread.start()
+
+    def has_room(self, count):
+        return self.pending + count <= self.max_queue
+
+    def submit(self, texts, block=False, timeout=None):
+        # Returns a Future of a (len(texts), dim) float32 array. Without block,
+        # raises SchedulerFull when the queue has no room for the texts.
+        chunk = _Chunk(len(texts))
+        if not texts:
+            chunk.future.set_result(None)
+            return chunk.future
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            self._ensure_worker()
+            while not self.has_room(len(texts)):
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if not block or (remaining is not None and remaining <= 0):
+                    raise SchedulerFull(f"{self.pending} sentences already queued")
+                self._cond.wait(remaining)
+            now = time.monotonic()
+            for i, text in enumerate(texts):
+                bucket = bisect.bisect_left(self.bucket_bounds, len(text))
+                self._buckets[bucket].append((now, text, chunk, i))
+            self.pending += len(texts)
+            self._cond.notify_all()
+        return chunk.future
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                waiting = [b for b in self._buckets if b]
+                if not waiting:
+                    self._cond.wait()
+                    continue
+                # The bucket holding the oldest sentence goes first once that
+                # sentence is due, so a full bucket cannot starve the others;
+                # until then a full bucket is encoded right away
+                bucket = min(waiting, key=lambda b: b[0][0])
+                due = bucket[0][0] + self.max_wait - time.monotonic()
+                full = [b for b in waiting if len(b) >= self.max_batch_size]
+                if due > 0 and full:
+                    bucket = full[0]
+                if full or due <= 0:
+                    batch = bucket[:self.max_batch_size]
+                    del bucket[:self.max_batch_size]
+                    self.pending -= len(batch)
+                    self._cond.notify_all()
+                    return batch
+                self._cond.wait(due)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                embeddings = np.asarray(self.encode_fn([text for _, text, _, _ in batch]), dtype=np.float32)
+            except Exception as e:
+                for _, _, chunk, _ in batch:
+                    if not chunk.future.done():
+                        chunk.future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.encoded += len(batch)
+            for row, (_, _, chunk, i) in zip(embeddings, batch):
+                if chunk.future.done():
+                    continue
+                chunk.rows[i] = row
+                chunk.remaining -= 1
+                if chunk.remaining == 0:
+                    chunk.future.set_result(np.stack(chunk.rows))
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "batches": self.batches,
+            "encoded": self.encoded,
+            "avg_batch": round(self.encoded / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# ---------------------- Configuration ---------------------- #
+EMBED_CACHE_MAX_BYTES = int(os.environ.get("EMBED_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+# Optional .npz snapshot written on shutdown and loaded on start ("" disables)
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "")
+
+
+# ---------------------- Embedding LRU Cache ---------------------- #
+class EmbeddingCache:
+    # Rows live in one preallocated float32 matrix sized from the byte budget;
+    # the OrderedDict only maps (model_name, text) -> row slot in LRU order.
+    def __init__(self, dim, model_name, max_bytes=EMBED_CACHE_MAX_BYTES):
+        self.dim = dim
+        self.model_name = model_name
+        self.capacity = max(1, max_bytes // (dim * 4))
+        self.matrix = np.empty((self.capacity, dim), dtype=np.float32)
+        self._slots = OrderedDict()
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _key(self, text):
+        return (self.model_name, text)
+
+    def lookup(self, texts):
+        # Returns (rows, miss_positions); rows at miss positions are left unset
+        rows = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                slot = self._slots.get(self._key(text))
+                if slot is None:
+                    missing.append(i)
+                    continue
+                self._slots.move_to_end(self._key(text))
+                rows[i] = self.matrix[slot]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return rows, missing
+
+    def insert(self, texts, embeddings):
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self._key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    if not self._free:
+                        _, evicted = self._slots.popitem(last=False)
+                        self._free.append(evicted)
+                        self.evictions += 1
+                    slot = self._free.pop()
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                self.matrix[slot] = embedding
+
+    def encode(self, texts, encode_fn):
+        # Only distinct misses reach encode_fn; results are merged back in order
+        texts = list(texts)
+        rows, missing = self.lookup(texts)
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(encode_fn(unique), dtype=np.float32)
+            self.insert(unique, encoded)
+            position = {text: j for j, text in enumerate(unique)}
+            for i in missing:
+                rows[i] = encoded[position[texts[i]]]
+        return rows
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "matrix_bytes": self.matrix.nbytes,
+                "key_bytes": sum(len(text.encode("utf-8")) for _, text in self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    # ---------------------- Persistence ---------------------- #
+    def save(self, path):
+        with self._lock:
+            keys = [text for _, text in self._slots]
+            slots = list(self._slots.values())
+            matrix = self.matrix[slots]
+        # Per process: forked workers may snapshot to the same path at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, model_name=np.array(self.model_name), texts=np.array(keys, dtype=str), matrix=matrix)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["model_name"]) != self.model_name or data["matrix"].shape[1:] != (self.dim,):
+                print(f"[Embedding Cache] Ignoring {path}: built for another model")
+                return 0
+            texts = data["texts"].tolist()[-self.capacity:]
+            matrix = data["matrix"][-self.capacity:]
+        self.insert(texts, matrix)
+        return len(texts)
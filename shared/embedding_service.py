@@ -0,0 +1,80 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# ---------------------- Configuration ---------------------- #
+EMBED_BATCHING = os.environ.get("EMBED_BATCHING", "1") == "1"
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", "5"))
+
+
+# ---------------------- Cross-request Micro-batching ---------------------- #
+class EmbeddingBatcher:
+    # Callers from any thread submit texts; a single worker thread gathers
+    # requests until max_batch_size texts are queued or max_wait_ms has passed
+    # since the first one arrived, runs one encode over all of them and hands
+    # each caller back its own rows.
+    def __init__(self, model, max_batch_size=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS, enabled=EMBED_BATCHING):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.enabled = enabled
+        self.dim = model.get_sentence_embedding_dimension()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if not self.enabled:
+            return self.model.encode(texts)
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        texts = [t for item_texts, _ in batch for t in item_texts]
+        try:
+            # SentenceTransformer sorts by length internally, so one call over the
+            # merged texts keeps padding per sub-batch small
+            embeddings = self.model.encode(texts, batch_size=max(self.max_batch_size, 1))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for item_texts, future in batch:
+            future.set_result(embeddings[start:start + len(item_texts)])
+            start += len(item_texts)
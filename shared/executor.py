@@ -0,0 +1,260 @@
+import asyncio
+import contextvars
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from shared.admission import admission as default_admission, call_with_budget, error_frame, remaining_ms, with_deadline
+from shared.metrics import call_with_query_id, query_id_var, record_error, traced
+from shared.result_cache import pipeline_version
+from shared.wire import receive_message, send_message
+
+# ---------------------- Configuration ---------------------- #
+# thread: shared-memory pool, fine when the heavy lifting releases the GIL (torch, numpy)
+# process: one interpreter (and one copy of the models) per worker
+# inline: run on the event loop, as the services originally did
+AGENT_EXECUTOR = os.environ.get("AGENT_EXECUTOR", "thread")
+AGENT_WORKERS = int(os.environ.get("AGENT_WORKERS", str(os.cpu_count() or 1)))
+# Jobs a service accepts into its pool before further submitters have to wait
+AGENT_MAX_PENDING = int(os.environ.get("AGENT_MAX_PENDING", "64"))
+# Messages a single connection may have in flight before its reader pauses
+AGENT_PIPELINE_DEPTH = int(os.environ.get("AGENT_PIPELINE_DEPTH", "8"))
+
+
+def preload_modules(*module_names):
+    # Import each module once per worker instead of on its first request
+    for name in module_names:
+        importlib.import_module(name)
+
+
+def _noop():
+    return os.getpid()
+
+
+def _init_worker(module_names, warmup):
+    # Process-pool initializer: preload, then warm up, on every worker
+    preload_modules(*module_names)
+    if warmup is not None:
+        warmup()
+
+
+# ---------------------- Execution Layer ---------------------- #
+class AgentExecutor:
+    def __init__(self, kind=AGENT_EXECUTOR, workers=AGENT_WORKERS, max_pending=AGENT_MAX_PENDING,
+                 preload=(), warmup=None):
+        if kind not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.preload = tuple(preload)
+        # Module-level callable run once per worker by start() (e.g. model warmup)
+        self.warmup = warmup
+        self.pending = 0
+        self._pool = None
+        self._slots = None
+
+    def _ensure_pool(self):
+        if self._pool is None and self.kind == "thread":
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="agent-worker")
+        elif self._pool is None and self.kind == "process":
+            # spawn, not fork: the parent may already run threads (ConceptNet loop,
+            # embedding batcher) that must not be cloned mid-flight
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.preload, self.warmup)
+            )
+        return self._pool
+
+    async def start(self):
+        # Bring every worker up (and through its preload and warmup) before traffic arrives
+        if self.kind == "inline":
+            if self.warmup is not None:
+                await asyncio.to_thread(self.warmup)
+            return
+        pool = self._ensure_pool()
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread" and self.warmup is not None:
+            # Threads share the models: warming up once is enough
+            await loop.run_in_executor(pool, self.warmup)
+        await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(self.workers)))
+
+    async def run(self, fn, *args):
+        if self.kind == "inline":
+            return fn(*args)
+        # Pool threads and processes don't inherit contextvars: pass the query id
+        # and the remaining budget along
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            self.pending += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._ensure_pool(), call_with_query_id, query_id_var.get(),
+                    call_with_budget, remaining_ms(), fn, *args
+                )
+            finally:
+                self.pending -= 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+# ---------------------- Per-connection Pipelining ---------------------- #
+class _PipelineSlot:
+    # One of a connection's `depth` slots, held by a tagged message's handler
+    def __init__(self, slots):
+        self.slots = slots
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.slots.release()
+
+
+_pipeline_slot = contextvars.ContextVar("pipeline_slot", default=None)
+
+
+def release_pipeline_slot():
+    # For handlers about to wait on another agent (a peer's round-1 summary):
+    # the connection reads on meanwhile, so two agents each waiting for a
+    # message the other has not read yet cannot hold each other up
+    slot = _pipeline_slot.get()
+    if slot is not None:
+        slot.release()
+
+async def _drain(frames, send):
+    # A stream cut short (client gone, send failed) is closed right away, so the
+    # generator's cleanup runs now rather than whenever it is collected
+    try:
+        async for frame in frames:
+            await send(frame)
+    finally:
+        if hasattr(frames, "aclose"):
+            await frames.aclose()
+
+
+async def serve_pipelined(websocket, handle, depth=AGENT_PIPELINE_DEPTH, text_is_json=True,
+                          admission=default_admission, exempt=(), on_reject=None):
+    # Keeps reading while earlier messages are still being handled; up to `depth`
+    # handle(message, binary) coroutines run at once (a None reply sends nothing;
+    # see release_pipeline_slot for handlers that wait on other agents).
+    # Messages carrying an "id" are answered as {"id", "result"} as soon as they
+    # finish; untagged ones are answered in arrival order, as before.
+    # A handler may also return an async iterator of frames: tagged, each frame
+    # goes out as {"id", "result", "more": True} and a final {"id", "result": None}
+    # closes the stream; untagged, the frames are sent as they are.
+    # Every message is timed and tagged with its query id (shared.metrics.traced)
+    # and runs under its "budget_ms" deadline (shared.admission.with_deadline).
+    # A message that fails is answered with {"id", "error": {"type", "message"}}
+    # and the connection stays open; past the admission limit a message is
+    # answered with an "Overloaded" error without being handled (on_reject,
+    # if given, is called with it, e.g. to tell a waiting peer).
+    # {"step": "version", "id"} is answered here with the service's
+    # pipeline_version(), which clients fold into their result cache keys.
+    handle = traced(with_deadline(handle))
+    # Untagged messages wait here for their in-order reply; tagged ones hold a
+    # slot until they are done, whatever order they finish in
+    in_flight = asyncio.Queue(maxsize=depth)
+    slots = asyncio.Semaphore(depth)
+    running = set()
+    send_lock = asyncio.Lock()
+
+    async def send(reply, binary):
+        async with send_lock:
+            await send_message(websocket, reply, binary)
+
+    async def handle_tagged(message, binary, slot):
+        _pipeline_slot.set(slot)
+        try:
+            reply = await handle(message, binary)
+            if hasattr(reply, "__aiter__"):
+                await _drain(reply, lambda frame: send({"id": message["id"], "result": frame, "more": True}, binary))
+                reply = None
+        except Exception as e:
+            await send({"id": message["id"], "error": error_frame(e)}, binary)
+            return
+        await send({"id": message["id"], "result": reply}, binary)
+
+    async def handle_untagged(message, binary):
+        try:
+            return await handle(message, binary)
+        except Exception as e:
+            return {"error": error_frame(e)}
+
+    def reject(message):
+        error = admission.overloaded()
+        record_error(error)
+        reply = {"error": error_frame(error)}
+        if isinstance(message, dict) and "id" in message:
+            reply["id"] = message["id"]
+        return reply
+
+    async def reader():
+        while True:
+            message, binary = await receive_message(websocket, text_is_json)
+            tagged = isinstance(message, dict) and "id" in message
+            if tagged and message.get("step") == "version":
+                await send({"id": message["id"], "result": {"version": pipeline_version()}}, binary)
+                continue
+            if admission is not None and not admission.try_admit(message, exempt):
+                if on_reject is not None:
+                    on_reject(message)
+                if tagged:
+                    await send(reject(message), binary)
+                else:
+                    # Still queued, so untagged replies keep their order
+                    rejected = asyncio.get_running_loop().create_future()
+                    rejected.set_result(reject(message))
+                    await in_flight.put((rejected, binary, False))
+                continue
+            if tagged:
+                # A tagged handler sends its own reply (every frame of a stream),
+                # so its admission slot is released once the task is done
+                await slots.acquire()
+                slot = _PipelineSlot(slots)
+                task = asyncio.ensure_future(handle_tagged(message, binary, slot))
+                task.add_done_callback(lambda _, slot=slot: slot.release())
+                if admission is not None:
+                    task.add_done_callback(lambda _: admission.release())
+                running.add(task)
+                task.add_done_callback(running.discard)
+            else:
+                # Released by the writer, once the last frame of the reply is out
+                task = asyncio.ensure_future(handle_untagged(message, binary))
+                await in_flight.put((task, binary, admission is not None))
+
+    async def writer():
+        while True:
+            task, binary, admitted = await in_flight.get()
+            try:
+                reply = await task
+                if hasattr(reply, "__aiter__"):
+                    await _drain(reply, lambda frame: send(frame, binary))
+                elif reply is not None:
+                    await send(reply, binary)
+            finally:
+                if admitted:
+                    admission.release()
+
+    loops = [asyncio.create_task(reader()), asyncio.create_task(writer())]
+    try:
+        done, _ = await asyncio.wait(loops, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in loops:
+            task.cancel()
+        for task in list(running):
+            task.cancel()
+        while not in_flight.empty():
+            task, _, admitted = in_flight.get_nowait()
+            task.cancel()
+            if admitted:
+                admission.release()
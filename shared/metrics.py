@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from fastapi.responses import PlainTextResponse, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter as PromCounter, Histogram, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from shared.admission import admission
+
+# ---------------------- Configuration ---------------------- #
+# Label for everything this process records; set by add_metrics_routes and
+# inherited by spawned pool workers through the environment
+SERVICE = os.environ.get("METRICS_SERVICE", "agent")
+# Print a [Trace] line for every span slower than this (ms); TRACE_LOG=1 prints all
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "500"))
+TRACE_LOG = os.environ.get("TRACE_LOG", "0") == "1"
+# Exposes /debug/profile (sampling profiler) when set
+METRICS_PROFILER = os.environ.get("METRICS_PROFILER", "0") == "1"
+# With AGENT_EXECUTOR=process, set PROMETHEUS_MULTIPROC_DIR so worker processes'
+# histograms are aggregated into /metrics (prometheus_client multiprocess mode)
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+_SIZE_BUCKETS = tuple(2 ** i for i in range(8, 26, 2))
+
+STAGE_SECONDS = Histogram(
+    "agent_stage_seconds", "Time spent in one pipeline stage", ["service", "stage"], buckets=_LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "agent_request_seconds", "Time to answer one WebSocket message", ["service", "step"], buckets=_LATENCY_BUCKETS
+)
+MESSAGE_BYTES = Histogram(
+    "agent_message_bytes", "Serialized WebSocket message size", ["service", "direction"], buckets=_SIZE_BUCKETS
+)
+ERRORS = PromCounter("agent_errors", "Failed messages and closed connections", ["service", "kind"])
+
+# ---------------------- Query Tracing ---------------------- #
+# Set per message from its "query_id" (or "stream_id"), so the spans of one
+# query can be found in every service's log by that id
+query_id_var = contextvars.ContextVar("query_id", default=None)
+
+
+def _trace(name, seconds):
+    ms = seconds * 1000
+    if TRACE_LOG or ms >= TRACE_SLOW_MS:
+        print(f"[Trace] {SERVICE} query={query_id_var.get()} {name} {ms:.1f}ms")
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(SERVICE, name).observe(elapsed)
+        _trace(name, elapsed)
+
+
+def call_with_query_id(query_id, fn, *args):
+    # Runs fn on a pool worker (thread or process) under the caller's query id
+    token = query_id_var.set(query_id)
+    try:
+        return fn(*args)
+    finally:
+        query_id_var.reset(token)
+
+
+def traced(handle):
+    # Wraps a serve_pipelined handler: query id, per-step latency and errors
+    async def handle_traced(message, binary):
+        step, query_id = "message", None
+        if isinstance(message, dict):
+            step = message.get("step") or step
+            query_id = message.get("query_id") or message.get("stream_id")
+        query_id_var.set(query_id)
+        started = time.perf_counter()
+        try:
+            return await handle(message, binary)
+        except Exception as e:
+            record_error(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.labels(SERVICE, step).observe(elapsed)
+            _trace(step, elapsed)
+    return handle_traced
+
+
+def observe_message(direction, size):
+    MESSAGE_BYTES.labels(SERVICE, direction).observe(size)
+
+
+def record_error(error):
+    ERRORS.labels(SERVICE, type(error).__name__).inc()
+
+
+# ---------------------- Live Gauges ---------------------- #
+class _LiveCollector:
+    # Queue depths and cache stats read at scrape time from the objects that
+    # already keep them (executor.pending, EmbeddingCache.stats(), ...)
+    def __init__(self):
+        self.queues = {}
+        self.caches = {}
+
+    def collect(self):
+        depth = GaugeMetricFamily("agent_queue_depth", "Items waiting or in flight", labels=["service", "queue"])
+        for name, fn in self.queues.items():
+            depth.add_metric([SERVICE, name], fn())
+        hits = CounterMetricFamily("agent_cache_hits", "Cache hits", labels=["service", "cache"])
+        misses = CounterMetricFamily("agent_cache_misses", "Cache misses", labels=["service", "cache"])
+        entries = GaugeMetricFamily("agent_cache_entries", "Cached entries", labels=["service", "cache"])
+        ratio = GaugeMetricFamily("agent_cache_hit_ratio", "Hits over lookups", labels=["service", "cache"])
+        for name, fn in self.caches.items():
+            stats = fn()
+            if not stats:
+                continue
+            if "hits" in stats:
+                hits.add_metric([SERVICE, name], stats["hits"])
+                misses.add_metric([SERVICE, name], stats.get("misses", 0))
+                lookups = stats["hits"] + stats.get("misses", 0)
+                ratio.add_metric([SERVICE, name], stats["hits"] / lookups if lookups else 0.0)
+            if "entries" in stats:
+                entries.add_metric([SERVICE, name], stats["entries"])
+        return [depth, hits, misses, entries, ratio]
+
+
+live = _LiveCollector()
+REGISTRY.register(live)
+
+
+def watch_queue(name, fn):
+    live.queues[name] = fn
+
+
+def watch_cache(name, stats_fn):
+    # stats_fn returns a dict with any of hits / misses / entries, or None
+    live.caches[name] = stats_fn
+
+
+def _scrape_registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    # Histograms from every process's files, plus this process's live gauges
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    registry.register(live)
+    return registry
+
+
+# ---------------------- Sampling Profiler ---------------------- #
+class SamplingProfiler:
+    # Samples every thread's stack each `interval` seconds from a background
+    # thread; collapsed() gives "frame;frame;frame count" lines, the input
+    # format of flamegraph.pl / speedscope
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def collapsed(self, top=None):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(top)) + "\n"
+
+
+# ---------------------- Routes ---------------------- #
+def add_metrics_routes(app, service, executor=None):
+    # /metrics for Prometheus (plus the HTTP metrics of the instrumentator);
+    # /debug/profile?seconds=10 when METRICS_PROFILER=1
+    global SERVICE
+    from prometheus_fastapi_instrumentator import Instrumentator
+
+    SERVICE = os.environ["METRICS_SERVICE"] = service
+    Instrumentator().instrument(app)
+    if executor is not None:
+        watch_queue("executor", lambda: executor.pending)
+    watch_queue("admitted", lambda: admission.in_flight)
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(generate_latest(_scrape_registry()), media_type=CONTENT_TYPE_LATEST)
+
+    if METRICS_PROFILER:
+        @app.get("/debug/profile")
+        async def profile(seconds: float = 10.0, interval_ms: float = 5.0, top: int = 200):
+            profiler = SamplingProfiler(interval_ms / 1000).start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+            return PlainTextResponse(profiler.collapsed(top))
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+from fastapi.responses import JSONResponse
+
+# ---------------------- Configuration ---------------------- #
+# Load the models and run a dummy batch in the background at startup; with 0
+# the service is ready at once and models load on the first request instead
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") == "1"
+
+
+# ---------------------- Lazy Model Registry ---------------------- #
+class ModelRegistry:
+    # Loaders are registered at import time but only run on the first get();
+    # each name has its own lock, so one loader may get() another model.
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self.load_seconds = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self.load_seconds[name] = round(time.perf_counter() - started, 3)
+                print(f"[Model Registry] Loaded {name} in {self.load_seconds[name]}s")
+        return self._models[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def status(self):
+        return {name: self.load_seconds.get(name) for name in self._loaders}
+
+
+registry = ModelRegistry()
+
+
+# ---------------------- Readiness ---------------------- #
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.error = None
+        self.started = time.monotonic()
+        self.ready_seconds = None
+
+    def set_ready(self):
+        self.ready = True
+        self.ready_seconds = round(time.monotonic() - self.started, 3)
+
+    def set_failed(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    async def run(self, startup):
+        # Runs a service's startup coroutine (executor start, warmup) in the
+        # background so /healthz answers while the models are still loading
+        try:
+            await startup()
+        except Exception as e:
+            self.set_failed(e)
+            print(f"[Readiness] Startup failed: {self.error}")
+            return
+        self.set_ready()
+
+
+def add_health_routes(app, readiness):
+    # /healthz: the process is up; /ready: models are hot and traffic may come in
+    @app.get("/healthz")
+    def healthz():
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    def ready():
+        body = {
+            "ready": readiness.ready,
+            "ready_seconds": readiness.ready_seconds,
+            "error": readiness.error,
+            "models": registry.status()
+        }
+        return JSONResponse(body, status_code=200 if readiness.ready else 503)
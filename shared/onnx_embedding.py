@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# ---------------------- Configuration ---------------------- #
+# Exported models live in <ONNX_MODEL_DIR>/<model name>/ (model.onnx,
+# model.int8.onnx, tokenizer.json, meta.json) and are reused across runs
+ONNX_MODEL_DIR = os.environ.get(
+    "ONNX_MODEL_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'onnx_models'))
+)
+# One inference at a time per session uses every core; the micro-batcher
+# already serializes calls, so inter-op parallelism is not needed
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", str(os.cpu_count() or 1)))
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", "1"))
+ONNX_OPSET = 14
+
+PARITY_SENTENCES = [
+    "I need a warm blanket because it is cold tonight",
+    "Where can I buy fresh coffee near the station?",
+    "My phone battery died and I have to call my mother",
+    "I want to learn to play the guitar this summer",
+    "The kids are hungry and we are out of bread",
+    "Find me a quiet place to read a book",
+    "I am tired after running ten kilometers",
+    "We should book a hotel for the conference in Berlin",
+]
+
+
+def model_dir(model_name, root=ONNX_MODEL_DIR):
+    return os.path.join(root, model_name.replace("/", "__"))
+
+
+# ---------------------- Export ---------------------- #
+def export_model(model_name, out_dir=None, quantize=True):
+    # Needs torch and sentence-transformers, but only once per model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    pooling = st_model[1]
+
+    class _LastHiddenState(torch.nn.Module):
+        # Pooling and normalization run in NumPy, so only the encoder is exported
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    dummy = st_model.tokenizer(["export the sentence encoder"], return_tensors="pt")
+    onnx_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True
+        )
+    st_model.tokenizer.save_pretrained(out_dir)
+
+    meta = {
+        "model_name": model_name,
+        "dim": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        "pad_token": st_model.tokenizer.pad_token,
+        "pad_id": st_model.tokenizer.pad_token_id
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    if quantize:
+        quantize_model(out_dir)
+    return meta
+
+
+def quantize_model(out_dir):
+    # Dynamic int8: weights quantized offline, activations per batch at runtime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        os.path.join(out_dir, "model.onnx"),
+        os.path.join(out_dir, "model.int8.onnx"),
+        weight_type=QuantType.QInt8
+    )
+
+
+# ---------------------- Inference ---------------------- #
+class OnnxSentenceEncoder:
+    # Stand-in for the SentenceTransformer calls the pipeline makes: encode()
+    # and get_sentence_embedding_dimension(), with the same pooling/normalization
+    def __init__(self, path, quantized=False, intra_op_threads=ONNX_INTRA_OP_THREADS,
+                 inter_op_threads=ONNX_INTER_OP_THREADS):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.model_file = os.path.join(path, "model.int8.onnx" if quantized else "model.onnx")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_file, options, providers=["CPUExecutionProvider"])
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_id"], pad_token=self.meta["pad_token"])
+
+    @classmethod
+    def from_pretrained(cls, model_name, quantized=False, root=ONNX_MODEL_DIR):
+        # Exports (and quantizes) on first use
+        path = model_dir(model_name, root)
+        wanted = os.path.join(path, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(wanted):
+            print(f"[ONNX Embedding] Exporting {model_name} to {path}")
+            export_model(model_name, path, quantize=quantized)
+        return cls(path, quantized)
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta["dim"]
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+        if self.meta["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.meta["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        # Length-sorted sub-batches keep padding small, as SentenceTransformer does
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.meta["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([texts[i] for i in rows])
+        return embeddings
+
+
+# ---------------------- Parity Check ---------------------- #
+def _ranking(sentence_embedding, concept_embeddings):
+    return list(np.argsort(-(concept_embeddings @ sentence_embedding), kind="stable"))
+
+
+def _timed_encode(model, texts, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        embeddings = model.encode(texts)
+    return np.asarray(embeddings, dtype=np.float32), (time.perf_counter() - started) * 1000 / repeats
+
+
+def check_parity(model_name, sentences=PARITY_SENTENCES, backends=("onnx", "onnx-int8"), repeats=3):
+    # Cosine drift of every backend against the PyTorch embeddings, and how often
+    # the concept ranking of a sentence changes
+    from sentence_transformers import SentenceTransformer
+    from shared.cocoex_utils import extract_contextual_concepts
+
+    reference = SentenceTransformer(model_name, device="cpu")
+    queries = [(s, extract_contextual_concepts(s)) for s in sentences]
+    texts = list(dict.fromkeys([s for s, _ in queries] + [c for _, concepts in queries for c in concepts]))
+    row = {text: i for i, text in enumerate(texts)}
+
+    def normalized(embeddings):
+        return embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    base, base_ms = _timed_encode(reference, texts, repeats)
+    base = normalized(base)
+    report = {"model": model_name, "texts": len(texts), "torch": {"encode_ms": round(base_ms, 2)}}
+
+    for backend in backends:
+        encoder = OnnxSentenceEncoder.from_pretrained(model_name, quantized=backend == "onnx-int8")
+        embeddings, encode_ms = _timed_encode(encoder, texts, repeats)
+        embeddings = normalized(embeddings)
+        cosine = np.einsum("ij,ij->i", base, embeddings)
+
+        changed, top1_changed = [], 0
+        for sentence, concepts in queries:
+            if len(concepts) < 2:
+                continue
+            rows = [row[c] for c in concepts]
+            expected = _ranking(base[row[sentence]], base[rows])
+            actual = _ranking(embeddings[row[sentence]], embeddings[rows])
+            if expected != actual:
+                changed.append(sentence)
+                top1_changed += expected[0] != actual[0]
+
+        report[backend] = {
+            "encode_ms": round(encode_ms, 2),
+            "speedup": round(base_ms / encode_ms, 2) if encode_ms else None,
+            "model_mb": round(os.path.getsize(encoder.model_file) / 2**20, 1),
+            "cosine_mean": round(float(cosine.mean()), 6),
+            "cosine_min": round(float(cosine.min()), 6),
+            "ranking_changed": len(changed),
+            "top1_changed": int(top1_changed),
+            "changed_sentences": changed
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the sentence embedding model to ONNX or check its parity")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="export (and int8-quantize) a SentenceTransformer model")
+    export.add_argument("model_name", nargs="?", default="all-mpnet-base-v2")
+    export.add_argument("--out-dir")
+    export.add_argument("--no-quantize", action="store_true")
+
+    parity = sub.add_parser("parity", help="compare ONNX embeddings and concept rankings with PyTorch")
+    parity.add_argument("model_name", nargs="?", default="all-mpnet-base-v2")
+    parity.add_argument("--sentences", help="text file, one sentence per line")
+    parity.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        meta = export_model(args.model_name, args.out_dir, quantize=not args.no_quantize)
+        print(json.dumps(meta, indent=2))
+    else:
+        sentences = PARITY_SENTENCES
+        if args.sentences:
+            with open(args.sentences, encoding="utf-8") as f:
+                sentences = [line.strip() for line in f if line.strip()]
+        print(json.dumps(check_parity(args.model_name, sentences, repeats=args.repeats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+
+from shared.admission import Overloaded, check_deadline, remaining_ms
+from shared.agent_client import AgentPool
+
+# ---------------------- Configuration ---------------------- #
+# How long an agent waits for its peer's round-1 summary (at most the query's
+# remaining budget, when it has one)
+PEER_TIMEOUT = float(os.environ.get("PEER_TIMEOUT", "10"))
+PEER_POOL_SIZE = int(os.environ.get("PEER_POOL_SIZE", "1"))
+
+
+# Delivered in place of a summary when the peer shed its half of the query
+_REJECTED = object()
+
+
+def summarize(results):
+    # All the adjust functions read from the peer's round-1 list
+    return [{"concept": item["concept"], "inferred_goals": item["inferred_goals"]} for item in results]
+
+
+# ---------------------- Agent-to-agent Exchange ---------------------- #
+class PeerExchange:
+    # Each agent sends its round-1 summary straight to the other agent, which
+    # parks it in a per-query mailbox until its own round 1 is done. A summary
+    # may arrive before or after the receiver starts waiting for it. Mailboxes
+    # are keyed by (query id, attempt): a retried query never picks up what was
+    # left behind by an earlier attempt.
+    def __init__(self, timeout=PEER_TIMEOUT, pool_size=PEER_POOL_SIZE):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._mailbox = {}
+        self._pools = {}
+        self._notices = set()
+
+    def _slot(self, key):
+        entry = self._mailbox.get(key)
+        if entry is None:
+            entry = self._mailbox[key] = (asyncio.get_running_loop().create_future(), time.monotonic())
+        return entry[0]
+
+    def _pool(self, peer_uri):
+        pool = self._pools.get(peer_uri)
+        if pool is None:
+            pool = self._pools[peer_uri] = AgentPool(peer_uri, self.pool_size)
+        return pool
+
+    def _purge(self):
+        # Summaries whose receiver never showed up (e.g. its round 1 failed)
+        cutoff = time.monotonic() - 2 * self.timeout
+        for key in [k for k, (_, created) in self._mailbox.items() if created < cutoff]:
+            del self._mailbox[key]
+
+    def deliver(self, query_id, summary, attempt=0, rejected=False):
+        self._purge()
+        future = self._slot((query_id, attempt))
+        if not future.done():
+            future.set_result(_REJECTED if rejected else summary)
+
+    async def receive(self, query_id, attempt=0):
+        key = (query_id, attempt)
+        timeout = self.timeout
+        remaining = remaining_ms()
+        if remaining is not None:
+            timeout = min(timeout, max(remaining, 0.0) / 1000)
+        try:
+            summary = await asyncio.wait_for(asyncio.shield(self._slot(key)), timeout)
+        except asyncio.TimeoutError:
+            # DeadlineExceeded when it was the query's budget that ran out
+            check_deadline()
+            raise
+        finally:
+            self._mailbox.pop(key, None)
+        if summary is _REJECTED:
+            # The query has to be retried as a whole, like any overloaded request
+            raise Overloaded("the peer agent shed its half of the query")
+        return summary
+
+    async def send(self, peer_uri, query_id, summary, attempt=0):
+        await self._pool(peer_uri).request({"step": "peer_summary", "query_id": query_id, "attempt": attempt,
+                                            "summary": summary})
+
+    async def exchange(self, peer_uri, query_id, results, attempt=0):
+        # Returns the peer's summary once ours has been handed over
+        _, peer_summary = await asyncio.gather(
+            self.send(peer_uri, query_id, summarize(results), attempt),
+            self.receive(query_id, attempt)
+        )
+        return peer_summary
+
+    def reject(self, peer_uri, query_id, attempt=0):
+        # Our half of the query was shed: the peer, which may already be waiting
+        # for our summary, is told right away instead of timing out
+        notice = asyncio.ensure_future(self._send_rejection(peer_uri, query_id, attempt))
+        self._notices.add(notice)
+        notice.add_done_callback(self._notices.discard)
+
+    async def _send_rejection(self, peer_uri, query_id, attempt):
+        try:
+            await self._pool(peer_uri).request({"step": "peer_summary", "query_id": query_id, "attempt": attempt,
+                                                "rejected": True})
+        except Exception as e:
+            print(f"[Peer Exchange] Could not tell {peer_uri} that query {query_id} was shed: {e!r}")
+
+    async def close(self):
+        for notice in self._notices:
+            notice.cancel()
+        await asyncio.gather(*(pool.close() for pool in self._pools.values()))
+        self._pools.clear()
+        self._mailbox.clear()
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import uuid
+
+import numpy as np
+from fastapi import WebSocketDisconnect
+
+from shared.executor import release_pipeline_slot, serve_pipelined
+from shared.metrics import record_error, watch_cache, watch_queue
+from shared.peer_exchange import PeerExchange
+from shared.scoring import concept_similarities
+from shared.session_store import SESSION_TTL, create_session_store
+from shared.wire import CLEAN_CLOSE_CODES
+
+
+# ---------------------- Reasoning Rounds ---------------------- #
+class ReasoningRounds:
+    # The /reason protocol shared by the similarity and relation agents, which
+    # only differ in how they score round 1 and adjust it with the peer's
+    # summary: run_agent(extraction_data, similarities) and
+    # adjust_with_peer(peer_summary, own_results).
+    def __init__(self, name, executor, run_agent, adjust_with_peer):
+        self.name = name
+        self.executor = executor
+        self.run_agent = run_agent
+        self.adjust_with_peer = adjust_with_peer
+        # Round-1 state by query id: finished rounds live in the (bounded)
+        # session store, rounds still running in this process in `pending`
+        self.sessions = create_session_store()
+        self.pending = {}
+        # Streaming extraction: similarity terms computed from the concepts
+        # frame while the ConceptNet relations are still being resolved
+        self.prepared = {}
+        # Peer mode: round-1 summaries exchanged directly with the other agent
+        self.peers = PeerExchange()
+        watch_cache("sessions", self.sessions.stats)
+        watch_queue("pending_rounds", lambda: len(self.pending))
+        watch_queue("prepared", lambda: len(self.prepared))
+
+    async def close(self):
+        await self.sessions.close()
+        await self.peers.close()
+
+    def _prepare(self, session_id, extraction_data):
+        now = time.monotonic()
+        for stale in [s for s, (_, _, started) in self.prepared.items() if now - started > SESSION_TTL]:
+            self.prepared.pop(stale)[1].cancel()
+        similarities = asyncio.ensure_future(self.executor.run(concept_similarities, extraction_data))
+        self.prepared[session_id] = (extraction_data, similarities, now)
+
+    async def _round1(self, session_id, extraction_data):
+        similarities = None
+        early = self.prepared.pop(session_id, None)
+        if early is not None:
+            # Round 1 then only carries what the concepts frame did not
+            extraction_data = {**early[0], **extraction_data}
+            similarities = await early[1]
+        results = await self.executor.run(self.run_agent, extraction_data, similarities)
+        # Stored before the reply goes out, so round 2 may land on any worker
+        await self.sessions.put(session_id, {"input": extraction_data, "results": results})
+        return results
+
+    async def _run_round1(self, session_id, extraction_data):
+        # Keep the running task so a pipelined round2 can wait for it
+        round1 = self.pending[session_id] = asyncio.ensure_future(self._round1(session_id, extraction_data))
+        try:
+            return await round1
+        finally:
+            if self.pending.get(session_id) is round1:
+                del self.pending[session_id]
+
+    async def _own_results(self, session_id):
+        round1 = self.pending.get(session_id)
+        if round1 is not None:
+            return await round1
+        session = await self.sessions.get(session_id)
+        return session["results"] if session else []
+
+    def _adjust(self, peer_summary, own_results):
+        # Adjust copies: the round1 reply may not have been serialized yet.
+        # Scores come back as plain floats from a shared store; np.float64
+        # keeps the adjustment's rounding identical either way.
+        own_results = [dict(item, score=np.float64(item["score"])) for item in own_results]
+        return self.adjust_with_peer(peer_summary, own_results)
+
+    def _shed(self, message):
+        # A shed peer round would leave the other agent waiting for our summary
+        if isinstance(message, dict) and message.get("step") == "peer_round":
+            self.peers.reject(message["peer_uri"], message.get("query_id"), message.get("attempt", 0))
+
+    async def serve(self, websocket):
+        # Fallback id for clients that don't tag their queries
+        connection_id = uuid.uuid4().hex
+
+        async def handle(message, binary):
+            step = message.get("step")
+            session_id = message.get("query_id") or connection_id
+
+            if step == "round1":
+                return await self._run_round1(session_id, message["input"])
+
+            elif step == "round1_prepare":
+                self._prepare(session_id, message["input"])
+
+            elif step == "round2":
+                own_results = await self._own_results(session_id)
+                return self._adjust(message["peer"], own_results)
+
+            elif step == "peer_round":
+                # Both rounds in one call: the peer agent gets our summary
+                # directly and the client only receives the adjusted results
+                own_results = await self._run_round1(session_id, message["input"])
+                release_pipeline_slot()
+                peer_summary = await self.peers.exchange(message["peer_uri"], session_id, own_results,
+                                                         message.get("attempt", 0))
+                return self._adjust(peer_summary, own_results)
+
+            elif step == "peer_summary":
+                self.peers.deliver(session_id, message.get("summary"), message.get("attempt", 0),
+                                   message.get("rejected", False))
+
+        try:
+            # Round 2 and peer summaries belong to queries admitted at round 1
+            await serve_pipelined(websocket, handle, exempt=("round2", "peer_summary"), on_reject=self._shed)
+        except WebSocketDisconnect as e:
+            # A client closing the connection normally is not an error
+            if e.code not in CLEAN_CLOSE_CODES:
+                record_error(e)
+                print(f"[{self.name}] WebSocket closed or errored: {e}")
+        except Exception as e:
+            record_error(e)
+            print(f"[{self.name}] WebSocket closed or errored: {e}")
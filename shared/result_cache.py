@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from shared.session_store import estimate_size
+
+# ---------------------- Configuration ---------------------- #
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "1") == "1"
+# Fixed (not sliding) TTL: ConceptNet answers can change, so even hot queries
+# are recomputed now and then
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Bump by hand to drop every cached result, e.g. after changing ConceptNet data
+RESULT_CACHE_VERSION = os.environ.get("RESULT_CACHE_VERSION", "1")
+
+
+def normalize_query(text):
+    # Case, whitespace and punctuation folded: "Where's coffee?" == "wheres  COFFEE"
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("P"))
+    return " ".join(text.split())
+
+
+def pipeline_version(**overrides):
+    # Hash of everything besides the query that decides the result. Module
+    # attributes are read on every call, so retuned weights invalidate at once.
+    # Each service answers {"step": "version"} with its own pipeline_version(),
+    # which AgentClient folds in as "services": the client's copies of these
+    # settings say nothing about what the agents actually run.
+    from shared import scoring
+    from coordinator import coordinator_logic
+
+    components = {
+        "cache_version": RESULT_CACHE_VERSION,
+        "similarity_weights": scoring.SIMILARITY_AGENT_WEIGHTS,
+        "relation_weights": scoring.RELATION_AGENT_WEIGHTS,
+        "coordinator_weights": coordinator_logic.COORDINATOR_WEIGHTS,
+        "top_k": coordinator_logic.FINAL_TOP_K,
+        "embedding_backend": os.environ.get("EMBEDDING_BACKEND", "torch"),
+        "conceptnet_backend": os.environ.get("CONCEPTNET_BACKEND", "http"),
+    }
+    # Model names are only known where the models run (fused pipeline, workers)
+    cocoex_utils = sys.modules.get("shared.cocoex_utils")
+    if cocoex_utils is not None:
+        components["spacy_model"] = cocoex_utils.SPACY_MODEL_NAME
+        components["embedding_model"] = cocoex_utils.EMBEDDING_MODEL_NAME
+        components["embedding_backend"] = cocoex_utils.EMBEDDING_BACKEND
+    components.update(overrides)
+    encoded = json.dumps(components, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+# ---------------------- Result Cache ---------------------- #
+class ResultCache:
+    # Whole pipeline results by (normalized query, version). Concurrent misses
+    # on one key share a single computation: the first caller runs it and the
+    # rest wait on its Future, from threads (get_or_compute) or coroutines
+    # (aget_or_compute) alike.
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, query, version=None):
+        return (normalize_query(query), version or pipeline_version())
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, result):
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _claim(self, key):
+        # (cached result, None, False) on a hit, (None, future, True) when the
+        # caller must compute, (None, future, False) when someone else already is
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], None, False
+            if entry is not None:
+                self._remove(key)
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return None, future, False
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            return None, future, True
+
+    def _settle(self, key, future, result=None, error=None):
+        # Degraded results (cut short by a deadline) are shared with the waiting
+        # callers but not kept: the next run may have the time to do better
+        if error is None and not (isinstance(result, dict) and result.get("degraded")):
+            self.put(key, result)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, query, compute, version=None):
+        key = self.key(query, version)
+        result, future, owner = self._claim(key)
+        if future is None:
+            return result
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def get_or_compute_many(self, queries, compute_batch, version=None):
+        # Batch form of get_or_compute: compute_batch gets the distinct queries
+        # this call claimed and returns their results in order; keys another
+        # caller is already computing are waited on instead
+        keys = [self.key(query, version) for query in queries]
+        claims = {}
+        for key, query in zip(keys, queries):
+            if key not in claims:
+                claims[key] = (query, *self._claim(key))
+        owned = [key for key, (_, _, future, owner) in claims.items() if owner]
+        if owned:
+            try:
+                results = compute_batch([claims[key][0] for key in owned])
+            except BaseException as e:
+                for key in owned:
+                    self._settle(key, claims[key][2], error=e)
+                raise
+            for key, result in zip(owned, results):
+                self._settle(key, claims[key][2], result)
+        done = {}
+        for key, (_, result, future, _) in claims.items():
+            done[key] = result if future is None else future.result()
+        return [done[key] for key in keys]
+
+    async def aget_or_compute(self, query, compute, version=None):
+        # compute is a coroutine function
+        key = self.key(query, version)
+        result, future, owner = self._claim(key)
+        if future is None:
+            return result
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.shared) / lookups, 4) if lookups else 0.0
+            }
+
+
+result_cache = ResultCache()
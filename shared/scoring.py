@@ -0,0 +1,109 @@
+import numpy as np
+
+from shared.metrics import stage
+
+# (similarity weight, relation weight) used by each reasoning agent
+SIMILARITY_AGENT_WEIGHTS = (0.8, 0.2)
+RELATION_AGENT_WEIGHTS = (0.3, 0.7)
+
+
+# ---------------------- Normalization ---------------------- #
+def normalize_rows(matrix):
+    # Same convention as sklearn's normalize(): near-zero rows are left as is
+    matrix = np.asarray(matrix, dtype=np.float64)
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+    norms[norms < 10 * np.finfo(np.float64).eps] = 1.0
+    return matrix / norms[:, None]
+
+
+def as_matrix(embeddings, rows, dim=-1):
+    # Widen to float64 (as the JSON lists used to be) and keep (0, dim) shapes valid
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if embeddings.size == 0:
+        return np.zeros((rows, max(dim, 0)))
+    return embeddings.reshape(rows, dim)
+
+
+# ---------------------- Single Query ---------------------- #
+def cosine_scores(sentence_embedding, concept_embeddings):
+    # One matrix-vector product instead of a cosine_similarity call per concept
+    sentence = normalize_rows(as_matrix(sentence_embedding, 1))[0]
+    concepts = normalize_rows(concept_embeddings)
+    return concepts @ sentence
+
+
+def max_relation_count(relations):
+    return max((len(r) for r in relations.values()), default=0) or 1
+
+
+def weighted_scores(similarities, relation_counts, max_rel, weights):
+    w_sim, w_rel = weights
+    relation_counts = np.asarray(relation_counts, dtype=np.float64)
+    return np.round(w_sim * similarities + w_rel * (relation_counts / max_rel), 4)
+
+
+def concept_similarities(extraction_result):
+    # The relation-independent term: needs only the concepts and embeddings,
+    # so it can be computed before the ConceptNet relations are in
+    concepts = extraction_result["concepts"]
+    if not concepts:
+        return np.zeros(0)
+    embeddings = as_matrix(extraction_result["concept_embeddings"], len(concepts))
+    return cosine_scores(extraction_result["sentence_embedding"], embeddings)
+
+
+def score_concepts(extraction_result, weights, similarities=None):
+    # Returns (scores, relation_counts) aligned with extraction_result["concepts"]
+    concepts = extraction_result["concepts"]
+    relations = extraction_result["conceptnet_relations"]
+    relation_counts = [len(relations.get(c, [])) for c in concepts]
+    if not concepts:
+        return [], relation_counts
+
+    with stage("scoring"):
+        if similarities is None:
+            similarities = concept_similarities(extraction_result)
+        # Kept as np.float64 elements: round() on them later (peer adjustment)
+        # must keep numpy's rounding, as with the per-concept scores before
+        scores = weighted_scores(similarities, relation_counts, max_relation_count(relations), weights)
+    return list(scores), relation_counts
+
+
+# ---------------------- Batched Queries ---------------------- #
+def score_batch(sentence_embeddings, concept_embeddings, offsets, relation_counts, max_rels, weights):
+    # sentence_embeddings: (Q, dim); concept_embeddings: (N, dim) stacked so that
+    # query q owns rows offsets[q]:offsets[q + 1]; max_rels: (Q,)
+    offsets = np.asarray(offsets)
+    rows_per_query = np.diff(offsets)
+    sentences = normalize_rows(sentence_embeddings)
+    concepts = normalize_rows(concept_embeddings)
+    owner = np.repeat(np.arange(len(rows_per_query)), rows_per_query)
+
+    similarities = np.einsum("ij,ij->i", concepts, sentences[owner])
+    max_rel = np.asarray(max_rels, dtype=np.float64)[owner]
+    return weighted_scores(similarities, relation_counts, max_rel, weights)
+
+
+def score_concepts_batch(extraction_results, weights):
+    # Scores many extraction results in one call; returns per-query
+    # (scores, relation_counts) just like score_concepts
+    if not extraction_results:
+        return []
+    counts = [len(r["concepts"]) for r in extraction_results]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    sentence_embeddings = np.stack([as_matrix(r["sentence_embedding"], 1)[0] for r in extraction_results])
+    dim = sentence_embeddings.shape[1]
+    concept_embeddings = np.concatenate(
+        [as_matrix(r["concept_embeddings"], n, dim) for r, n in zip(extraction_results, counts)]
+    )
+    relation_counts = [
+        len(r["conceptnet_relations"].get(c, [])) for r in extraction_results for c in r["concepts"]
+    ]
+    max_rels = [max_relation_count(r["conceptnet_relations"]) for r in extraction_results]
+
+    with stage("scoring"):
+        scores = list(score_batch(sentence_embeddings, concept_embeddings, offsets, relation_counts, max_rels, weights))
+    return [
+        (scores[start:end], relation_counts[start:end])
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
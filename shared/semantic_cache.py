@@ -0,0 +1,247 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from shared.wire import pack, unpack
+
+# ---------------------- Configuration ---------------------- #
+SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE", "0") == "1"
+# Cosine similarity at or above which a stored query's result is reused
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+# IVF: below SEMANTIC_CACHE_TRAIN_SIZE entries every row is scanned (exact);
+# past it rows are grouped into SEMANTIC_CACHE_LISTS k-means cells and a lookup
+# scans only the SEMANTIC_CACHE_NPROBE cells nearest to the query
+SEMANTIC_CACHE_LISTS = int(os.environ.get("SEMANTIC_CACHE_LISTS", "64"))
+SEMANTIC_CACHE_NPROBE = int(os.environ.get("SEMANTIC_CACHE_NPROBE", "4"))
+SEMANTIC_CACHE_TRAIN_SIZE = int(os.environ.get("SEMANTIC_CACHE_TRAIN_SIZE", "2048"))
+# Optional .npz snapshot written on shutdown and loaded on start ("" disables)
+SEMANTIC_CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", "")
+LATENCY_WINDOW = 1000
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 1e-12 else vector
+
+
+def compact_result(result):
+    # The stored query's embeddings would be wrong for a paraphrase, and they
+    # are most of a result's size
+    extraction = {k: v for k, v in result["extraction"].items()
+                  if k not in ("sentence_embedding", "concept_embeddings")}
+    return {**result, "extraction": extraction}
+
+
+def train_centroids(vectors, n_lists, iterations=10, seed=0):
+    # Spherical k-means: unit centroids, assignment by dot product
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.clip(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12, None)
+    return centroids
+
+
+# ---------------------- Semantic Query Cache ---------------------- #
+class SemanticCache:
+    # Unit query embeddings live in one float32 matrix of max_entries rows; the
+    # OrderedDict maps slot -> (query, result) in LRU order. Each slot belongs to
+    # one IVF cell once the index is trained, and is moved to the nearest cell
+    # when a new entry reuses it. Every slot also records the pipeline version
+    # its result was computed under: a lookup only matches its own version, and
+    # entries of versions no longer asked for simply age out of the LRU, so
+    # callers with different k / weights (or agents redeployed one at a time)
+    # do not flush each other's entries.
+    def __init__(self, model_name, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 n_lists=SEMANTIC_CACHE_LISTS, nprobe=SEMANTIC_CACHE_NPROBE, train_size=SEMANTIC_CACHE_TRAIN_SIZE):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.train_size = max(train_size, n_lists)
+        self.matrix = None
+        # Version strings are interned as small ints for the per-slot array
+        self._version_ids = {}
+        self._slot_version = np.full(max_entries, -1, dtype=np.int32)
+        self._entries = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.centroids = None
+        self._cells = None
+        self._cell_of = {}
+        self._trained_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _version_id(self, version):
+        version_id = self._version_ids.get(version)
+        if version_id is None:
+            live = set(self._slot_version[list(self._entries)].tolist()) if self._entries else set()
+            # Ids of versions with no entry left are dropped before they pile up
+            self._version_ids = {v: i for v, i in self._version_ids.items() if i in live}
+            version_id = max(self._version_ids.values(), default=-1) + 1
+            self._version_ids[version] = version_id
+        return version_id
+
+    # ---------------------- IVF ---------------------- #
+    def _train(self):
+        # Retrained each time the cache doubles, so cells follow the traffic
+        self._trained_size = len(self._entries)
+        slots = np.fromiter(self._entries, dtype=np.int64)
+        self.centroids = train_centroids(self.matrix[slots], self.n_lists)
+        assignment = np.argmax(self.matrix[slots] @ self.centroids.T, axis=1)
+        self._cells = [set() for _ in range(self.n_lists)]
+        self._cell_of = {}
+        for slot, cell in zip(slots.tolist(), assignment.tolist()):
+            self._cells[cell].add(slot)
+            self._cell_of[slot] = cell
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return np.fromiter(self._entries, dtype=np.int64)
+        nearest = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        return np.fromiter((slot for cell in nearest for slot in self._cells[cell]), dtype=np.int64)
+
+    # ---------------------- Lookup / Insert ---------------------- #
+    def lookup(self, embedding, version=None):
+        # Returns (matched query, its result, similarity), or None below the threshold
+        started = time.perf_counter()
+        query = _unit(embedding)
+        with self._lock:
+            match = None
+            version_id = self._version_ids.get(version)
+            if self._entries and version_id is not None:
+                slots = self._candidates(query)
+                slots = slots[self._slot_version[slots] == version_id]
+                if len(slots):
+                    scores = self.matrix[slots] @ query
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        slot = int(slots[best])
+                        self._entries.move_to_end(slot)
+                        match = (*self._entries[slot], float(scores[best]))
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+        return match
+
+    def insert(self, embedding, query, result, version=None):
+        vector = _unit(embedding)
+        with self._lock:
+            version_id = self._version_id(version)
+            if self.matrix is None or self.matrix.shape[1] != len(vector):
+                self.matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if not self._free:
+                evicted, _ = self._entries.popitem(last=False)
+                if self._cells is not None:
+                    self._cells[self._cell_of.pop(evicted)].discard(evicted)
+                self._free.append(evicted)
+                self.evictions += 1
+            slot = self._free.pop()
+            self.matrix[slot] = vector
+            self._slot_version[slot] = version_id
+            self._entries[slot] = (query, compact_result(result))
+            if len(self._entries) >= max(self.train_size, 2 * self._trained_size):
+                self._train()
+            elif self._cells is not None:
+                cell = int(np.argmax(self.centroids @ vector))
+                self._cells[cell].add(slot)
+                self._cell_of[slot] = cell
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+            return {
+                "model": self.model_name,
+                "entries": len(self._entries),
+                "versions": len(np.unique(self._slot_version[list(self._entries)])) if self._entries else 0,
+                "capacity": self.max_entries,
+                "matrix_bytes": self.matrix.nbytes if self.matrix is not None else 0,
+                "indexed": self.centroids is not None,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "lookup_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "lookup_p99_ms": round(float(np.percentile(latencies, 99)), 3)
+            }
+
+    # ---------------------- Persistence ---------------------- #
+    def save(self, path):
+        with self._lock:
+            if not self._entries:
+                return
+            slots = list(self._entries)
+            vectors = self.matrix[slots]
+            queries = [self._entries[slot][0] for slot in slots]
+            results = pack([self._entries[slot][1] for slot in slots])
+            names = {i: v for v, i in self._version_ids.items()}
+            versions = [str(names[int(self._slot_version[slot])]) for slot in slots]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, model_name=np.array(self.model_name), versions=np.array(versions, dtype=str),
+                     vectors=vectors, queries=np.array(queries, dtype=str),
+                     results=np.frombuffer(results, dtype=np.uint8))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["model_name"]) != self.model_name:
+                print(f"[Semantic Cache] Ignoring {path}: built for another model")
+                return 0
+            vectors = data["vectors"][-self.max_entries:]
+            queries = data["queries"].tolist()[-self.max_entries:]
+            results = unpack(data["results"].tobytes())[-self.max_entries:]
+            if "versions" in data:
+                versions = data["versions"].tolist()[-self.max_entries:]
+            else:
+                # Snapshots from before per-entry versions hold a single one
+                versions = [str(data["version"])] * len(queries)
+        # Re-inserted in LRU order; the IVF cells are retrained on the way
+        for vector, query, result, version in zip(vectors, queries, results, versions):
+            self.insert(vector, query, result, version)
+        return len(queries)
+
+
+def with_match(match):
+    # The stored result, marked with the query it was computed for
+    query, result, similarity = match
+    return {**result, "semantic_match": {"query": query, "similarity": round(similarity, 4)}}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(model_name):
+    # One cache per embedding model and process, restored from (and saved back
+    # to) SEMANTIC_CACHE_PATH when that is set
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            cache = _caches[model_name] = SemanticCache(model_name)
+            if SEMANTIC_CACHE_PATH:
+                if os.path.exists(SEMANTIC_CACHE_PATH):
+                    cache.load(SEMANTIC_CACHE_PATH)
+                atexit.register(cache.save, SEMANTIC_CACHE_PATH)
+        return cache
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from shared.wire import pack, unpack
+
+# ---------------------- Configuration ---------------------- #
+# memory: per-process LRU (default); redis: shared by every worker, so round 2
+# can be answered by a different process than round 1
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+# Any Redis-compatible server works (Redis, Valkey, KeyDB, ...)
+SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "300"))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "10000"))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def estimate_size(obj):
+    # Approximate retained bytes; embedding arrays count their full buffer
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(estimate_size(x) for x in obj)
+    return sys.getsizeof(obj)
+
+
+# ---------------------- In-memory Backend ---------------------- #
+class MemorySessionStore:
+    # TTL is refreshed on access, so the OrderedDict is in both LRU and expiry
+    # order: expired entries are always found at the front.
+    def __init__(self, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES, max_bytes=SESSION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def _purge(self, now):
+        while self._entries:
+            key, (_, _, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._drop(key)
+            self.expirations += 1
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get(self, key):
+        now = time.monotonic()
+        self._purge(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, _ = entry
+        self._entries[key] = (value, size, now + self.ttl)
+        self._entries.move_to_end(key)
+        return value
+
+    async def put(self, key, value):
+        if key in self._entries:
+            self._drop(key)
+        size = estimate_size(value)
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.bytes += size
+        self._purge(time.monotonic())
+
+    async def delete(self, key):
+        if key in self._entries:
+            self._drop(key)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    async def close(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+# ---------------------- Redis Backend ---------------------- #
+class RedisSessionStore:
+    # Values are msgpack'd with the wire encoder (embeddings as raw buffers).
+    # Size-bounded eviction is left to the server's maxmemory policy.
+    def __init__(self, url=SESSION_REDIS_URL, ttl=SESSION_TTL, prefix="session:", client=None):
+        if client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise ImportError("SESSION_BACKEND=redis requires the 'redis' package") from e
+            client = redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key):
+        name = self.prefix + key
+        data = await self.client.getex(name, ex=int(self.ttl))
+        return unpack(data) if data is not None else None
+
+    async def put(self, key, value):
+        await self.client.set(self.prefix + key, pack(value), ex=int(self.ttl))
+
+    async def delete(self, key):
+        await self.client.delete(self.prefix + key)
+
+    def stats(self):
+        return {"backend": "redis"}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown session backend: {backend}")
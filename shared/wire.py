@@ -0,0 +1,123 @@
+import json
+import os
+
+import msgpack
+import numpy as np
+from starlette.websockets import WebSocketDisconnect
+
+from shared.metrics import observe_message
+
+# ---------------------- Configuration ---------------------- #
+# Orchestrators send binary (msgpack) frames by default; WIRE_FORMAT=json keeps
+# every hop human-readable for debugging. Agents answer in the format they were
+# addressed in, so both kinds of clients can share the same endpoints.
+WIRE_FORMAT = os.environ.get("WIRE_FORMAT", "msgpack")
+# float32 or float16 for embeddings sent by the extraction agent
+WIRE_FLOAT_DTYPE = os.environ.get("WIRE_FLOAT_DTYPE", "float32")
+
+FLOAT_DTYPES = {"float32": "<f4", "float16": "<f2"}
+_NDARRAY = "__ndarray__"
+
+
+# ---------------------- Encoding ---------------------- #
+def _encode_default(float_dtype):
+    def default(obj):
+        if isinstance(obj, np.ndarray):
+            if float_dtype and obj.dtype.kind == "f":
+                arr = obj.astype(FLOAT_DTYPES[float_dtype], copy=False)
+            else:
+                arr = obj.astype(obj.dtype.newbyteorder("<"), copy=False)
+            arr = np.ascontiguousarray(arr)
+            return {_NDARRAY: True, "dtype": arr.dtype.str, "shape": list(arr.shape), "data": arr.tobytes()}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Cannot serialize {type(obj).__name__}")
+    return default
+
+
+def _decode_hook(obj):
+    if obj.get(_NDARRAY):
+        # View straight onto the received buffer, no per-float parsing
+        return np.frombuffer(obj["data"], dtype=obj["dtype"]).reshape(obj["shape"])
+    return obj
+
+
+def pack(obj, float_dtype=None):
+    return msgpack.packb(obj, default=_encode_default(float_dtype), use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, object_hook=_decode_hook, raw=False)
+
+
+def to_jsonable(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(x) for x in obj]
+    return obj
+
+
+def dumps(obj, fmt=WIRE_FORMAT, float_dtype=None):
+    if fmt == "msgpack":
+        return pack(obj, float_dtype)
+    return json.dumps(to_jsonable(obj))
+
+
+def loads(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return unpack(data)
+    return json.loads(data)
+
+
+def extraction_request(text, fmt=WIRE_FORMAT, float_dtype=WIRE_FLOAT_DTYPE):
+    # The extraction agent takes the bare sentence as a text frame (JSON reply)
+    # or a msgpack envelope (binary reply with raw float buffers)
+    if fmt == "msgpack":
+        return pack({"text": text, "float_dtype": float_dtype})
+    return text
+
+
+# ---------------------- Server-side WebSocket helpers ---------------------- #
+def _parse_text(text, text_is_json):
+    if text_is_json == "auto":
+        # A JSON object envelope if the frame holds one, the raw text otherwise
+        if text.lstrip().startswith("{"):
+            try:
+                message = json.loads(text)
+            except json.JSONDecodeError:
+                return text
+            if isinstance(message, dict):
+                return message
+        return text
+    return json.loads(text) if text_is_json else text
+
+
+# Close codes of a client that hung up normally (1000) or is going away (1001)
+CLEAN_CLOSE_CODES = (1000, 1001)
+
+
+async def receive_message(websocket, text_is_json=True):
+    # Returns (payload, binary); binary frames are msgpack, text frames JSON
+    # (or the raw text when text_is_json is False, e.g. a bare sentence)
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        observe_message("in", len(message["bytes"]))
+        return unpack(message["bytes"]), True
+    observe_message("in", len(message.get("text") or ""))
+    return _parse_text(message.get("text"), text_is_json), False
+
+
+async def send_message(websocket, obj, binary, float_dtype=None):
+    data = pack(obj, float_dtype) if binary else json.dumps(to_jsonable(obj))
+    observe_message("out", len(data))
+    if binary:
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
@@ -1,16 +1,143 @@
 # sonar_api/main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
-from src.sonar import load_model, encode_texts
+from typing import List, Optional
+import asyncio
+import json
+import struct
+import sys, os
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared.model_registry import registry, Readiness, add_health_routes, MODEL_WARMUP
+from shared.embed_scheduler import EmbedScheduler, SchedulerFull
+
+# ---------------------- Configuration ---------------------- #
+# Batch size, batching wait and queue bound are the scheduler's own
+# EMBED_SCHED_MAX_BATCH / EMBED_SCHED_MAX_WAIT_MS / EMBED_SCHED_MAX_QUEUE
+SONAR_MAX_SENTENCES = int(os.environ.get("SONAR_MAX_SENTENCES", "20000"))
+# Large requests are fed to the scheduler in chunks, at most SONAR_CHUNKS_IN_FLIGHT
+# at a time, and each chunk is written out as soon as it is encoded
+SONAR_CHUNK_SIZE = int(os.environ.get("SONAR_CHUNK_SIZE", "256"))
+SONAR_CHUNKS_IN_FLIGHT = int(os.environ.get("SONAR_CHUNKS_IN_FLIGHT", "2"))
+# How long a later chunk may wait for queue room before the stream is cut short
+SONAR_CHUNK_TIMEOUT = float(os.environ.get("SONAR_CHUNK_TIMEOUT", "30"))
+
+# Binary frames: little-endian uint32 start row, uint32 row count, uint32 dim,
+# then rows * dim float32 values
+FRAME_HEADER = struct.Struct("<III")
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "binary": "application/octet-stream"
+}
 
 app = FastAPI()
-model = load_model("sonar_text", language="en")
+readiness = Readiness()
+add_health_routes(app, readiness)
+
+def _load_sonar():
+    # Imported here too: loading SONAR pulls in fairseq2 and torch
+    from src.sonar import load_model
+    return load_model("sonar_text", language="en")
+
+registry.register("sonar_text", _load_sonar)
+
+def _encode(sentences):
+    from src.sonar import encode_texts
+    embeddings = encode_texts(registry.get("sonar_text"), sentences)
+    if hasattr(embeddings, "detach"):
+        embeddings = embeddings.detach().cpu().numpy()
+    return np.asarray(embeddings, dtype=np.float32)
+
+scheduler = EmbedScheduler(_encode)
+# A chunk larger than the whole queue would never find room
+if SONAR_CHUNK_SIZE > scheduler.max_queue:
+    raise ValueError(f"SONAR_CHUNK_SIZE ({SONAR_CHUNK_SIZE}) must not exceed EMBED_SCHED_MAX_QUEUE "
+                     f"({scheduler.max_queue})")
+
+async def _warmup():
+    if MODEL_WARMUP:
+        await asyncio.to_thread(_encode, ["Warm up the sentence encoder."])
+
+@app.on_event("startup")
+async def start_warmup():
+    app.state.startup = asyncio.create_task(readiness.run(_warmup))
 
 class SentenceInput(BaseModel):
     sentences: List[str]
+    format: Optional[str] = None
+
+def _response_format(payload, request):
+    fmt = payload.format or request.query_params.get("format")
+    if fmt is None:
+        accept = request.headers.get("accept", "")
+        fmt = next((name for name, media in MEDIA_TYPES.items() if media in accept), "json")
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format {fmt!r}, expected one of {list(MEDIA_TYPES)}")
+    return fmt
+
+# ---------------------- Chunked Encoding ---------------------- #
+async def _encoded_chunks(sentences, first):
+    # Yields (start row, float32 array) in order; `first` is the future of the
+    # chunk submitted while admitting the request
+    starts = range(0, len(sentences), SONAR_CHUNK_SIZE)
+    in_flight = [(0, first)]
+    upcoming = iter(starts[1:])
+    while in_flight:
+        while len(in_flight) < SONAR_CHUNKS_IN_FLIGHT:
+            start = next(upcoming, None)
+            if start is None:
+                break
+            chunk = sentences[start:start + SONAR_CHUNK_SIZE]
+            # Later chunks wait a while for queue room instead of failing halfway
+            # through; SchedulerFull after that cuts the stream short
+            future = await asyncio.to_thread(scheduler.submit, chunk, True, SONAR_CHUNK_TIMEOUT)
+            in_flight.append((start, future))
+        start, future = in_flight.pop(0)
+        yield start, await asyncio.wrap_future(future)
+
+async def _stream(sentences, first, fmt):
+    try:
+        if fmt == "json":
+            yield b'{"embeddings": ['
+        async for start, embeddings in _encoded_chunks(sentences, first):
+            if fmt == "binary":
+                yield FRAME_HEADER.pack(start, len(embeddings), embeddings.shape[1]) + embeddings.astype("<f4").tobytes()
+            elif fmt == "ndjson":
+                yield "".join(
+                    json.dumps({"index": start + i, "embedding": row.tolist()}) + "\n"
+                    for i, row in enumerate(embeddings)
+                ).encode()
+            else:
+                rows = ", ".join(json.dumps(row.tolist()) for row in embeddings)
+                yield (", " + rows if start else rows).encode()
+        if fmt == "json":
+            yield b"]}"
+    except Exception as e:
+        # Headers are already sent, so all that is left is to cut the body short
+        print(f"[SONAR API] Embedding stream failed: {type(e).__name__}: {e}")
+        raise
 
 @app.post("/embed")
-def get_embeddings(payload: SentenceInput):
-    embeddings = encode_texts(model, payload.sentences)
-    return {"embeddings": embeddings.tolist()}
+async def get_embeddings(payload: SentenceInput, request: Request):
+    fmt = _response_format(payload, request)
+    sentences = payload.sentences
+    if len(sentences) > SONAR_MAX_SENTENCES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(sentences)} sentences exceeds the limit of {SONAR_MAX_SENTENCES} per request"
+        )
+    if not sentences:
+        return {"embeddings": []}
+    try:
+        first = scheduler.submit(sentences[:SONAR_CHUNK_SIZE])
+    except SchedulerFull as e:
+        raise HTTPException(status_code=429, detail=f"Embedding queue is full: {e}")
+    return StreamingResponse(_stream(sentences, first, fmt), media_type=MEDIA_TYPES[fmt])
+
+@app.get("/embed/stats")
+def embed_stats():
+    return scheduler.stats()
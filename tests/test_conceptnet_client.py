@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from benchmarks.conceptnet_stub import create_app, save_fixture
+from shared.conceptnet_client import ConceptNetClient
+
+LATENCY_MS = 200
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    # The benchmark's ConceptNet stub in process, plus a word whose lookup hangs
+    # and one answered with an HTML error page
+    def __init__(self, app):
+        self.asgi = httpx.ASGITransport(app=app)
+        self.requests = 0
+
+    async def handle_async_request(self, request):
+        self.requests += 1
+        if request.url.path == "/c/en/slow":
+            await asyncio.sleep(5)
+        if request.url.path == "/c/en/broken":
+            return httpx.Response(200, content=b"<html>502 Bad Gateway</html>",
+                                  headers={"content-type": "application/json"})
+        return await self.asgi.handle_async_request(request)
+
+
+@pytest.fixture
+def stub(tmp_path):
+    fixture_path = str(tmp_path / "fixture.json")
+    save_fixture({"coffee": [("UsedFor", "waking up")], "tea": [("IsA", "drink")]}, fixture_path)
+    return StubTransport(create_app(fixture_path, latency_ms=LATENCY_MS))
+
+
+def _client(stub, cache_path):
+    client = ConceptNetClient(base_url="http://conceptnet.test", cache_path=cache_path)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=stub)
+    return client
+
+
+def test_lookups_are_batched_and_cached(stub, tmp_path):
+    cache_path = str(tmp_path / "edges.sqlite")
+    client = _client(stub, cache_path)
+    try:
+        started = time.monotonic()
+        found = client.lookup_many(["Coffee", "coffee ", "tea", "milk", "ice cream"])
+        elapsed = time.monotonic() - started
+    finally:
+        client.close()
+    assert found["coffee"] == [("UsedFor", "waking up")]
+    assert found["milk"] == [] and found["ice_cream"] == []
+    # One request per distinct word, all in flight at once
+    assert stub.requests == 4
+    assert elapsed < 3 * LATENCY_MS / 1000
+
+    # A fresh client is answered from the SQLite edge cache
+    client = _client(stub, cache_path)
+    try:
+        assert client.lookup_many(["coffee", "tea"]) == {"coffee": [("UsedFor", "waking up")],
+                                                          "tea": [("IsA", "drink")]}
+    finally:
+        client.close()
+    assert stub.requests == 4
+
+
+def test_timeouts_and_bad_json_are_missing_and_not_cached(stub, tmp_path):
+    client = _client(stub, str(tmp_path / "edges.sqlite"))
+    try:
+        found = client.lookup_many(["coffee", "slow", "broken"], timeout=1.0)
+        assert found == {"coffee": [("UsedFor", "waking up")]}
+        assert client.cache.get_many(["slow", "broken"]) == {}
+    finally:
+        client.close()
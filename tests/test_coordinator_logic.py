@@ -0,0 +1,22 @@
+from coordinator.coordinator_logic import StreamingMerger, merge_agent_results
+
+
+def _items(rows):
+    return [{"concept": c, "score": s, "inferred_goals": g} for c, s, g in rows]
+
+
+SIMILARITY = _items([("a", 0.5, ["x", "y"]), ("b", 0.5, ["y"]), ("c", 0.4, ["z", "x"])])
+RELATION = _items([("b", 0.5, ["q"]), ("d", 0.5, []), ("a", 0.5, ["w"])])
+
+
+def test_streamed_merge_does_not_depend_on_arrival_order():
+    expected = merge_agent_results(SIMILARITY, RELATION, k=4)["final_inference"]
+    for parts in ([("SimilarityAgent", SIMILARITY), ("RelationAgent", RELATION)],
+                  [("RelationAgent", RELATION), ("SimilarityAgent", SIMILARITY)]):
+        merger = StreamingMerger(k=4)
+        for agent, items in parts:
+            merger.add_many(agent, items)
+        assert merger.top_k() == expected
+    assert [entry["concept"] for entry in expected] == ["a", "b", "c", "d"]
+    assert expected[0]["goals"] == ["x", "y", "w"]
+    assert expected[0]["sources"] == ["SimilarityAgent", "RelationAgent"]
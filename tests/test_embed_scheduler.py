@@ -0,0 +1,33 @@
+import threading
+import time
+
+import numpy as np
+
+from shared.embed_scheduler import EmbedScheduler
+
+
+def _slow_encode(texts):
+    time.sleep(0.002)
+    return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def test_partial_bucket_is_served_while_another_stays_full():
+    scheduler = EmbedScheduler(_slow_encode, max_batch_size=4, max_wait_ms=20, max_queue=64, buckets=[8])
+    stop = threading.Event()
+
+    def keep_long_bucket_full():
+        while not stop.is_set():
+            scheduler.submit(["x" * 50] * 4, block=True)
+
+    feeder = threading.Thread(target=keep_long_bucket_full, daemon=True)
+    feeder.start()
+    try:
+        time.sleep(0.05)
+        started = time.monotonic()
+        short = scheduler.submit(["hi"], block=True)
+        assert short.result(timeout=2.0).shape == (1, 4)
+        # max_wait plus about one batch in progress, with room for a slow machine
+        assert time.monotonic() - started < 0.5
+    finally:
+        stop.set()
+        feeder.join(timeout=2.0)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from shared.embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+def _encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), i, 0, 1] for i, text in enumerate(texts)], dtype=np.float32)
+    return encode
+
+
+def test_encode_round_trip_only_encodes_distinct_misses():
+    cache = EmbeddingCache(DIM, "test-model")
+    calls = []
+    first = cache.encode(["coffee", "tea", "coffee"], _encode(calls))
+    again = cache.encode(["tea", "coffee"], _encode(calls))
+    assert calls == [["coffee", "tea"]]
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(again, first[[1, 0]])
+    assert cache.stats()["hits"] == 2
+
+
+def test_byte_budget_evicts_least_recently_used():
+    # Room for exactly three float32 rows of DIM values
+    cache = EmbeddingCache(DIM, "test-model", max_bytes=3 * DIM * 4)
+    assert cache.capacity == 3
+    calls = []
+    cache.encode(["a", "b", "c"], _encode(calls))
+    cache.lookup(["a"])
+    cache.encode(["d"], _encode(calls))
+    _, missing = cache.lookup(["a", "b", "c", "d"])
+    assert missing == [1]
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "embeddings.npz")
+    cache = EmbeddingCache(DIM, "test-model")
+    rows = cache.encode(["coffee", "tea"], _encode([]))
+    cache.save(path)
+
+    restored = EmbeddingCache(DIM, "test-model")
+    assert restored.load(path) == 2
+    loaded, missing = restored.lookup(["coffee", "tea"])
+    assert missing == []
+    np.testing.assert_array_equal(loaded, rows)
+    # Snapshots of another model or dimension are ignored
+    assert EmbeddingCache(DIM, "other-model").load(path) == 0
+    assert EmbeddingCache(DIM + 1, "test-model").load(path) == 0
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from shared.admission import AdmissionControl
+from shared.executor import release_pipeline_slot, serve_pipelined
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    def push(self, message):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    def hang_up(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        raise AssertionError("text frames only")
+
+
+async def _until(condition, timeout=2.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def _serve(websocket, handle, **options):
+    with pytest.raises(WebSocketDisconnect):
+        await serve_pipelined(websocket, handle, **options)
+
+
+def test_untagged_stream_holds_its_admission_slot_until_the_last_frame():
+    async def run():
+        admission = AdmissionControl(max_in_flight=1)
+        more = asyncio.Event()
+
+        async def frames():
+            yield {"frame": 1}
+            await more.wait()
+            yield {"frame": 2}
+
+        async def handle(message, binary):
+            return frames()
+
+        websocket = FakeWebSocket()
+        serving = asyncio.ensure_future(_serve(websocket, handle, admission=admission))
+        websocket.push({"text": "first"})
+        await _until(lambda: websocket.sent == [{"frame": 1}])
+        assert admission.in_flight == 1
+        more.set()
+        await _until(lambda: len(websocket.sent) == 2)
+        await _until(lambda: admission.in_flight == 0)
+        websocket.hang_up()
+        await serving
+    asyncio.run(run())
+
+
+def test_released_pipeline_slot_lets_the_connection_read_on():
+    # depth 1: the first message waits for the second, which is only read once
+    # the first has given its slot back
+    async def run():
+        second = asyncio.Event()
+
+        async def handle(message, binary):
+            if message["step"] == "wait":
+                release_pipeline_slot()
+                await asyncio.wait_for(second.wait(), 2.0)
+            else:
+                second.set()
+            return message["step"]
+
+        websocket = FakeWebSocket()
+        serving = asyncio.ensure_future(_serve(websocket, handle, depth=1, admission=None))
+        websocket.push({"id": 1, "step": "wait"})
+        websocket.push({"id": 2, "step": "wake"})
+        await _until(lambda: len(websocket.sent) == 2)
+        assert {reply["id"]: reply["result"] for reply in websocket.sent} == {1: "wait", 2: "wake"}
+        websocket.hang_up()
+        await serving
+    asyncio.run(run())
+
+
+def test_rejected_messages_are_passed_to_on_reject():
+    async def run():
+        admission = AdmissionControl(max_in_flight=1)
+        release = asyncio.Event()
+        rejected = []
+
+        async def handle(message, binary):
+            await release.wait()
+            return "done"
+
+        websocket = FakeWebSocket()
+        serving = asyncio.ensure_future(_serve(websocket, handle, admission=admission, on_reject=rejected.append))
+        websocket.push({"id": 1, "step": "peer_round"})
+        websocket.push({"id": 2, "step": "peer_round"})
+        await _until(lambda: len(websocket.sent) == 1)
+        assert websocket.sent[0]["error"]["type"] == "Overloaded"
+        assert rejected == [{"id": 2, "step": "peer_round"}]
+        release.set()
+        await _until(lambda: len(websocket.sent) == 2)
+        websocket.hang_up()
+        await serving
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+pytest.importorskip("sentence_transformers")
+spacy = pytest.importorskip("spacy")
+
+from shared.cocoex_utils import EMBEDDING_MODEL_NAME, SPACY_MODEL_NAME
+from shared.onnx_embedding import PARITY_SENTENCES, check_parity, model_dir
+
+# Drift against the PyTorch embeddings: fp32 ONNX should be exact up to float
+# noise, dynamic int8 quantization moves each embedding a little
+TOLERANCES = {"onnx": 0.9999, "onnx-int8": 0.97}
+
+
+def _exported(quantized):
+    name = "model.int8.onnx" if quantized else "model.onnx"
+    return os.path.exists(os.path.join(model_dir(EMBEDDING_MODEL_NAME), name))
+
+
+@pytest.mark.skipif(not spacy.util.is_package(SPACY_MODEL_NAME), reason="spaCy model not installed")
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_parity_with_pytorch(backend):
+    if not _exported(backend == "onnx-int8"):
+        pytest.skip(f"{backend} model not exported (python -m shared.onnx_embedding export)")
+    report = check_parity(EMBEDDING_MODEL_NAME, PARITY_SENTENCES[:4], backends=(backend,), repeats=1)
+    assert report[backend]["cosine_min"] >= TOLERANCES[backend]
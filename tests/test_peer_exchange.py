@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from shared.admission import DeadlineExceeded, Overloaded, deadline_after, deadline_var
+from shared.agent_client import AgentClient, AgentOverloaded, AgentPool
+from shared.peer_exchange import PeerExchange
+
+
+def test_shed_peer_fails_the_waiting_half_at_once():
+    async def run():
+        peers = PeerExchange(timeout=10)
+        waiting = asyncio.ensure_future(peers.receive("q1"))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        peers.deliver("q1", None, rejected=True)
+        with pytest.raises(Overloaded):
+            await waiting
+        assert time.monotonic() - started < 1.0
+    asyncio.run(run())
+
+
+def test_mailboxes_are_kept_apart_per_attempt():
+    async def run():
+        peers = PeerExchange(timeout=10)
+        # Both halves of attempt 0 were shed, so nobody collects these notices
+        peers.deliver("q1", None, attempt=0, rejected=True)
+        peers.deliver("q1", [{"concept": "coffee", "inferred_goals": []}], attempt=1)
+        assert await peers.receive("q1", attempt=1) == [{"concept": "coffee", "inferred_goals": []}]
+    asyncio.run(run())
+
+
+def test_wait_is_bounded_by_the_query_budget():
+    async def run():
+        peers = PeerExchange(timeout=10)
+        deadline_var.set(deadline_after(50))
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await peers.receive("q1")
+        assert time.monotonic() - started < 1.0
+    asyncio.run(run())
+
+
+class FakePeerPool(AgentPool):
+    # Answers peer rounds from a script: one outcome per attempt
+    def __init__(self, uri, outcomes):
+        super().__init__(uri, size=1, overload_retries=3)
+        self.outcomes = outcomes
+        self.attempts = []
+
+    async def _request(self, payload):
+        self.attempts.append(payload["attempt"])
+        outcome = self.outcomes[payload["attempt"]]
+        if outcome == "overloaded":
+            raise AgentOverloaded(self.uri, {"type": "Overloaded", "message": "full", "retry_after_ms": 1})
+        return [{"agent": self.uri, "attempt": payload["attempt"]}]
+
+
+def test_client_retries_both_peer_halves_together():
+    async def run():
+        client = AgentClient(cache=None, semantic_cache=False, peer_mode=True)
+        # Attempt 0: similarity was shed, and relation heard so from its peer
+        client.similarity = FakePeerPool("similarity", ["overloaded", "ok"])
+        client.relation = FakePeerPool("relation", ["overloaded", "ok"])
+        _, round2 = await client._peer_rounds("q1", {})
+        similarity, relation = await asyncio.gather(round2["similarity"], round2["relation"])
+        assert similarity == [{"agent": "similarity", "attempt": 1}]
+        assert relation == [{"agent": "relation", "attempt": 1}]
+        assert client.similarity.attempts == client.relation.attempts == [0, 1]
+    asyncio.run(run())
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shared.result_cache import ResultCache
+
+
+def test_batch_computes_each_distinct_miss_once():
+    cache = ResultCache(ttl=60)
+    cache.get_or_compute("Coffee", lambda: {"answer": "coffee"}, version="v1")
+    batches = []
+
+    def compute_batch(queries):
+        batches.append(queries)
+        return [{"answer": query.lower()} for query in queries]
+
+    results = cache.get_or_compute_many(["coffee", "Tea", "tea ", "milk"], compute_batch, version="v1")
+    assert [r["answer"] for r in results] == ["coffee", "tea", "tea", "milk"]
+    assert batches == [["Tea", "milk"]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_batch_shares_an_inflight_computation():
+    cache = ResultCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return {"answer": "coffee"}
+
+    single = threading.Thread(target=cache.get_or_compute, args=("coffee", slow, "v1"))
+    single.start()
+    started.wait(5)
+    batches = []
+    batch_results = []
+
+    def compute_batch(queries):
+        batches.append(queries)
+        return [{"answer": query} for query in queries]
+
+    batch = threading.Thread(target=lambda: batch_results.extend(
+        cache.get_or_compute_many(["coffee", "tea"], compute_batch, version="v1")))
+    batch.start()
+    release.set()
+    single.join(5)
+    batch.join(5)
+    assert batches == [["tea"]]
+    assert [r["answer"] for r in batch_results] == ["coffee", "tea"]
+
+
+def test_batch_does_not_store_degraded_results():
+    cache = ResultCache(ttl=60)
+    results = cache.get_or_compute_many(["coffee"], lambda queries: [{"degraded": True}], version="v1")
+    assert results == [{"degraded": True}]
+    assert len(cache) == 0
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"answer": "coffee"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("coffee", compute, "v1")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["shared"] < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{"answer": "coffee"}] * 8
+    assert cache.stats()["misses"] == 1
+
+
+def test_async_callers_share_one_computation():
+    cache = ResultCache(ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": "coffee"}
+
+    async def run():
+        return await asyncio.gather(*(cache.aget_or_compute("coffee", compute, "v1") for _ in range(8)))
+
+    assert asyncio.run(run()) == [{"answer": "coffee"}] * 8
+    assert len(calls) == 1
+
+
+def test_degraded_results_are_not_stored():
+    cache = ResultCache(ttl=60)
+    assert cache.get_or_compute("coffee", lambda: {"degraded": True}, "v1") == {"degraded": True}
+    assert cache.get_or_compute("coffee", lambda: {"answer": "coffee"}, "v1") == {"answer": "coffee"}
+    assert cache.get_or_compute("coffee", lambda: {"answer": "tea"}, "v1") == {"answer": "coffee"}
+
+
+def test_errors_are_not_stored():
+    cache = ResultCache(ttl=60)
+
+    def fail():
+        raise RuntimeError("agent down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("coffee", fail, "v1")
+    assert len(cache) == 0
+    assert cache.get_or_compute("coffee", lambda: {"answer": "coffee"}, "v1") == {"answer": "coffee"}
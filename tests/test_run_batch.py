@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import run_batch
+
+
+def _write_queries(path, queries):
+    path.write_text("".join(json.dumps({"query": query}) + "\n" for query in queries), encoding="utf-8")
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def _fake_worker(failing=()):
+    seen = []
+
+    async def worker(queue, on_result, cache=None):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            line_number, query = item
+            seen.append(query)
+            if query in failing:
+                await on_result(line_number, query, None, "AgentError: down", 0.001)
+            else:
+                await on_result(line_number, query, [{"concept": query}], None, 0.001)
+    return worker, seen
+
+
+def test_resume_retries_failed_lines(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_queries(input_path, ["coffee", "tea", "milk"])
+    worker, _ = _fake_worker(failing={"tea"})
+    monkeypatch.setattr(run_batch, "_fused_worker", worker)
+    summary = asyncio.run(run_batch.run_batch(str(input_path), str(output_path), concurrency=2, mode="fused",
+                                              use_cache=False))
+    assert summary["errors"] == 1
+
+    worker, seen = _fake_worker()
+    monkeypatch.setattr(run_batch, "_fused_worker", worker)
+    asyncio.run(run_batch.run_batch(str(input_path), str(output_path), concurrency=2, mode="fused",
+                                    resume=True, use_cache=False))
+    assert seen == ["tea"]
+    records = sorted(_records(output_path), key=lambda r: r["line"])
+    assert [r["query"] for r in records] == ["coffee", "tea", "milk"]
+    assert not any("error" in r for r in records)
+
+
+def test_resume_after_a_crash_before_the_checkpoint_save(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_queries(input_path, ["coffee", "tea", "milk"])
+    # Line 1 reached the output but not the checkpoint; the last write was torn
+    output_path.write_text(json.dumps({"line": 1, "query": "tea", "final_inference": []}) + "\n"
+                           + '{"line": 2, "que', encoding="utf-8")
+    worker, seen = _fake_worker()
+    monkeypatch.setattr(run_batch, "_fused_worker", worker)
+    asyncio.run(run_batch.run_batch(str(input_path), str(output_path), concurrency=2, mode="fused",
+                                    resume=True, use_cache=False))
+    assert seen == ["coffee", "milk"]
+    assert sorted(r["line"] for r in _records(output_path)) == [0, 1, 2]
+
+
+def test_resume_skips_lines_the_checkpoint_has(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    queries = ["coffee", "tea", "milk", "juice", "water"]
+    _write_queries(input_path, queries)
+    # Lines 0-1 are below the watermark and line 3 finished out of order
+    checkpoint = run_batch.Checkpoint(f"{output_path}.ckpt")
+    checkpoint.watermark, checkpoint.done = 2, {3}
+    checkpoint.save()
+    output_path.write_text("".join(json.dumps({"line": n, "query": queries[n], "final_inference": []}) + "\n"
+                                   for n in (0, 1, 3)), encoding="utf-8")
+    worker, seen = _fake_worker()
+    monkeypatch.setattr(run_batch, "_fused_worker", worker)
+    summary = asyncio.run(run_batch.run_batch(str(input_path), str(output_path), concurrency=2, mode="fused",
+                                              resume=True, use_cache=False))
+    assert sorted(seen) == ["milk", "water"]
+    assert summary["completed"] == 2
+    assert sorted(r["line"] for r in _records(output_path)) == [0, 1, 2, 3, 4]
+
+    checkpoint = run_batch.Checkpoint(f"{output_path}.ckpt")
+    checkpoint.load()
+    assert (checkpoint.watermark, checkpoint.done, checkpoint.failed) == (5, set(), set())
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from shared.scoring import RELATION_AGENT_WEIGHTS, SIMILARITY_AGENT_WEIGHTS, score_concepts, score_concepts_batch
+
+
+def _extraction(rng, n_concepts, dim=16):
+    concepts = [f"concept_{i}" for i in range(n_concepts)]
+    return {
+        "concepts": concepts,
+        "sentence_embedding": rng.normal(size=dim).tolist(),
+        "concept_embeddings": rng.normal(size=(n_concepts, dim)).tolist(),
+        "conceptnet_relations": {c: [("RelatedTo", "x")] * int(rng.integers(0, 5)) for c in concepts}
+    }
+
+
+@pytest.mark.parametrize("weights", [SIMILARITY_AGENT_WEIGHTS, RELATION_AGENT_WEIGHTS])
+def test_matches_the_per_concept_sklearn_loop(weights):
+    cosine_similarity = pytest.importorskip("sklearn.metrics.pairwise").cosine_similarity
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        extraction = _extraction(rng, int(rng.integers(1, 8)))
+        relations = extraction["conceptnet_relations"]
+        max_rel = max(len(r) for r in relations.values()) or 1
+        expected = [
+            round(weights[0] * cosine_similarity([extraction["sentence_embedding"]], [embedding])[0][0]
+                  + weights[1] * (len(relations[c]) / max_rel), 4)
+            for c, embedding in zip(extraction["concepts"], extraction["concept_embeddings"])
+        ]
+        scores, _ = score_concepts(extraction, weights)
+        np.testing.assert_allclose(scores, expected, atol=1e-4)
+
+
+def test_batch_matches_single_queries():
+    rng = np.random.default_rng(1)
+    extractions = [_extraction(rng, n) for n in (3, 0, 5, 1)]
+    batched = score_concepts_batch(extractions, SIMILARITY_AGENT_WEIGHTS)
+    for extraction, (scores, counts) in zip(extractions, batched):
+        single_scores, single_counts = score_concepts(extraction, SIMILARITY_AGENT_WEIGHTS)
+        np.testing.assert_array_equal(scores, single_scores)
+        assert list(counts) == list(single_counts)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from shared.semantic_cache import SemanticCache
+
+
+def _result(concept):
+    return {"final_inference": [{"concept": concept}], "extraction": {"concepts": [concept]}}
+
+
+def test_versions_do_not_flush_each_other():
+    cache = SemanticCache("test-model", threshold=0.9, max_entries=8)
+    vector = np.array([1.0, 0.0, 0.0])
+    cache.insert(vector, "coffee", _result("coffee"), "k=5")
+    cache.insert(vector, "coffee", _result("tea"), "k=3")
+    assert cache.lookup(vector, "k=5")[1]["final_inference"][0]["concept"] == "coffee"
+    assert cache.lookup(vector, "k=3")[1]["final_inference"][0]["concept"] == "tea"
+    assert cache.lookup(vector, "k=7") is None
+    assert len(cache) == 2
+
+
+def test_old_versions_age_out_of_the_lru():
+    cache = SemanticCache("test-model", threshold=0.9, max_entries=2)
+    cache.insert([1.0, 0.0], "coffee", _result("coffee"), "old")
+    cache.insert([0.0, 1.0], "tea", _result("tea"), "new")
+    cache.insert([1.0, 1.0], "milk", _result("milk"), "new")
+    assert cache.lookup([1.0, 0.0], "old") is None
+    assert cache.stats()["versions"] == 1
+
+
+def test_snapshot_keeps_every_version(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache("test-model", threshold=0.9, max_entries=8)
+    cache.insert([1.0, 0.0], "coffee", _result("coffee"), "k=5")
+    cache.insert([0.0, 1.0], "tea", _result("tea"), "k=3")
+    cache.save(path)
+
+    restored = SemanticCache("test-model", threshold=0.9, max_entries=8)
+    assert restored.load(path) == 2
+    assert restored.lookup([1.0, 0.0], "k=5")[0] == "coffee"
+    assert restored.lookup([0.0, 1.0], "k=3")[0] == "tea"
+    assert restored.lookup([0.0, 1.0], "k=5") is None
+    assert SemanticCache("other-model").load(path) == 0
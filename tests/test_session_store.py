@@ -0,0 +1,93 @@
+import asyncio
+from collections import OrderedDict
+
+import numpy as np
+
+from shared.session_store import RedisSessionStore
+
+
+class FakeRedis:
+    # The subset of redis.asyncio the store uses, on a manual clock; past
+    # max_keys the least recently used key is evicted (allkeys-lru)
+    def __init__(self, max_keys=None):
+        self.now = 0.0
+        self.max_keys = max_keys
+        self.data = OrderedDict()
+        self.closed = False
+
+    def _live(self, name):
+        entry = self.data.get(name)
+        if entry is not None and entry[1] <= self.now:
+            del self.data[name]
+            return None
+        return entry
+
+    async def set(self, name, value, ex=None):
+        self.data[name] = (value, self.now + ex)
+        self.data.move_to_end(name)
+        while self.max_keys is not None and len(self.data) > self.max_keys:
+            self.data.popitem(last=False)
+
+    async def getex(self, name, ex=None):
+        entry = self._live(name)
+        if entry is None:
+            return None
+        self.data[name] = (entry[0], self.now + ex)
+        self.data.move_to_end(name)
+        return entry[0]
+
+    async def delete(self, name):
+        self.data.pop(name, None)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_round_trip_with_prefix():
+    async def run():
+        client = FakeRedis()
+        store = RedisSessionStore(ttl=60, client=client)
+        value = {"concepts": ["router"], "embeddings": np.arange(6, dtype=np.float32).reshape(2, 3)}
+        await store.put("q1", value)
+        assert list(client.data) == ["session:q1"]
+        restored = await store.get("q1")
+        assert restored["concepts"] == ["router"]
+        np.testing.assert_array_equal(restored["embeddings"], value["embeddings"])
+        assert await store.get("missing") is None
+        await store.delete("q1")
+        assert await store.get("q1") is None
+        await store.close()
+        assert client.closed
+    asyncio.run(run())
+
+
+def test_ttl_expires_and_is_refreshed_on_read():
+    async def run():
+        client = FakeRedis()
+        store = RedisSessionStore(ttl=10, client=client)
+        await store.put("a", [1])
+        await store.put("b", [2])
+        client.now = 8
+        assert await store.get("a") == [1]
+        # "a" was read at t=8, so it lives until t=18; "b" expired at t=10
+        client.now = 12
+        assert await store.get("b") is None
+        assert await store.get("a") == [1]
+        client.now = 30
+        assert await store.get("a") is None
+    asyncio.run(run())
+
+
+def test_server_eviction_reads_as_missing():
+    async def run():
+        client = FakeRedis(max_keys=2)
+        store = RedisSessionStore(ttl=60, client=client)
+        await store.put("a", [1])
+        await store.put("b", [2])
+        assert await store.get("a") == [1]
+        await store.put("c", [3])
+        # "b" was the least recently used entry
+        assert await store.get("b") is None
+        assert await store.get("a") == [1]
+        assert await store.get("c") == [3]
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import json
+
+import msgpack
+import numpy as np
+
+from shared.wire import _parse_text, dumps, extraction_request, loads, pack, unpack
+
+
+def test_arrays_travel_as_raw_float_buffers():
+    embedding = np.random.default_rng(0).random((3, 384)).astype(np.float32)
+    data = pack({"concept_embeddings": embedding, "score": np.float64(0.5), "ids": np.arange(3)})
+    raw = msgpack.unpackb(data, raw=False)["concept_embeddings"]
+    assert raw["dtype"] == "<f4" and raw["shape"] == [3, 384]
+    assert len(raw["data"]) == embedding.nbytes
+
+    decoded = unpack(data)
+    np.testing.assert_array_equal(decoded["concept_embeddings"], embedding)
+    assert decoded["score"] == 0.5
+    assert decoded["ids"].dtype.kind == "i"
+
+
+def test_float16_halves_the_payload():
+    embedding = np.random.default_rng(0).random(384).astype(np.float32)
+    full = pack({"sentence_embedding": embedding})
+    half = pack({"sentence_embedding": embedding}, float_dtype="float16")
+    assert len(full) - len(half) >= embedding.nbytes // 2 - 16
+
+    decoded = unpack(half)["sentence_embedding"]
+    assert decoded.dtype == np.float16
+    np.testing.assert_allclose(decoded.astype(np.float32), embedding, atol=1e-3)
+    # Integer arrays are never downcast
+    assert unpack(pack({"ids": np.arange(3)}, float_dtype="float16"))["ids"].dtype.kind == "i"
+
+
+def test_json_fallback_and_extraction_envelope():
+    payload = {"scores": np.array([0.25, 0.5], dtype=np.float32)}
+    assert json.loads(dumps(payload, fmt="json")) == {"scores": [0.25, 0.5]}
+    np.testing.assert_array_equal(loads(dumps(payload, fmt="msgpack"))["scores"], payload["scores"])
+
+    assert extraction_request("I want coffee", fmt="json") == "I want coffee"
+    assert unpack(extraction_request("I want coffee", fmt="msgpack", float_dtype="float16")) == \
+        {"text": "I want coffee", "float_dtype": "float16"}
+    assert _parse_text('{"step": "version"}', "auto") == {"step": "version"}
+    assert _parse_text("{not json", "auto") == "{not json"